@@ -0,0 +1,95 @@
+import datetime
+from unittest import mock
+
+from tweepipe.db import chunk_queue
+
+from tests.utils import mockmongo
+
+
+class TidRangeQueueTest(mockmongo.MongomockTestCase):
+    def setUp(self):
+        super().setUp()
+        self.collection = self.mongo_client["test_chunks"]["hydrating_tids"]
+        self.collection.insert_many(
+            [
+                {"tid": str(tid), "tid_int": tid, "status": 0, "key": (tid >> 20) % 2}
+                for tid in range(1 << 22, 1 << 28, 1 << 20)
+            ]
+        )
+
+        # pipeline updates are not supported by mongomock, tid_int being set above
+        patch = mock.patch.object(chunk_queue.TidRangeQueue, "_add_tid_int")
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def get_chunk_tids(self, chunk: dict) -> list:
+        return [
+            doc["tid_int"]
+            for doc in self.collection.find(chunk_queue.TidRangeQueue.get_filter(chunk))
+        ]
+
+    def test_chunk_boundaries(self):
+        sample = list(range(0, 1 << 30, 1 << 20))
+        boundaries = chunk_queue.get_chunk_boundaries(sample, 4)
+
+        self.assertEqual(len(boundaries), 3)
+        self.assertEqual(boundaries, sorted(boundaries))
+        self.assertTrue(all(boundary % (1 << 22) == 0 for boundary in boundaries))
+        self.assertEqual(chunk_queue.get_chunk_boundaries([], 4), [])
+
+    def test_chunks_cover_all_pending_tids(self):
+        queue = chunk_queue.TidRangeQueue(self.collection)
+        chunk_count = queue.plan(chunk_size=64, min_chunk_count=4)
+        self.assertGreater(chunk_count, 1)
+
+        tids = []
+        chunk = queue.claim()
+        while chunk:
+            tids.extend(self.get_chunk_tids(chunk))
+            queue.complete(chunk)
+            chunk = queue.claim()
+
+        self.assertEqual(sorted(tids), sorted(self.collection.distinct("tid_int")))
+        self.assertEqual(queue.stats(), {2: chunk_count})
+
+    def test_resumes_plan_of_same_filter_only(self):
+        queue = chunk_queue.TidRangeQueue(self.collection)
+        chunk_count = queue.plan(base_filter={"key": 0}, min_chunk_count=4)
+        queue.claim()
+
+        self.assertEqual(queue.plan(base_filter={"key": 0}), chunk_count)
+        self.assertEqual(queue.stats(), {0: chunk_count - 1, 1: 1})
+
+        # another filter plans the chunks again
+        self.assertEqual(queue.plan(base_filter={"key": 1}, min_chunk_count=2), 2)
+        self.assertEqual(queue.stats(), {0: 2})
+
+    def test_claimed_chunk_resumes_after_checkpoint(self):
+        queue = chunk_queue.TidRangeQueue(self.collection, lease_seconds=60)
+        queue.plan()
+        chunk = queue.claim()
+        tids = self.get_chunk_tids(chunk)
+
+        queue.checkpoint(chunk, hydrated_count=3, missing_count=1, last_tid=tids[3])
+        queue.checkpoint(chunk, hydrated_count=2, last_tid=tids[1])
+
+        # crashed worker, its chunk being claimed again by another one
+        queue.chunks.update_one(
+            {"_id": chunk["_id"]},
+            {"$set": {"lease_expires": datetime.datetime(2000, 1, 1)}},
+        )
+        reclaimed_chunk = chunk_queue.TidRangeQueue(self.collection).claim()
+
+        self.assertEqual(reclaimed_chunk["_id"], chunk["_id"])
+        self.assertEqual(reclaimed_chunk["checkpoint"]["last_tid"], tids[3])
+        self.assertEqual(reclaimed_chunk["checkpoint"]["hydrated_count"], 5)
+        self.assertEqual(reclaimed_chunk["checkpoint"]["missing_count"], 1)
+        self.assertEqual(self.get_chunk_tids(reclaimed_chunk), tids[4:])
+
+    def test_release(self):
+        queue = chunk_queue.TidRangeQueue(self.collection)
+        chunk_count = queue.plan(min_chunk_count=2)
+        queue.claim()
+        queue.release()
+
+        self.assertEqual(queue.stats(), {0: chunk_count})
@@ -0,0 +1,42 @@
+from unittest import mock
+
+import mongomock
+import pymongo
+
+from tweepipe.db import connection
+
+from tests.utils import mockmongo
+
+
+class EnsureIndexTest(mockmongo.MongomockTestCase):
+    def patch_create_index(self, **kwargs):
+        create_index = mongomock.collection.Collection.create_index
+        return mock.patch.object(
+            mongomock.collection.Collection,
+            "create_index",
+            autospec=True,
+            **{"side_effect": create_index, **kwargs},
+        )
+
+    def test_indexes_are_created_once(self):
+        with self.patch_create_index() as create_index:
+            for _ in range(2):
+                connection.ensure_index(
+                    self.mongo_client, "test_connection", "tweets", "tid", unique=True
+                )
+
+        self.assertEqual(create_index.call_count, 1)
+        index_info = self.mongo_client["test_connection"]["tweets"].index_information()
+        self.assertTrue(index_info["tid_1"]["unique"])
+
+    def test_failed_indexes_are_created_again(self):
+        error = pymongo.errors.OperationFailure("index build failed")
+        with self.patch_create_index(side_effect=error) as create_index:
+            connection.ensure_index(
+                self.mongo_client, "test_connection", "tweets", "tid"
+            )
+        self.assertEqual(create_index.call_count, 1)
+
+        connection.ensure_index(self.mongo_client, "test_connection", "tweets", "tid")
+        index_info = self.mongo_client["test_connection"]["tweets"].index_information()
+        self.assertIn("tid_1", index_info)
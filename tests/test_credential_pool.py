@@ -0,0 +1,237 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from tweepipe.utils import credential_pool
+
+from tests.utils import mockmongo
+
+ENDPOINT = "statuses/lookup"
+
+
+class Exhausted(Exception):
+    pass
+
+
+def get_credentials(count: int = 2) -> list:
+    # credentials of the same app, authenticated as different users
+    return [
+        {
+            "consumer_key": "app",
+            "consumer_secret": "secret",
+            "access_token": f"token{i}",
+            "access_token_secret": f"token_secret{i}",
+        }
+        for i in range(count)
+    ]
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_refill(self):
+        bucket = credential_pool.TokenBucket(2, window=10)
+
+        self.assertTrue(bucket.try_acquire(100))
+        self.assertTrue(bucket.try_acquire(105))
+        self.assertFalse(bucket.try_acquire(109))
+        self.assertTrue(bucket.try_acquire(110))
+        self.assertEqual(bucket.to_dict(), {"remaining": 1, "reset_at": 120})
+
+
+class CredentialPoolTest(unittest.TestCase):
+    def get_pool(self, state=None, limit: int = 3, count: int = 2):
+        return credential_pool.CredentialPool(
+            get_credentials(count), state=state, rate_limits={ENDPOINT: limit}
+        )
+
+    def test_credentials_are_keyed_by_access_token(self):
+        pool = self.get_pool()
+        self.assertEqual(pool.keys, ["token0", "token1"])
+
+        app_credential = {"consumer_key": "app", "consumer_secret": "secret"}
+        self.assertEqual(credential_pool.get_credential_key(app_credential), "app")
+        with self.assertRaises(RuntimeError):
+            credential_pool.CredentialPool([])
+
+    def test_requests_go_to_the_largest_budget(self):
+        pool = self.get_pool()
+        keys = [pool.acquire(ENDPOINT) for _ in range(6)]
+
+        self.assertEqual(sorted(keys), ["token0"] * 3 + ["token1"] * 3)
+        # budgets are taken in turns rather than one credential after the other
+        self.assertEqual(set(keys[:2]), {"token0", "token1"})
+        self.assertEqual(pool.stats(), {"token0": 3, "token1": 3})
+
+    def test_waits_for_the_earliest_reset_once_exhausted(self):
+        pool = self.get_pool(limit=1)
+        pool.acquire(ENDPOINT)
+        pool.acquire(ENDPOINT)
+
+        with mock.patch.object(
+            credential_pool.time, "sleep", side_effect=Exhausted
+        ) as sleep:
+            with self.assertRaises(Exhausted):
+                pool.acquire(ENDPOINT)
+
+        (wait,), _ = sleep.call_args
+        self.assertGreater(wait, credential_pool.RATE_LIMIT_WINDOW - 60)
+
+    def test_concurrent_requests_never_exceed_budgets(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for state in (
+                credential_pool.RateLimitState(),
+                credential_pool.FileRateLimitState(Path(tmp_dir, "state.json")),
+            ):
+                with self.subTest(state=type(state).__name__):
+                    pool = self.get_pool(state=state, limit=25, count=4)
+
+                    def acquire():
+                        for _ in range(20):
+                            pool.acquire(ENDPOINT)
+
+                    threads = [threading.Thread(target=acquire) for _ in range(5)]
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+
+                    budgets = state.get_budgets(pool.keys, ENDPOINT, 25)
+                    self.assertEqual(sum(pool.stats().values()), 100)
+                    self.assertEqual(
+                        sum(remaining for remaining, _ in budgets.values()), 0
+                    )
+
+    def test_file_state_is_shared(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, "state.json")
+            pools = [
+                self.get_pool(state=credential_pool.FileRateLimitState(path))
+                for _ in range(2)
+            ]
+            for i in range(6):
+                pools[i % 2].acquire(ENDPOINT)
+
+            with mock.patch.object(
+                credential_pool.time, "sleep", side_effect=Exhausted
+            ):
+                with self.assertRaises(Exhausted):
+                    pools[0].acquire(ENDPOINT)
+
+
+class PooledAPITest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(
+            credential_pool.credentials_utils, "_get_twitter_auth"
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.apis = []
+        patcher = mock.patch.object(
+            credential_pool.tweepy, "API", side_effect=self.create_api
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.pool = credential_pool.CredentialPool(
+            get_credentials(), rate_limits={ENDPOINT: 10}
+        )
+
+    def create_api(self, auth, **kwargs):
+        api = mock.Mock(last_response=None)
+        self.apis.append(api)
+        return api
+
+    def test_each_call_gets_its_own_api(self):
+        in_flight = []
+
+        def statuses_lookup(tids, **kwargs):
+            # nested call while the first one is in flight
+            if not in_flight:
+                in_flight.append(True)
+                self.pool.get_api().statuses_lookup(tids)
+            return tids
+
+        self.create_api(None).statuses_lookup.side_effect = statuses_lookup
+        self.pool._checkin_api("token0", self.apis[0])
+        self.pool.state.update("token1", ENDPOINT, 10, 0, float("inf"))
+
+        self.assertEqual(self.pool.get_api().statuses_lookup(["1"]), ["1"])
+        self.assertEqual(len(self.apis), 2)
+        self.assertEqual(self.pool._idle_apis["token0"], self.apis[::-1])
+
+        with self.assertRaises(AttributeError):
+            self.pool.get_api().update_status
+
+    def test_budgets_follow_rate_limit_headers(self):
+        def statuses_lookup(tids, **kwargs):
+            api = self.apis[-1]
+            api.last_response = SimpleNamespace(
+                headers={"x-rate-limit-remaining": "2", "x-rate-limit-reset": "1e12"}
+            )
+            return tids
+
+        self.create_api(None).statuses_lookup.side_effect = statuses_lookup
+        self.pool._checkin_api("token0", self.apis[0])
+        self.pool.state.update("token1", ENDPOINT, 10, 0, float("inf"))
+
+        self.pool.get_api().statuses_lookup(["1"])
+        budgets = self.pool.state.get_budgets(["token0"], ENDPOINT, 10)
+        self.assertEqual(budgets["token0"], (2, 1e12))
+
+    def test_rate_limited_calls_are_retried(self):
+        response = SimpleNamespace(
+            status_code=429, headers={"x-rate-limit-reset": "1e12"}
+        )
+        error = Exception("Too Many Requests")
+        error.response = response
+        throttled_api = self.create_api(None)
+        throttled_api.statuses_lookup.side_effect = error
+        self.pool._checkin_api("token0", throttled_api)
+        self.pool.state.update("token1", ENDPOINT, 10, 1, float("inf"))
+        self.pool.state.update("token0", ENDPOINT, 10, 5, float("inf"))
+
+        result = self.pool.get_api().statuses_lookup(["1"])
+
+        self.assertIsInstance(result, mock.Mock)
+        budgets = self.pool.state.get_budgets(self.pool.keys, ENDPOINT, 10)
+        self.assertEqual(budgets["token0"], (0, 1e12))
+        self.assertEqual(self.pool.stats(), {"token0": 1, "token1": 1})
+
+
+class MongoRateLimitStateTest(mockmongo.MongomockTestCase):
+    def test_budgets_are_shared_through_credential_documents(self):
+        collection = self.mongo_client["api"]["api"]
+        collection.insert_many(get_credentials())
+        pools = [
+            credential_pool.CredentialPool(
+                get_credentials(),
+                state=credential_pool.MongoRateLimitState(collection),
+                rate_limits={ENDPOINT: 2},
+            )
+            for _ in range(2)
+        ]
+        for i in range(4):
+            pools[i % 2].acquire(ENDPOINT)
+
+        for doc in collection.find():
+            self.assertEqual(doc["rate_limits"][ENDPOINT]["remaining"], 0)
+        with mock.patch.object(credential_pool.time, "sleep", side_effect=Exhausted):
+            with self.assertRaises(Exhausted):
+                pools[1].acquire(ENDPOINT)
+
+    def test_get_credential_pool(self):
+        collection = self.mongo_client["api"]["api"]
+        db_conn = mock.Mock(_get_collection=mock.Mock(return_value=collection))
+        pool = credential_pool.get_credential_pool(
+            db_conn=db_conn, twitter_credentials=get_credentials(), shared_state="mongo"
+        )
+
+        self.assertIsInstance(pool.state, credential_pool.MongoRateLimitState)
+        db_conn._get_collection.assert_called_once_with("api", db_name="api")
+        with self.assertRaises(ValueError):
+            credential_pool.get_credential_pool(
+                twitter_credentials=get_credentials(), shared_state="redis"
+            )
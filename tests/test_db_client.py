@@ -0,0 +1,101 @@
+import time
+import unittest
+from unittest import mock
+
+import mongomock
+import pymongo
+
+from tweepipe.db import db_client, flush_policy, writer
+
+from tests.utils import mockmongo
+
+
+class FlushPolicyTest(unittest.TestCase):
+    def test_limits(self):
+        policy = flush_policy.FlushPolicy(max_docs=10, max_bytes=100, max_age=5)
+
+        self.assertFalse(policy.is_full(9, 99))
+        self.assertTrue(policy.is_full(10, 0))
+        self.assertTrue(policy.is_full(1, 100))
+        self.assertFalse(policy.is_expired(4.9))
+        self.assertTrue(policy.is_expired(5))
+        self.assertFalse(flush_policy.FlushPolicy().is_expired(1e9))
+
+
+class DBClientWriteTest(mockmongo.MongomockTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tweets = self.mongo_client["test_db_client"]["tweets"]
+
+    def get_client(self, **kwargs) -> db_client.DBClient:
+        client = db_client.DBClient(issue="test_db_client", **kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def fail_inserts(self, error: Exception):
+        return mock.patch.object(
+            mongomock.collection.Collection, "insert_many", side_effect=error
+        )
+
+    def test_failed_writes_are_kept_buffered(self):
+        client = self.get_client(batch_size=2)
+        with self.fail_inserts(pymongo.errors.AutoReconnect("primary stepped down")):
+            client.add_tweet({"tid": "1"})
+            with self.assertRaises(pymongo.errors.AutoReconnect):
+                client.add_tweet({"tid": "2"})
+            with self.assertRaises(pymongo.errors.AutoReconnect):
+                client.flush_content()
+
+        self.assertEqual(len(client.bulk_data["tweets"]), 2)
+        self.assertEqual(self.tweets.count_documents({}), 0)
+
+        client.add_tweet({"tid": "3"})
+        client.flush_content()
+        self.assertEqual(sorted(self.tweets.distinct("tid")), ["1", "2", "3"])
+        self.assertEqual(client.bulk_data["tweets"], [])
+
+    def test_background_writes(self):
+        client = self.get_client(batch_size=2, async_flush=True, writer_count=2)
+        for tid in range(10):
+            client.add_tweet({"tid": str(tid)})
+        client.flush_content(wait=True)
+
+        self.assertEqual(self.tweets.count_documents({}), 10)
+
+    def test_failed_background_writes_are_surfaced(self):
+        client = self.get_client(async_flush=True)
+        client.add_tweet({"tid": "1"})
+        with self.fail_inserts(pymongo.errors.AutoReconnect("primary stepped down")):
+            with self.assertRaises(writer.BatchWriteError) as context:
+                client.flush_content(wait=True)
+
+        ((collection_name, docs, error),) = context.exception.failed_batches
+        self.assertEqual(collection_name, "tweets")
+        self.assertEqual([doc["tid"] for doc in docs], ["1"])
+        self.assertIsInstance(error, pymongo.errors.AutoReconnect)
+
+    def test_failed_timed_flushes_are_retried(self):
+        client = self.get_client(max_batch_age=0.1)
+        with self.fail_inserts(pymongo.errors.AutoReconnect("primary stepped down")):
+            client.add_tweet({"tid": "1"})
+            self.wait_for(lambda: client.metrics.timer_errors())
+
+        self.assertEqual(len(client.bulk_data["tweets"]), 1)
+        self.wait_for(lambda: self.tweets.count_documents({}))
+        self.assertEqual(client.bulk_data["tweets"], [])
+
+    def test_collection_flush_policies(self):
+        client = self.get_client(
+            flush_policies={"tweets": flush_policy.FlushPolicy(max_bytes=1)}
+        )
+        client.add_tweet({"tid": "1"})
+        client.add_user({"uid": "1"})
+
+        self.assertEqual(self.tweets.count_documents({}), 1)
+        self.assertEqual(len(client.bulk_data["users"]), 1)
+
+    def wait_for(self, condition, timeout: float = 5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "condition not met in time")
+            time.sleep(0.01)
@@ -0,0 +1,157 @@
+import unittest
+from unittest import mock
+
+from tweepipe.db import db_client, dedup, storage, writer
+
+
+class MemoryBackend(storage.StorageBackend):
+    """Keep written batches in memory, failing the writes while `fail` is set."""
+
+    def __init__(self):
+        self.batches = []
+        self.fail = False
+
+    def write(self, collection_name: str, docs: list) -> storage.WriteResult:
+        if self.fail:
+            raise ValueError("write failed")
+
+        self.batches.append((collection_name, list(docs)))
+        return storage.WriteResult(len(docs))
+
+    def get_written_tids(self) -> list:
+        return [
+            doc["tid"]
+            for collection_name, docs in self.batches
+            if collection_name == "tweets"
+            for doc in docs
+        ]
+
+
+class SeenSetTest(unittest.TestCase):
+    def test_evicts_least_recently_seen_keys(self):
+        seen = dedup.SeenSet(capacity=2)
+        seen.add("a")
+        seen.add("b")
+
+        # refreshes a, b becoming the least recently seen key
+        self.assertTrue(seen.contains("a"))
+        seen.add("c")
+
+        self.assertEqual(len(seen), 2)
+        self.assertTrue(seen.contains("a"))
+        self.assertFalse(seen.contains("b"))
+        self.assertTrue(seen.contains("c"))
+
+    def test_forgets_keys_after_ttl(self):
+        seen = dedup.SeenSet(ttl=10)
+        with mock.patch.object(dedup.time, "monotonic", return_value=100.0):
+            seen.add("a")
+        with mock.patch.object(dedup.time, "monotonic", return_value=109.0):
+            self.assertTrue(seen.contains("a"))
+        with mock.patch.object(dedup.time, "monotonic", return_value=110.0):
+            self.assertFalse(seen.contains("a"))
+            self.assertFalse(seen.check_and_add("a"))
+            self.assertTrue(seen.check_and_add("a"))
+
+
+class BloomFilterTest(unittest.TestCase):
+    def test_no_false_negatives(self):
+        bloom = dedup.BloomFilter(capacity=10000)
+        keys = [str(i) for i in range(5000)]
+        for key in keys:
+            bloom.add(key)
+
+        self.assertTrue(all(bloom.contains(key) for key in keys))
+        false_positives = sum(bloom.contains(f"x{i}") for i in range(5000))
+        self.assertLess(false_positives, 50)
+
+    def test_forgets_keys_after_two_generations(self):
+        bloom = dedup.BloomFilter(capacity=100)
+        for i in range(100):
+            self.assertFalse(bloom.check_and_add(str(i)))
+
+        # previous generation still looked up
+        self.assertEqual(len(bloom), 0)
+        self.assertTrue(bloom.contains("0"))
+
+        for i in range(100, 200):
+            bloom.add(str(i))
+        self.assertFalse(bloom.contains("0"))
+        self.assertTrue(bloom.contains("150"))
+
+
+class DeduplicatorTest(unittest.TestCase):
+    def test_rejects_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            dedup.Deduplicator(mode="hash")
+
+    def test_filter_commit_discard(self):
+        for mode in ("lru", "bloom"):
+            with self.subTest(mode=mode):
+                deduplicator = dedup.Deduplicator(mode=mode, capacity=1000)
+                docs = [{"tid": "1"}, {"tid": "2"}, {"tid": "1"}, {"id": "3"}]
+
+                # duplicates within pending batches are dropped as well
+                unseen_docs = deduplicator.filter("tweets", docs)
+                self.assertEqual(unseen_docs, [{"tid": "1"}, {"tid": "2"}, {"id": "3"}])
+                self.assertEqual(deduplicator.filter("tweets", [{"tid": "2"}]), [])
+
+                # failed batches are let through again
+                deduplicator.discard("tweets", [{"tid": "2"}])
+                self.assertEqual(
+                    deduplicator.filter("tweets", [{"tid": "2"}]), [{"tid": "2"}]
+                )
+
+                deduplicator.commit("tweets", unseen_docs)
+                self.assertEqual(deduplicator.filter("tweets", docs), [])
+                self.assertEqual(deduplicator.stats()["tweets"]["pending"], 0)
+
+    def test_documents_without_key_or_collection_are_kept(self):
+        deduplicator = dedup.Deduplicator()
+        docs = [{"text": "a"}, {"text": "a"}]
+
+        self.assertEqual(deduplicator.filter("tweets", docs), docs)
+        self.assertEqual(deduplicator.filter("hashtags", docs), docs)
+
+
+class DBClientDedupTest(unittest.TestCase):
+    def get_client(self, **kwargs) -> db_client.DBClient:
+        self.backend = MemoryBackend()
+        return db_client.DBClient(
+            issue="test_dedup", backend=self.backend, dedup_mode="lru", **kwargs
+        )
+
+    def test_drops_written_duplicates(self):
+        client = self.get_client(batch_size=2)
+        for tid in ["1", "2", "1", "3", "2"]:
+            client.add_tweet({"tid": tid})
+        client.flush_content()
+
+        self.assertEqual(self.backend.get_written_tids(), ["1", "2", "3"])
+
+    def test_failed_batches_are_not_dropped_when_added_again(self):
+        client = self.get_client()
+        self.backend.fail = True
+        client.add_tweet({"tid": "1"})
+        with self.assertRaises(ValueError):
+            client.flush_content()
+
+        self.backend.fail = False
+        client.add_tweet({"tid": "1"})
+        client.flush_content()
+
+        self.assertEqual(self.backend.get_written_tids(), ["1"])
+
+    def test_failed_background_batches_are_not_dropped_when_added_again(self):
+        client = self.get_client(async_flush=True)
+        self.addCleanup(client.close)
+        self.backend.fail = True
+        client.add_tweet({"tid": "1"})
+        with self.assertRaises(writer.BatchWriteError):
+            client.flush_content(wait=True)
+
+        self.backend.fail = False
+        client.add_tweet({"tid": "1"})
+        client.flush_content(wait=True)
+
+        self.assertEqual(self.backend.get_written_tids(), ["1"])
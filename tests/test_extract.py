@@ -0,0 +1,271 @@
+import copy
+import datetime
+import random
+import unittest
+
+from tweepipe import settings
+from tweepipe.db import records
+from tweepipe.legacy.utils import extract
+from tweepipe.utils import relation
+
+from tests.utils import test_config
+
+
+def _parse(ts):
+    return datetime.datetime.strptime(ts, settings.TWEET_TS_STR_FORMAT)
+
+
+def _get_status_relations(status):
+    """Reply, hashtag and mention relations of a status, as extracted before the
+    single pass extraction."""
+
+    user = status["user"]
+    created_at = _parse(status["created_at"])
+    replies, hashtags, mentions = [], [], []
+    if status["in_reply_to_status_id"] and status["in_reply_to_user_id"]:
+        replies.append(
+            {
+                "in_reply_to_tweet_id": status["in_reply_to_status_id_str"],
+                "in_reply_to_user_id": status["in_reply_to_user_id_str"],
+                "in_reply_to_screen_name": status.get("in_reply_to_screen_name"),
+                "tid": status["id_str"],
+                "user_id": user["id_str"],
+                "user_screen_name": user["screen_name"],
+                "created_at": created_at,
+            }
+        )
+    for hashtag in status["entities"]["hashtags"]:
+        hashtags.append(
+            {
+                "user_id": user["id_str"],
+                "user_screen_name": user["screen_name"],
+                "hashtag": hashtag["text"],
+                "tid": status["id_str"],
+                "created_at": created_at,
+            }
+        )
+    for mention in status["entities"]["user_mentions"]:
+        if "id_str" in mention:
+            mentions.append(
+                {
+                    "user_id": user["id_str"],
+                    "user_screen_name": user["screen_name"],
+                    "mentioned_user_id": mention["id_str"],
+                    "mentioned_user_screen_name": mention["screen_name"],
+                    "tid": status["id_str"],
+                    "created_at": created_at,
+                }
+            )
+
+    return replies, hashtags, mentions
+
+
+def _get_embedded_relation(status, embedded_field, prefix, id_field):
+    try:
+        embedded = status[embedded_field]
+        return [
+            {
+                "user_id": status["user"]["id_str"],
+                "user_screen_name": status["user"]["screen_name"],
+                f"{prefix}_user_screen_name": embedded["user"]["screen_name"],
+                f"{prefix}_user_id": embedded["user"]["id_str"],
+                id_field: embedded["id_str"],
+                "tid": status["id_str"],
+                "created_at": _parse(status["created_at"]),
+            }
+        ]
+    except KeyError:
+        return []
+
+
+def get_baseline_relations(tweet):
+    """Relations of a tweet, traversing the tweet once per relation type."""
+
+    statuses = [tweet]
+    relations = {"hashtag": [], "retweet": [], "mention": [], "quote": [], "reply": []}
+    if "quoted_status" in tweet:
+        relations["quote"] += _get_embedded_relation(
+            tweet, "quoted_status", "quoted", "quoted_tweet_id"
+        )
+        statuses.append(tweet["quoted_status"])
+    if "retweeted_status" in tweet:
+        relations["retweet"] += _get_embedded_relation(
+            tweet, "retweeted_status", "retweeted", "retweet_id"
+        )
+        statuses.append(tweet["retweeted_status"])
+        if "quoted_status" in tweet:
+            relations["quote"] += _get_embedded_relation(
+                tweet["retweeted_status"], "quoted_status", "quoted", "quoted_tweet_id"
+            )
+            statuses.append(tweet["retweeted_status"]["quoted_status"])
+
+    for status in statuses:
+        replies, hashtags, mentions = _get_status_relations(status)
+        relations["reply"] += replies
+        relations["hashtag"] += hashtags
+        relations["mention"] += mentions
+
+    return relations
+
+
+def get_baseline_users(tweet):
+    """Users of a tweet and of its embedded statuses, with the creation date of the
+    status they were found in."""
+
+    statuses = [tweet]
+    if "quoted_status" in tweet:
+        statuses.append(tweet["quoted_status"])
+    if "retweeted_status" in tweet:
+        statuses.append(tweet["retweeted_status"])
+        if "quoted_status" in tweet["retweeted_status"]:
+            statuses.append(tweet["retweeted_status"]["quoted_status"])
+
+    return [
+        (status["user"]["id_str"], _parse(status["created_at"])) for status in statuses
+    ]
+
+
+def get_status(rng: random.Random, tid: int, reply: bool = False) -> dict:
+    status = {
+        "id_str": str(tid),
+        "created_at": f"Wed Jan 06 21:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d} +0000 2021",
+        "user": {"id_str": f"u{tid}", "screen_name": f"user{tid}"},
+        "in_reply_to_status_id": tid - 1 if reply else None,
+        "in_reply_to_user_id": tid - 2 if reply else None,
+        "in_reply_to_status_id_str": str(tid - 1),
+        "in_reply_to_user_id_str": str(tid - 2),
+        "entities": {
+            "hashtags": [{"text": f"tag{i}"} for i in range(rng.randint(0, 3))],
+            "user_mentions": [
+                (
+                    {"id_str": f"m{i}", "screen_name": f"mentioned{i}"}
+                    if i % 2 == 0
+                    else {"screen_name": f"mentioned{i}"}
+                )
+                for i in range(rng.randint(0, 3))
+            ],
+        },
+    }
+    if reply and rng.random() < 0.5:
+        status["in_reply_to_screen_name"] = f"user{tid - 2}"
+
+    return status
+
+
+def get_tweets(count: int = 300) -> list:
+    rng = random.Random(0)
+    tweets = []
+    for i in range(count):
+        tid = 10 * i
+        tweet = get_status(rng, tid, reply=rng.random() < 0.3)
+        kind = rng.random()
+        if kind < 0.25:
+            tweet["quoted_status"] = get_status(rng, tid + 1, reply=rng.random() < 0.5)
+        elif kind < 0.5:
+            tweet["retweeted_status"] = get_status(rng, tid + 2)
+        else:
+            retweet = get_status(rng, tid + 2)
+            retweet["quoted_status"] = get_status(rng, tid + 3, reply=True)
+            tweet["retweeted_status"] = retweet
+            # a retweet of a quote is given the quote as well
+            if kind < 0.75:
+                tweet["quoted_status"] = copy.deepcopy(retweet["quoted_status"])
+        tweets.append(tweet)
+
+    return tweets
+
+
+class ExtractTest(unittest.TestCase):
+    def test_single_pass_matches_baseline(self):
+        for tweet in get_tweets():
+            relations, users = extract._get_content(tweet)
+
+            self.assertEqual(
+                [(user["uid"], user["seen_at"]) for user in users],
+                get_baseline_users(tweet),
+            )
+            self.assertEqual(
+                {
+                    relation_type: records.to_docs(relation_records)
+                    for relation_type, relation_records in relations.items()
+                },
+                get_baseline_relations(tweet),
+            )
+
+    def test_tweets_are_not_modified(self):
+        for tweet in get_tweets(20):
+            original_tweet = copy.deepcopy(tweet)
+            tweet_doc, _, _ = extract.extract_content_from_tweet(
+                tweet, include_users=False
+            )
+
+            self.assertEqual(tweet, original_tweet)
+            self.assertEqual(
+                tweet_doc["json"]["created_at"], _parse(tweet["created_at"])
+            )
+
+            # stored tweets are extracted again as is
+            stored_doc, _, _ = extract.extract_content_from_tweet(
+                tweet_doc["json"], include_users=False
+            )
+            self.assertEqual(stored_doc, tweet_doc)
+
+
+class RelationParserTest(unittest.TestCase):
+    def assert_batch_matches_per_tweet_parsing(self, parser, tweets):
+        relations = parser.parse_relations_from_batch(tweets)
+        self.assertEqual(
+            relations,
+            relation.BaseRelationParser.parse_relations_from_batch(parser, tweets),
+        )
+        self.assertEqual(
+            parser.get_relation_docs(relations),
+            {
+                relation_type: [
+                    relation_doc
+                    for tweet in tweets
+                    for relation_doc in parser.parse_relations_from_tweet(tweet)[
+                        relation_type
+                    ]
+                ]
+                for relation_type in parser.relation_types
+            },
+        )
+
+    def test_academic_batch_parsing(self):
+        # last items of the response hold its includes and metadata
+        tweets = [
+            tweet
+            for tweet in copy.deepcopy(test_config.sample_v2_response)
+            if "created_at" in tweet
+        ]
+        for tweet in tweets:
+            for mention in tweet.get("entities", {}).get("mentions", []):
+                mention["id"] = f"id_{mention['username']}"
+
+        parser = relation.AcademicRelationParser(None)
+        relations = parser.parse_relations_from_batch(tweets)
+        self.assertTrue(relations["retweets"])
+        self.assert_batch_matches_per_tweet_parsing(parser, tweets)
+
+    def test_standard_batch_parsing(self):
+        # stored tweets, exported with their creation dates in extended json, the
+        # screen names of replied users being missing from some of them
+        tweets = get_tweets()
+        for tweet in tweets:
+            statuses = [tweet, tweet.get("quoted_status")]
+            if "retweeted_status" in tweet:
+                statuses.append(tweet["retweeted_status"])
+                statuses.append(tweet["retweeted_status"].get("quoted_status"))
+            for status in filter(None, statuses):
+                status["created_at"] = {
+                    "$date": _parse(status["created_at"]).strftime(
+                        settings.TWITTER_API_V1_STR_FORMAT
+                    )
+                }
+
+        parser = relation.StandardRelationParser(None)
+        relations = parser.parse_relations_from_batch(tweets)
+        self.assertTrue(relations["quotes"])
+        self.assertTrue(relations["replies"])
+        self.assert_batch_matches_per_tweet_parsing(parser, tweets)
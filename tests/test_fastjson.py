@@ -0,0 +1,58 @@
+import importlib.util
+import io
+import json
+import math
+import sys
+import unittest
+from unittest import mock
+
+from tweepipe.utils import fastjson
+
+TWEET = {"id": 1346928882595885058, "text": "été", "entities": {"hashtags": []}}
+
+
+def get_json_fastjson():
+    """Load a copy of fastjson as if orjson was not installed."""
+
+    spec = importlib.util.spec_from_file_location("json_fastjson", fastjson.__file__)
+    module = importlib.util.module_from_spec(spec)
+    with mock.patch.dict(sys.modules, {"orjson": None}):
+        spec.loader.exec_module(module)
+
+    return module
+
+
+class FastJsonTest(unittest.TestCase):
+    def setUp(self):
+        self.json_fastjson = get_json_fastjson()
+
+    def test_json_fallback(self):
+        self.assertEqual(self.json_fastjson.BACKEND, "json")
+
+    def test_loads(self):
+        raw_tweet = json.dumps(TWEET, ensure_ascii=False)
+        for module in (fastjson, self.json_fastjson):
+            with self.subTest(backend=module.BACKEND):
+                for data in (
+                    raw_tweet,
+                    raw_tweet.encode("utf-8"),
+                    bytearray(raw_tweet.encode("utf-8")),
+                    memoryview(raw_tweet.encode("utf-8")),
+                ):
+                    self.assertEqual(module.loads(data), TWEET)
+
+    def test_documents_beyond_strict_json(self):
+        for module in (fastjson, self.json_fastjson):
+            with self.subTest(backend=module.BACKEND):
+                self.assertTrue(math.isnan(module.loads('{"score": NaN}')["score"]))
+                with self.assertRaises(json.JSONDecodeError):
+                    module.loads(b'{"id": ')
+
+    def test_iter_lines_skips_blank_lines(self):
+        lines = b'{"id": 1}\n\n  \n{"id": 2}\n'
+        for module in (fastjson, self.json_fastjson):
+            with self.subTest(backend=module.BACKEND):
+                self.assertEqual(
+                    list(module.iter_lines(io.BytesIO(lines))), [{"id": 1}, {"id": 2}]
+                )
+                self.assertEqual(module.load(io.BytesIO(b'[{"id": 1}]')), [{"id": 1}])
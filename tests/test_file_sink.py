@@ -0,0 +1,133 @@
+import gzip
+import json
+import os
+import signal
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from tweepipe.utils import file_sink
+
+
+def read_lines(filepath: Path) -> list:
+    opener = gzip.open if filepath.suffix == ".gz" else open
+    with opener(filepath, "rt") as f:
+        return [json.loads(line) for line in f]
+
+
+class FileSinkTest(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.directory = Path(tmp_dir.name)
+
+    def test_rotation(self):
+        sink = file_sink.FileSink(self.directory, prefix="tweets", max_file_bytes=20)
+        docs = [{"tid": str(i)} for i in range(5)]
+        for doc in docs:
+            sink.write(doc)
+        sink.close()
+
+        # a new file is started once the current one holds 20 bytes
+        self.assertEqual(len(sink.filepaths), 3)
+        self.assertTrue(all(path.name.startswith("tweets-") for path in sink.filepaths))
+        self.assertTrue(all(path.name.endswith(".jsonl.gz") for path in sink.filepaths))
+        self.assertEqual(
+            [doc for path in sink.filepaths for doc in read_lines(path)], docs
+        )
+
+    def test_single_file_is_appended_to(self):
+        for _ in range(2):
+            sink = file_sink.FileSink(
+                self.directory, compression="gzip", filename="out.jsonl.gz"
+            )
+            sink.write_many([{"tid": "1"}, {"tid": "2"}])
+            sink.rotate()
+            sink.write({"tid": "3"})
+            sink.close()
+
+        self.assertEqual(
+            [path.name for path in self.directory.iterdir()], ["out.jsonl.gz"]
+        )
+        self.assertEqual(
+            [doc["tid"] for doc in read_lines(self.directory / "out.jsonl.gz")],
+            ["1", "2", "3"] * 2,
+        )
+
+    def test_from_path(self):
+        sink = file_sink.FileSink.from_path(self.directory / "tweets.jsonl")
+        sink.write({"tid": "1"})
+        sink.close()
+        self.assertEqual(sink.filepaths, [self.directory / "tweets.jsonl"])
+        self.assertEqual(read_lines(sink.filepaths[0]), [{"tid": "1"}])
+
+        sink = file_sink.FileSink.from_path(
+            self.directory / "out" / "tweets.jsonl.gz", rotate=True
+        )
+        sink.write({"tid": "1"})
+        sink.close()
+        (filepath,) = sink.filepaths
+        self.assertEqual(filepath.parent, self.directory / "out")
+        self.assertRegex(filepath.name, r"^tweets-\d{8}T\d{6}-00001\.jsonl\.gz$")
+        self.assertEqual(read_lines(filepath), [{"tid": "1"}])
+
+    def test_shared_sinks(self):
+        path = str(self.directory / "tweets.jsonl")
+        with mock.patch.object(file_sink, "close_on_exit"):
+            sink = file_sink.get_sink(path)
+            self.addCleanup(file_sink._PATH_SINKS.pop, os.path.abspath(path))
+            self.assertIs(file_sink.get_sink(path), sink)
+        sink.close()
+
+
+class CloseOnExitTest(unittest.TestCase):
+    def setUp(self):
+        for name, value in [
+            ("_EXIT_SINKS", set()),
+            ("_exit_hooks_installed", False),
+            ("_signal_handler_installed", False),
+        ]:
+            patcher = mock.patch.object(file_sink, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(file_sink.atexit, "register")
+        self.register = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(file_sink.signal, "signal")
+        self.set_signal = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_signals_are_left_alone_by_default(self):
+        sink = mock.Mock()
+        file_sink.close_on_exit(sink)
+        file_sink.close_on_exit(sink)
+
+        self.register.assert_called_once_with(file_sink._close_exit_sinks)
+        self.set_signal.assert_not_called()
+
+        file_sink._close_exit_sinks()
+        sink.close.assert_called_once()
+
+    def test_sigterm_opt_in(self):
+        with mock.patch.object(
+            file_sink.signal, "getsignal", return_value=signal.SIG_DFL
+        ):
+            file_sink.close_on_exit(mock.Mock(), handle_signals=True)
+            file_sink.close_on_exit(mock.Mock(), handle_signals=True)
+
+        self.set_signal.assert_called_once_with(
+            signal.SIGTERM, file_sink._raise_system_exit
+        )
+        with self.assertRaises(SystemExit):
+            file_sink._raise_system_exit(signal.SIGTERM, None)
+
+    def test_existing_sigterm_handler_is_kept(self):
+        with mock.patch.object(
+            file_sink.signal, "getsignal", return_value=lambda *args: None
+        ):
+            file_sink.close_on_exit(mock.Mock(), handle_signals=True)
+
+        self.set_signal.assert_not_called()
@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from tweepipe import hydrating
+
+from tests.utils import mockmongo
+
+
+class RunHydrationTest(mockmongo.MongomockTestCase):
+    def get_api(self, failing_tid: str = None):
+        def statuses_lookup(tids, **kwargs):
+            if failing_tid in tids:
+                raise ConnectionError("lookup failed")
+            # deleted tweets only hold their id
+            return [SimpleNamespace(_json={"id": int(tid)}) for tid in tids]
+
+        return mock.Mock(statuses_lookup=mock.Mock(side_effect=statuses_lookup))
+
+    def test_hydration(self):
+        tweet_ids = [str(tid) for tid in range(250)]
+        counts = hydrating._run_hydration(
+            self.get_api(), tweet_ids, issue="test_hydrating", concurrency=2
+        )
+
+        self.assertEqual(counts, (0, 250, 250))
+        missing_tids = self.mongo_client["test_hydrating"]["missing_tids"]
+        self.assertEqual(missing_tids.count_documents({}), 250)
+
+    def test_failed_lookups_are_raised(self):
+        tweet_ids = [str(tid) for tid in range(250)]
+        with self.assertRaises(hydrating.HydrationError) as context:
+            hydrating._run_hydration(
+                self.get_api(failing_tid="150"),
+                tweet_ids,
+                issue="test_hydrating",
+                concurrency=2,
+            )
+
+        self.assertEqual(
+            sorted(context.exception.failed_tids, key=int), tweet_ids[100:200]
+        )
+        self.assertEqual(context.exception.counts, (0, 150, 150))
@@ -0,0 +1,92 @@
+import random
+import unittest
+
+from tweepipe.utils import keywords
+
+
+def is_tweet_related(tweet: dict, keywords: list, search_field: str = "text"):
+    """Substring check of searching.is_tweet_related before the keyword matcher."""
+
+    def is_related(text, keywords):
+        text = text.lower().strip().replace("ー", "-")
+        for keyword in keywords:
+            if keyword in text:
+                return True
+        return False
+
+    keywords = [keyword.strip().lower().replace("ー", "-") for keyword in keywords]
+    texts = []
+    if "quoted_status" in tweet:
+        texts.append(tweet["quoted_status"][search_field])
+    if "retweeted_status" in tweet:
+        if "quoted_status" in tweet["retweeted_status"]:
+            texts.append(tweet["retweeted_status"]["quoted_status"][search_field])
+        texts.append(tweet["retweeted_status"][search_field])
+    texts.append(tweet[search_field])
+
+    return any(is_related(text, keywords) for text in texts)
+
+
+class KeywordMatcherTest(unittest.TestCase):
+    # small alphabet for keywords to overlap, share prefixes and suffixes
+    ALPHABET = "abAB -ーé"
+
+    def get_text(self, rng: random.Random, max_length: int) -> str:
+        return "".join(
+            rng.choice(self.ALPHABET) for _ in range(rng.randint(0, max_length))
+        )
+
+    def get_tweet(self, rng: random.Random) -> dict:
+        tweet = {"text": self.get_text(rng, 30)}
+        if rng.random() < 0.3:
+            tweet["quoted_status"] = {"text": self.get_text(rng, 30)}
+        if rng.random() < 0.3:
+            tweet["retweeted_status"] = {"text": self.get_text(rng, 30)}
+            if rng.random() < 0.5:
+                tweet["retweeted_status"]["quoted_status"] = {
+                    "text": self.get_text(rng, 30)
+                }
+
+        return tweet
+
+    def test_matches_substring_check(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            keyword_list = [self.get_text(rng, 5) for _ in range(rng.randint(1, 6))]
+            matcher = keywords.KeywordMatcher(keyword_list)
+            for _ in range(20):
+                tweet = self.get_tweet(rng)
+                texts = keywords.get_tweet_texts(tweet)
+
+                self.assertEqual(
+                    matcher.search(texts), is_tweet_related(tweet, keyword_list)
+                )
+                self.assertEqual(
+                    matcher.find(texts),
+                    {
+                        keyword
+                        for keyword in keyword_list
+                        if is_tweet_related(tweet, [keyword])
+                    },
+                )
+
+    def test_keywords_do_not_span_texts(self):
+        matcher = keywords.KeywordMatcher(["ab"])
+
+        self.assertFalse(matcher.search(["xa", "bx"]))
+        self.assertTrue(matcher.search(["xa", "abx"]))
+
+    def test_find_returns_keywords_as_passed(self):
+        matcher = keywords.KeywordMatcher(["Biden ", "biden", "US", "ーx"])
+
+        self.assertEqual(matcher.find("Joe BIDEN"), {"Biden ", "biden"})
+        self.assertEqual(matcher.find("in the us -x"), {"US", "ーx"})
+        self.assertEqual(len(matcher), 4)
+
+    def test_ngrams_of_contained_keywords(self):
+        text = "Never knew US law enforcement could show this"
+        ngrams = keywords.get_ngrams(text)
+
+        for keyword in ["law enforcement", "NEVER", "show this"]:
+            self.assertTrue(keywords.get_ngrams(keyword) <= ngrams)
+        self.assertFalse(keywords.get_ngrams("biden") <= ngrams)
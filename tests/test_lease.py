@@ -0,0 +1,80 @@
+import datetime
+from unittest import mock
+
+from tweepipe.db import lease
+
+from tests.utils import mockmongo
+
+
+class LeaseClaimerTest(mockmongo.MongomockTestCase):
+    def setUp(self):
+        super().setUp()
+        self.collection = self.mongo_client["test_lease"]["hydrating_tids"]
+        self.collection.insert_many(
+            [{"tid": str(i), "tid_int": i, "status": 0} for i in range(10)]
+        )
+
+    def get_claimer(self, **kwargs) -> lease.LeaseClaimer:
+        kwargs.setdefault("block_size", 4)
+        return lease.LeaseClaimer(
+            self.collection, sort=[("tid_int", 1)], owner="worker", **kwargs
+        )
+
+    def test_claims_distinct_blocks(self):
+        first, second = self.get_claimer(), self.get_claimer()
+
+        first_tids = [doc["tid"] for doc in first.claim()]
+        second_tids = [doc["tid"] for doc in second.claim()]
+
+        self.assertEqual(first_tids, ["0", "1", "2", "3"])
+        self.assertEqual(second_tids, ["4", "5", "6", "7"])
+        self.assertEqual(self.collection.count_documents({"status": 1}), 8)
+        self.assertEqual(
+            self.collection.count_documents({"lease_id": first.lease_id}), 4
+        )
+
+    def test_expired_leases_are_claimed_again(self):
+        crashed = self.get_claimer(block_size=10)
+        crashed.claim()
+        self.assertEqual(self.get_claimer().claim(), [])
+
+        self.collection.update_many(
+            {"status": 1},
+            {"$set": {"lease_expires": datetime.datetime(2000, 1, 1)}},
+        )
+        self.assertEqual(len(self.get_claimer(block_size=10).claim()), 10)
+
+        # processing documents without any lease are claimable as well
+        self.collection.update_many(
+            {}, {"$set": {"status": 1}, "$unset": {"lease_expires": ""}}
+        )
+        self.assertEqual(len(self.get_claimer(block_size=10).claim()), 10)
+
+    def test_renew_release_and_complete(self):
+        claimer = self.get_claimer(lease_seconds=60)
+        first_block = claimer.claim()
+        first_lease_id = claimer.lease_id
+        claimer.claim()
+        self.assertFalse(claimer.should_renew())
+
+        # held leases are renewed together
+        with mock.patch.object(claimer, "lease_seconds", 1000):
+            self.assertTrue(claimer.should_renew())
+            claimer.renew()
+        self.assertFalse(claimer.should_renew())
+        expiries = self.collection.distinct("lease_expires", {"status": 1})
+        self.assertEqual(len(expiries), 1)
+
+        # completed blocks are no longer renewed nor released
+        self.collection.bulk_write(
+            [claimer.get_status_update(doc["_id"], 2) for doc in first_block]
+        )
+        claimer.complete(first_lease_id)
+        claimer.release()
+
+        self.assertEqual(self.collection.count_documents({"status": 2}), 4)
+        self.assertEqual(self.collection.count_documents({"status": 0}), 6)
+        self.assertEqual(
+            self.collection.count_documents({"lease_id": {"$exists": True}}), 0
+        )
+        self.assertIsNone(claimer.lease_id)
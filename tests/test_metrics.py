@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+import unittest
+
+from tweepipe.db import db_client, metrics
+
+from tests.utils import mockmongo
+
+
+class DBMetricsTest(unittest.TestCase):
+    def test_record_write(self):
+        db_metrics = metrics.DBMetrics()
+        db_metrics.record_write(
+            "tweets",
+            doc_count=3,
+            byte_count=300,
+            latency=0.002,
+            inserted_count=1,
+            write_errors=[{"code": 11000}, {"code": 11000}],
+        )
+        db_metrics.record_write("tweets", doc_count=2, byte_count=200, latency=20)
+
+        tweets = db_metrics.to_dict()["tweets"]
+        self.assertEqual(tweets["batches"], 2)
+        self.assertEqual(tweets["docs"], 5)
+        self.assertEqual(tweets["inserted"], 3)
+        self.assertEqual(tweets["bytes"], 500)
+        self.assertEqual(tweets["duplicate_key_errors"], 2)
+        self.assertEqual(tweets["write_errors"], 0)
+        self.assertAlmostEqual(tweets["latency_sum"], 20.002)
+        self.assertEqual(tweets["latency_histogram"]["0.005"], 1)
+        self.assertEqual(tweets["latency_histogram"]["inf"], 1)
+        self.assertEqual(sum(tweets["latency_histogram"].values()), 2)
+
+    def test_record_errors(self):
+        db_metrics = metrics.DBMetrics()
+        db_metrics.record_write(
+            "users",
+            doc_count=2,
+            byte_count=0,
+            latency=0.1,
+            inserted_count=1,
+            write_errors=[{"code": 121}],
+        )
+        db_metrics.record_error("users")
+        db_metrics.record_timer_error("flush")
+        db_metrics.record_timer_error("flush")
+
+        users = db_metrics.to_dict()["users"]
+        self.assertEqual(users["write_errors"], 1)
+        self.assertEqual(users["duplicate_key_errors"], 0)
+        self.assertEqual(users["errors"], 1)
+        self.assertEqual(db_metrics.timer_errors(), {"flush": 2})
+
+    def test_export_stats(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_file = os.path.join(tmp_dir, "stats.jsonl")
+            metrics.export_stats({"issue": "a"}, output_file)
+            metrics.export_stats({"issue": "b"}, output_file)
+
+            with open(output_file) as f:
+                records = [json.loads(line) for line in f]
+
+        self.assertEqual([record["issue"] for record in records], ["a", "b"])
+        self.assertTrue(all("ts" in record for record in records))
+
+
+class DBClientMetricsTest(mockmongo.MongomockTestCase):
+    def test_stats(self):
+        client = db_client.DBClient(issue="test_metrics")
+        self.addCleanup(client.close)
+        client.add_tweet({"tid": "1"})
+        self.assertEqual(client.stats()["buffers"]["tweets"]["docs"], 1)
+
+        client.flush_content()
+        stats = client.stats()
+        self.assertEqual(stats["issue"], "test_metrics")
+        self.assertEqual(stats["collections"]["tweets"]["inserted"], 1)
+        self.assertGreater(stats["collections"]["tweets"]["bytes"], 0)
+        self.assertEqual(stats["buffers"]["tweets"]["docs"], 0)
@@ -0,0 +1,97 @@
+import threading
+import unittest
+
+from tweepipe.utils import pipeline
+
+
+class StageTest(unittest.TestCase):
+    def test_rejects_invalid_policies(self):
+        with self.assertRaises(ValueError):
+            pipeline.Stage("parse", fn=str, overflow="retry")
+        with self.assertRaises(ValueError):
+            pipeline.Stage("parse", fn=str, overflow="spill")
+
+    def test_drop_policy(self):
+        # without workers, the queue is never consumed
+        stage = pipeline.Stage("parse", fn=str, max_queue_size=2, overflow="drop")
+
+        self.assertEqual([stage.put(i) for i in range(4)], [True, True, False, False])
+        self.assertEqual(stage.drain(), [0, 1])
+        stats = stage.stats()
+        self.assertEqual(stats["received"], 4)
+        self.assertEqual(stats["dropped"], 2)
+        self.assertEqual(stats["spilled"], 0)
+        self.assertEqual(stats["queue_size"], 0)
+
+    def test_spill_policy(self):
+        spilled = []
+        stage = pipeline.Stage(
+            "parse", fn=str, max_queue_size=1, overflow="spill", spill_fn=spilled.append
+        )
+
+        self.assertEqual([stage.put(i) for i in range(3)], [True, False, False])
+        self.assertEqual(spilled, [1, 2])
+        self.assertEqual(stage.stats()["spilled"], 2)
+        self.assertEqual(stage.stats()["dropped"], 0)
+
+    def test_block_policy(self):
+        started, release = threading.Event(), threading.Event()
+
+        def wait(item):
+            started.set()
+            release.wait()
+
+        stage = pipeline.Stage("parse", fn=wait, max_queue_size=1, overflow="block")
+        stage.start()
+        self.addCleanup(stage.stop)
+        self.addCleanup(release.set)
+
+        stage.put(0)
+        started.wait(5)
+        stage.put(1)
+        # the producer waits for the worker to take an item off the full queue
+        producer = threading.Thread(target=stage.put, args=(2,), daemon=True)
+        producer.start()
+        producer.join(0.1)
+        self.assertTrue(producer.is_alive())
+
+        release.set()
+        producer.join(5)
+        self.assertFalse(producer.is_alive())
+        stage.join()
+        self.assertEqual(stage.stats()["processed"], 3)
+        self.assertEqual(stage.stats()["dropped"], 0)
+
+
+class PipelineTest(unittest.TestCase):
+    def test_results_go_through_all_stages(self):
+        results = []
+        lock = threading.Lock()
+
+        def collect(item):
+            with lock:
+                results.append(item)
+
+        def parse(item):
+            if item == "fail":
+                raise ValueError(item)
+            # filtered items are not passed on
+            return int(item) if item != "skip" else None
+
+        stages = [
+            pipeline.Stage("parse", fn=parse, worker_count=2),
+            pipeline.Stage("square", fn=lambda item: item * item),
+            pipeline.Stage("collect", fn=collect),
+        ]
+        tweet_pipeline = pipeline.Pipeline(stages)
+        for item in ["1", "skip", "2", "fail", "3"]:
+            self.assertTrue(tweet_pipeline.put(item))
+        tweet_pipeline.join()
+        tweet_pipeline.close()
+
+        self.assertEqual(sorted(results), [1, 4, 9])
+        stats = tweet_pipeline.stats()
+        self.assertEqual(stats["parse"]["processed"], 5)
+        self.assertEqual(stats["parse"]["errors"], 1)
+        self.assertEqual(stats["square"]["received"], 3)
+        self.assertEqual(stats["collect"]["processed"], 3)
@@ -0,0 +1,58 @@
+import datetime
+import unittest
+
+from tweepipe.utils import search_plan
+
+
+class SearchPlanTest(unittest.TestCase):
+    def test_queries(self):
+        plan = search_plan.SearchPlan(
+            keywords=["covid", "vaccine"], exclude_retweet=True
+        )
+
+        self.assertEqual(plan.get_query(), "( covid OR vaccine ) -is:retweet")
+        self.assertEqual(
+            plan.get_query(uid="12"), "( covid OR vaccine ) from:12 -is:retweet"
+        )
+        self.assertEqual(search_plan.SearchPlan().get_query(uid="12"), "from:12")
+
+    def test_packed_queries_respect_length_limit(self):
+        uids = [str(10**12 + i) for i in range(500)]
+        for keywords in ([], ["covid", "vaccine"]):
+            with self.subTest(keywords=keywords):
+                plan = search_plan.SearchPlan(
+                    keywords=keywords, exclude_retweet=True, max_query_length=256
+                )
+                packed_queries = plan.get_packed_queries(uids)
+
+                self.assertGreater(len(packed_queries), 1)
+                self.assertTrue(all(len(query) <= 256 for query, _ in packed_queries))
+                # users are all covered, in order
+                self.assertEqual(
+                    [uid for _, batch in packed_queries for uid in batch], uids
+                )
+                for query, batch in packed_queries:
+                    self.assertEqual(query.count("from:"), len(batch), msg=query)
+
+    def test_single_user_is_not_grouped(self):
+        plan = search_plan.SearchPlan(keywords=["covid"])
+
+        self.assertEqual(
+            plan.get_packed_queries(["12"]), [(plan.get_query("12"), ["12"])]
+        )
+        self.assertEqual(
+            plan.get_packed_queries(["12", "34"]),
+            [("( covid ) (from:12 OR from:34)", ["12", "34"])],
+        )
+        self.assertEqual(plan.get_packed_queries([]), [])
+
+    def test_kwargs(self):
+        plan = search_plan.SearchPlan(max_results=500)
+        start_time = datetime.datetime(2021, 1, 6)
+        kwargs = plan.get_kwargs("from:12", start_time=start_time)
+
+        self.assertEqual(kwargs["query"], "from:12")
+        self.assertEqual(kwargs["start_time"], start_time)
+        self.assertIsNone(kwargs["end_time"])
+        self.assertEqual(kwargs["max_results"], 500)
+        self.assertIn("author_id", kwargs["expansions"].split(","))
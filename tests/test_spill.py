@@ -0,0 +1,149 @@
+import tempfile
+import unittest
+from unittest import mock
+
+import bson
+import mongomock
+import pymongo
+
+from tweepipe.db import db_client, spill
+
+from tests.utils import mockmongo
+
+
+class SpillLogTest(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.directory = tmp_dir.name
+
+    def get_batches(self, count: int = 3) -> list:
+        return [
+            (
+                "tweets" if i % 2 else "users",
+                [{"_id": bson.ObjectId(), "tid": f"{i}-{j}"} for j in range(10)],
+            )
+            for i in range(count)
+        ]
+
+    def test_replays_batches_in_order(self):
+        for compress in (True, False):
+            with self.subTest(compress=compress):
+                log = spill.SpillLog(self.directory, compress=compress)
+                batches = self.get_batches()
+                for collection_name, docs in batches:
+                    self.assertTrue(log.append(collection_name, docs))
+                self.assertFalse(log.is_empty())
+
+                replayed = []
+                self.assertTrue(log.replay(lambda *batch: replayed.append(batch)))
+
+                self.assertEqual(replayed, batches)
+                self.assertTrue(log.is_empty())
+                self.assertEqual(log.stats()["disk_bytes"], 0)
+
+    def test_failed_replay_resumes_from_failed_batch(self):
+        log = spill.SpillLog(self.directory)
+        batches = self.get_batches()
+        for collection_name, docs in batches:
+            log.append(collection_name, docs)
+
+        replayed = []
+
+        def write_fn(collection_name, docs):
+            if len(replayed) == 1:
+                raise ConnectionError("database is down")
+            replayed.append((collection_name, docs))
+
+        self.assertFalse(log.replay(write_fn))
+        self.assertEqual(replayed, batches[:1])
+
+        self.assertTrue(log.replay(lambda *batch: replayed.append(batch)))
+        self.assertEqual(replayed, batches)
+
+    def test_segments_left_over_are_replayed(self):
+        log = spill.SpillLog(self.directory, max_segment_bytes=1)
+        batches = self.get_batches()
+        for collection_name, docs in batches:
+            log.append(collection_name, docs)
+        log.close()
+        self.assertEqual(log.stats()["segments"], 3)
+
+        log = spill.SpillLog(self.directory)
+        replayed = []
+        self.assertTrue(log.replay(lambda *batch: replayed.append(batch)))
+        self.assertEqual(replayed, batches)
+
+    def test_torn_tail_is_skipped(self):
+        log = spill.SpillLog(self.directory)
+        batches = self.get_batches()
+        for collection_name, docs in batches:
+            log.append(collection_name, docs)
+        log.close()
+
+        # crash while writing the last record
+        segment_path = log._segments[-1]
+        content = segment_path.read_bytes()
+        segment_path.write_bytes(content[:-5])
+
+        replayed = []
+        log = spill.SpillLog(self.directory)
+        self.assertTrue(log.replay(lambda *batch: replayed.append(batch)))
+        self.assertEqual(replayed, batches[:-1])
+
+    def test_corrupt_record_is_skipped(self):
+        log = spill.SpillLog(self.directory, compress=False)
+        collection_name, docs = self.get_batches(1)[0]
+        log.append(collection_name, docs)
+        log.close()
+
+        segment_path = log._segments[-1]
+        content = bytearray(segment_path.read_bytes())
+        content[-1] ^= 0xFF
+        segment_path.write_bytes(bytes(content))
+
+        replayed = []
+        log = spill.SpillLog(self.directory)
+        self.assertTrue(log.replay(lambda *batch: replayed.append(batch)))
+        self.assertEqual(replayed, [])
+        self.assertTrue(log.is_empty())
+
+    def test_rejects_batches_beyond_disk_budget(self):
+        log = spill.SpillLog(self.directory, max_disk_bytes=200, compress=False)
+        collection_name, docs = self.get_batches(1)[0]
+
+        self.assertFalse(log.append(collection_name, docs))
+        self.assertTrue(log.append(collection_name, docs[:1]))
+        self.assertEqual(log.stats()["rejected_docs"], len(docs))
+        self.assertEqual(log.stats()["spilled_docs"], 1)
+
+
+class DBClientSpillTest(mockmongo.MongomockTestCase):
+    def setUp(self):
+        super().setUp()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tweets = self.mongo_client["test_spill"]["tweets"]
+        self.client = db_client.DBClient(issue="test_spill", spill_dir=tmp_dir.name)
+        self.addCleanup(self.client.close)
+
+    def test_spill_enables_background_writers(self):
+        self.assertIsNotNone(self.client._writer)
+
+    def test_batches_are_spilled_until_recovery(self):
+        with mock.patch.object(
+            mongomock.collection.Collection,
+            "insert_many",
+            side_effect=pymongo.errors.AutoReconnect("primary stepped down"),
+        ):
+            self.client.add_tweet({"tid": "1"})
+            self.client.flush_content(wait=True)
+            self.client.add_tweet({"tid": "2"})
+            self.client.flush_content(wait=True)
+
+        self.assertEqual(self.tweets.count_documents({}), 0)
+        self.assertEqual(self.client.stats()["spill"]["spilled_docs"], 2)
+
+        self.client.replay_spilled_content()
+        self.assertEqual(sorted(self.tweets.distinct("tid")), ["1", "2"])
+        self.assertFalse(self.client.stats()["spill"]["spilling"])
@@ -0,0 +1,77 @@
+import datetime
+import gzip
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from tweepipe.db import db_client, storage
+
+from tests.utils import mockmongo
+
+
+class MongoBackendTest(mockmongo.MongomockTestCase):
+    def test_duplicates_are_reported(self):
+        collection = self.mongo_client["test_storage"]["tweets"]
+        collection.create_index("tid", unique=True)
+        backend = storage.MongoBackend(self.mongo_client, "test_storage")
+
+        result = backend.write("tweets", [{"tid": "1"}, {"tid": "2"}])
+        self.assertEqual(result.written_count, 2)
+        self.assertEqual(result.write_errors, [])
+
+        result = backend.write("tweets", [{"tid": "2"}, {"tid": "3"}])
+        self.assertEqual(result.written_count, 1)
+        self.assertEqual([error["code"] for error in result.write_errors], [11000])
+        self.assertEqual(sorted(collection.distinct("tid")), ["1", "2", "3"])
+
+
+class LocalBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def read_collection(self, collection_name: str) -> list:
+        docs = []
+        directory = Path(self.tmp_dir.name, "test_storage", collection_name)
+        for filepath in sorted(directory.glob("*.jsonl.gz")):
+            with gzip.open(filepath, "rt") as f:
+                docs.extend(json.loads(line) for line in f)
+
+        return docs
+
+    def test_rejects_unknown_format(self):
+        with self.assertRaises(ValueError):
+            storage.LocalBackend(self.tmp_dir.name, "test_storage", file_format="csv")
+
+    def test_writes_extended_json(self):
+        backend = storage.LocalBackend(self.tmp_dir.name, "test_storage")
+        created_at = datetime.datetime(2021, 1, 6, 12)
+        result = backend.write("tweets", [{"tid": "1", "created_at": created_at}])
+        backend.write("users", [{"uid": "1"}])
+        backend.close()
+
+        self.assertEqual(result.written_count, 1)
+        self.assertEqual(
+            self.read_collection("tweets"),
+            [{"tid": "1", "created_at": {"$date": "2021-01-06T12:00:00.000Z"}}],
+        )
+        self.assertEqual(self.read_collection("users"), [{"uid": "1"}])
+
+    def test_db_client_without_mongo(self):
+        with mock.patch.object(
+            db_client.settings, "OUTPUT_DIR", self.tmp_dir.name
+        ), mock.patch.object(db_client.connection, "get_mongo_client") as get_client:
+            client = db_client.DBClient(issue="test_storage", backend="local")
+            client.add_tweet({"tid": "1"})
+            client.close()
+
+        get_client.assert_not_called()
+        self.assertEqual(self.read_collection("tweets"), [{"tid": "1"}])
+        with self.assertRaises(RuntimeError):
+            client._get_collection("tweets")
+
+    def test_db_client_rejects_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            db_client.DBClient(issue="test_storage", backend="s3")
@@ -0,0 +1,80 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from tweepipe.utils import tid_queue
+
+
+class TidQueueTest(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.directory = tmp_dir.name
+
+        self.queue = tid_queue.TidQueue(self.directory)
+        self.tids = list(range(1000, 1100))
+        self.queue.add(str(tid) for tid in reversed(self.tids + self.tids[:10]))
+
+    def test_add_sorts_and_deduplicates_segments(self):
+        with mock.patch.object(tid_queue, "SEGMENT_SIZE", 64):
+            self.queue.add(range(10, 110))
+
+        stats = self.queue.stats()
+        self.assertEqual(stats["segments"], 3)
+        self.assertEqual(stats["pending"], 200)
+        self.assertEqual(list(next(self.queue.iter_tids())), self.tids)
+
+    def test_claims_aligned_distinct_ranges(self):
+        first = self.queue.claim(count=30)
+        second = self.queue.claim(count=30)
+
+        # rounded up to whole bytes of statuses
+        self.assertEqual((first.start, first.end), (0, 32))
+        self.assertEqual((second.start, second.end), (32, 64))
+        self.assertEqual(list(first.tids), self.tids[:32])
+        self.assertEqual(self.queue.stats()["leases"], 2)
+
+        blocks = [self.queue.claim(count=32), self.queue.claim(count=32)]
+        self.assertEqual(blocks[-1].end, len(self.tids))
+        self.assertIsNone(self.queue.claim())
+
+    def test_set_statuses(self):
+        block = self.queue.claim(count=8)
+        self.queue.set_statuses(block, done_tids=self.tids[:3], missing_tids=["1005"])
+        # ids out of the range are ignored
+        self.queue.set_statuses(block, done_tids=[self.tids[50], 1], missing_tids=[])
+        self.queue.complete(block)
+
+        stats = self.queue.stats()
+        self.assertEqual((stats["done"], stats["missing"]), (3, 1))
+        self.assertEqual(stats["leases"], 0)
+
+        output_file = Path(self.directory).joinpath("missing.txt")
+        self.assertEqual(self.queue.export_missing(output_file), 1)
+        self.assertEqual(output_file.read_text(), "1005\n")
+
+    def test_expired_and_released_ranges_are_claimed_again(self):
+        block = self.queue.claim(count=8, lease_seconds=60)
+        self.queue.set_statuses(block, done_tids=self.tids[:6], missing_tids=[])
+        self.queue.release(block)
+
+        # only pending ids of the range are returned
+        reclaimed = self.queue.claim(count=8)
+        self.assertEqual(reclaimed.lease_id, block.lease_id)
+        self.assertEqual(list(reclaimed.tids), self.tids[6:8])
+
+        self.queue.set_statuses(reclaimed, done_tids=self.tids[6:8], missing_tids=[])
+        with mock.patch.object(tid_queue.time, "time", return_value=2e9):
+            # fully processed ranges are completed rather than returned
+            next_block = self.queue.claim(count=8)
+        self.assertEqual(next_block.start, 8)
+        self.assertEqual(self.queue.stats()["leases"], 1)
+
+    def test_state_is_shared_by_queues_of_same_directory(self):
+        block = tid_queue.TidQueue(self.directory).claim(count=8)
+        self.queue.set_statuses(block, done_tids=block.tids, missing_tids=[])
+
+        other_queue = tid_queue.TidQueue(self.directory)
+        self.assertEqual(other_queue.claim(count=8).start, 8)
+        self.assertEqual(other_queue.stats()["done"], 8)
@@ -0,0 +1,102 @@
+import datetime
+import random
+import unittest
+
+from tweepipe import settings
+from tweepipe.utils import timestamps
+
+FORMATS = {
+    settings.TWEET_TS_STR_FORMAT: timestamps.parse_tweet_timestamp,
+    settings.TWITTER_API_ACADEMIC_V2_STR_FORMAT: timestamps.parse_academic_timestamp,
+    settings.TWITTER_API_V1_STR_FORMAT: timestamps.parse_v1_timestamp,
+}
+
+
+def _strptime(ts, fmt):
+    try:
+        return datetime.datetime.strptime(ts, fmt)
+    except (ValueError, TypeError) as e:
+        return type(e)
+
+
+def _parse(parser, ts):
+    try:
+        return parser(ts)
+    except (ValueError, TypeError) as e:
+        return type(e)
+
+
+class TimestampsTest(unittest.TestCase):
+    def get_datetimes(self, count: int = 500) -> list:
+        rng = random.Random(0)
+        start = datetime.datetime(2006, 3, 21)
+        return [
+            start
+            + datetime.timedelta(
+                seconds=rng.randint(0, 20 * 365 * 86400),
+                milliseconds=rng.randint(0, 999),
+            )
+            for _ in range(count)
+        ]
+
+    def test_matches_strptime(self):
+        for fmt, parser in FORMATS.items():
+            with self.subTest(fmt=fmt):
+                for dt in self.get_datetimes():
+                    ts = dt.strftime(fmt)
+                    if fmt == settings.TWITTER_API_ACADEMIC_V2_STR_FORMAT:
+                        # milliseconds rather than microseconds
+                        ts = ts[:23] + "Z"
+                    self.assertEqual(parser(ts), _strptime(ts, fmt))
+
+    def test_invalid_timestamps_are_rejected_as_by_strptime(self):
+        valid = {
+            settings.TWEET_TS_STR_FORMAT: "Wed Jan 06 21:17:15 +0000 2021",
+            settings.TWITTER_API_ACADEMIC_V2_STR_FORMAT: "2021-01-06T21:17:15.000Z",
+            settings.TWITTER_API_V1_STR_FORMAT: "2021-01-06T21:17:15Z",
+        }
+        rng = random.Random(0)
+        for fmt, parser in FORMATS.items():
+            with self.subTest(fmt=fmt):
+                ts = valid[fmt]
+                candidates = ["", ts[:-1], ts + " ", ts.replace("1", "١")]
+                for i in range(len(ts)):
+                    for char in " -:.+TZx0a ":
+                        candidates.append(ts[:i] + char + ts[i + 1 :])
+                    candidates.append(ts[:i] + rng.choice("+- ") + ts[i + 2 :] + "0")
+
+                for candidate in candidates:
+                    self.assertEqual(
+                        _parse(parser, candidate),
+                        _strptime(candidate, fmt),
+                        msg=repr(candidate),
+                    )
+
+    def test_datetimes_are_cached(self):
+        ts = "Wed Jan 06 21:17:15 +0000 2021"
+
+        self.assertIs(
+            timestamps.parse_tweet_timestamp(ts),
+            timestamps.parse_tweet_timestamp(ts),
+        )
+
+    def test_parse_many(self):
+        datetimes = [dt.replace(microsecond=0) for dt in self.get_datetimes(20)]
+        raw_timestamps = [dt.strftime(settings.TWEET_TS_STR_FORMAT) for dt in datetimes]
+
+        self.assertEqual(timestamps.parse_many(raw_timestamps), datetimes)
+        self.assertEqual(
+            timestamps.parse_many(raw_timestamps, epoch=True),
+            [
+                int(dt.replace(tzinfo=datetime.timezone.utc).timestamp())
+                for dt in datetimes
+            ],
+        )
+
+        # other formats fall back on strptime
+        fmt = "%Y/%m/%d %H:%M:%S"
+        self.assertEqual(
+            timestamps.parse_many([dt.strftime(fmt) for dt in datetimes], fmt=fmt),
+            datetimes,
+        )
+        self.assertEqual(timestamps.parse(raw_timestamps[0]), datetimes[0])
@@ -0,0 +1,64 @@
+import datetime
+
+import pymongo
+
+from tweepipe.db import storage, upsert
+
+from tests.utils import mockmongo
+
+
+class UpsertTest(mockmongo.MongomockTestCase):
+    def test_merge_latest_keeps_freshest_documents(self):
+        t0 = datetime.datetime(2021, 1, 6)
+        t1 = t0 + datetime.timedelta(hours=1)
+        docs = [
+            {"uid": "1", "seen_at": t1, "name": "new"},
+            {"uid": "1", "seen_at": t0, "name": "old"},
+            {"uid": "2", "seen_at": t0, "name": "old"},
+            {"uid": "2", "seen_at": None, "name": "unknown"},
+            {"name": "unkeyed"},
+        ]
+
+        merged = upsert.merge_latest(docs, "uid")
+        self.assertEqual([doc["name"] for doc in merged], ["new", "unknown", "unkeyed"])
+
+    def test_stored_fresher_documents_are_kept(self):
+        collection = self.mongo_client["test_upsert"]["users"]
+        collection.create_index("uid", unique=True)
+        backend = storage.MongoBackend(
+            self.mongo_client, "test_upsert", upsert_collections={"users": "uid"}
+        )
+
+        t0 = datetime.datetime(2021, 1, 6)
+        t1 = t0 + datetime.timedelta(hours=1)
+        t2 = t1 + datetime.timedelta(hours=1)
+        backend.write("users", [{"uid": "1", "seen_at": t1, "name": "t1"}])
+
+        # stale profile, rejected by the unique index
+        result = backend.write("users", [{"uid": "1", "seen_at": t0, "name": "t0"}])
+        self.assertEqual(result.written_count, 0)
+        self.assertEqual(collection.find_one({"uid": "1"})["name"], "t1")
+
+        backend.write("users", [{"uid": "1", "seen_at": t2, "name": "t2"}])
+        self.assertEqual(collection.find_one({"uid": "1"})["name"], "t2")
+        self.assertEqual(collection.count_documents({}), 1)
+
+    def test_upsert_operations_filter_on_freshness(self):
+        seen_at = datetime.datetime(2021, 1, 6)
+        operations = upsert.get_upsert_operations(
+            [{"_id": 1, "uid": "1", "seen_at": seen_at}, {"name": "unkeyed"}], "uid"
+        )
+
+        self.assertIsInstance(operations[0], pymongo.operations.ReplaceOne)
+        self.assertEqual(
+            operations[0]._filter,
+            {
+                "uid": "1",
+                "$or": [
+                    {"seen_at": {"$lte": seen_at}},
+                    {"seen_at": {"$exists": False}},
+                ],
+            },
+        )
+        self.assertNotIn("_id", operations[0]._doc)
+        self.assertIsInstance(operations[1], pymongo.operations.InsertOne)
@@ -1,7 +1,11 @@
+import functools
 import os
 import unittest
+from unittest import mock
 
-from tweepipe.db import db_client
+import mongomock
+
+from tweepipe.db import connection, db_client
 from tweepipe import settings
 
 from tests.utils import test_config
@@ -50,3 +54,38 @@ class MockMongo(unittest.TestCase):
         )
         if output_file.is_file():
             os.remove(str(output_file))
+
+
+def _drop_sort(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, sort=None, **kwargs):
+        return fn(*args, **kwargs)
+
+    return wrapper
+
+
+# recent pymongo versions pass a sort to bulk updates, unknown to mongomock
+for _name in ("add_update", "add_replace"):
+    setattr(
+        mongomock.collection.BulkOperationBuilder,
+        _name,
+        _drop_sort(getattr(mongomock.collection.BulkOperationBuilder, _name)),
+    )
+
+
+class MongomockTestCase(unittest.TestCase):
+    """In-memory mongo server, for tests which do not need a local mongo server.
+    Database clients get a fresh mongomock client through the pooled clients."""
+
+    def setUp(self):
+        self.mongo_client = mongomock.MongoClient()
+        patches = [
+            mock.patch.object(
+                connection, "MongoClient", lambda *args, **kwargs: self.mongo_client
+            ),
+            mock.patch.object(connection, "_clients", {}),
+            mock.patch.object(connection, "_ensured_indexes", set()),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
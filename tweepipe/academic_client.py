@@ -10,7 +10,7 @@ assert semver.VersionInfo.parse(tweepy.__version__).major >= 4
 
 from tweepipe import settings
 from tweepipe.db import db_client, db_schema
-from tweepipe.utils import streaming_client
+from tweepipe.utils import relation, search_plan, streaming_client
 
 
 class AcademicClient:
@@ -26,6 +26,7 @@ class AcademicClient:
         schema: dict = db_schema.DEFAULT_ACADEMIC_V2_SCHEMA,
         env_file: str = None,
         stream: bool = False,
+        async_flush: bool = False,
     ):
         self._env = env_file
         self.issue = issue
@@ -35,7 +36,22 @@ class AcademicClient:
             schema=schema,
             include_relations=include_relations,
             include_users=include_users,
+            async_flush=async_flush,
         )
+
+        # request parameters, per keywords and exclusion operators
+        self._search_plans = {}
+
+        # relations are only extracted with schemas declaring their collections
+        self.relation_parser = None
+        if include_relations:
+            relation_parser = relation.AcademicRelationParser(self.db_conn)
+            if all(
+                relation_type in self.db_conn.bulk_data
+                for relation_type in relation_parser.relation_types
+            ):
+                self.relation_parser = relation_parser
+
         if not stream:
             self.tweepy_client = tweepy.Client(
                 bearer_token=settings.ACADEMIC_API_BEARER_TOKEN, wait_on_rate_limit=True
@@ -87,7 +103,7 @@ class AcademicClient:
             backfill_minutes=5,
             expansions=self._get_expansions(),
             user_fields=self._get_user_fields(),
-            tweet_fields=self._get_user_fields(),
+            tweet_fields=self._get_tweet_fields(),
             threaded=True,
         )
 
@@ -102,23 +118,14 @@ class AcademicClient:
         end_ts: datetime.datetime = datetime.datetime.now(),
         keywords: list = None,
     ):
-        search_query = self._get_query(keywords=keywords, uid=uid)
+        plan = self.get_search_plan(keywords=keywords)
         fetching_uids_collection = self.db_conn._get_collection(
             "fetching_uids", db_name=self.issue
         )
         fetching_uids_collection.update_one({"uid": uid}, {"$set": {"status": 1}})
 
-        kwargs = dict(
-            query=search_query,
-            start_time=since_ts,
-            end_time=end_ts,
-            expansions=self._get_expansions(),
-            max_results=100,
-            media_fields=self._get_media_fields(),
-            place_fields=self._get_place_fields(),
-            tweet_fields=self._get_tweet_fields(),
-            poll_fields=self._get_poll_fields(),
-            user_fields=self._get_user_fields(),
+        kwargs = plan.get_kwargs(
+            plan.get_query(uid=uid), start_time=since_ts, end_time=end_ts
         )
         found_tweets = self._paginate_tweets(
             self.tweepy_client.search_all_tweets, kwargs
@@ -127,6 +134,56 @@ class AcademicClient:
             {"uid": uid}, {"$set": {"status": 2 if found_tweets else -1}}
         )
 
+    def search_users_history(
+        self,
+        uids: list,
+        since_ts: datetime.datetime,
+        end_ts: datetime.datetime = None,
+        keywords: list = None,
+    ):
+        """Search the history of many users, packing as many users as the query
+        length limit allows into each search. Users without any tweet found are
+        flagged as missing (-1), the others as fetched (2).
+
+        :param uids: User ids.
+        :type uids: list
+        :param since_ts: Oldest creation date of the tweets.
+        :type since_ts: datetime.datetime
+        :param end_ts: Newest creation date of the tweets, defaults to None (now).
+        :type end_ts: datetime.datetime, optional
+        :param keywords: Keywords, any of them to be matched, defaults to None.
+        :type keywords: list, optional
+        """
+
+        plan = self.get_search_plan(keywords=keywords)
+        end_ts = end_ts if end_ts else datetime.datetime.now()
+        fetching_uids_collection = self.db_conn._get_collection(
+            "fetching_uids", db_name=self.issue
+        )
+
+        for query, uid_batch in plan.get_packed_queries(uids):
+            fetching_uids_collection.update_many(
+                {"uid": {"$in": uid_batch}}, {"$set": {"status": 1}}
+            )
+
+            author_ids = set()
+            self._paginate_tweets(
+                self.tweepy_client.search_all_tweets,
+                plan.get_kwargs(query, start_time=since_ts, end_time=end_ts),
+                author_ids=author_ids,
+            )
+
+            found_uids = [uid for uid in uid_batch if str(uid) in author_ids]
+            missing_uids = [uid for uid in uid_batch if str(uid) not in author_ids]
+            if found_uids:
+                fetching_uids_collection.update_many(
+                    {"uid": {"$in": found_uids}}, {"$set": {"status": 2}}
+                )
+            if missing_uids:
+                fetching_uids_collection.update_many(
+                    {"uid": {"$in": missing_uids}}, {"$set": {"status": -1}}
+                )
+
     def search_all(
         self,
         keywords: list,
@@ -137,36 +194,48 @@ class AcademicClient:
     ):
         """Run an all time search with the Twitter API."""
 
-        search_query = self._get_query(
-            keywords=keywords,
-            exclude_retweet=tweets_only,
-            exclude_reply=tweets_only,
-            exclude_quote=tweets_only,
+        plan = self.get_search_plan(
+            keywords=keywords, exclude_retweet=tweets_only, max_results=max_results
         )
 
         tweepy_client = tweepy.Client(
             bearer_token=settings.ACADEMIC_API_BEARER_TOKEN, wait_on_rate_limit=True
         )
-        kwargs = dict(
-            query=search_query,
-            start_time=start_time,
-            end_time=end_time,
-            expansions=self._get_expansions(),
-            max_results=max_results,
-            media_fields=self._get_media_fields(),
-            place_fields=self._get_place_fields(),
-            poll_fields=self._get_poll_fields(),
-            tweet_fields=self._get_tweet_fields(),
-            user_fields=self._get_user_fields(),
+        kwargs = plan.get_kwargs(
+            plan.get_query(), start_time=start_time, end_time=end_time
         )
         _ = self._paginate_tweets(fn=tweepy_client.search_all_tweets, kwargs=kwargs)
 
-    def _paginate_tweets(self, fn, kwargs):
-        """Iterate through all pages returned by arg function."""
+    def get_search_plan(
+        self,
+        keywords: list = None,
+        exclude_retweet: bool = False,
+        max_results: int = 100,
+    ) -> search_plan.SearchPlan:
+        """Get the request parameters of searches, computed once per keywords and
+        exclusion operators."""
+
+        key = (tuple(keywords) if keywords else (), exclude_retweet, max_results)
+        if key not in self._search_plans:
+            self._search_plans[key] = search_plan.SearchPlan(
+                keywords=keywords,
+                exclude_retweet=exclude_retweet,
+                max_results=max_results,
+            )
+
+        return self._search_plans[key]
+
+    def _paginate_tweets(self, fn, kwargs, author_ids: set = None):
+        """Iterate through all pages returned by arg function, optionally collecting
+        the authors of retrieved tweets."""
 
         response_count, retrieved_tweet_count = 0, 0
         for response in tweepy.Paginator(fn, **kwargs):
-            retrieved_tweet_count += self.save_response(response)
+            retrieved_tweet_count += self.save_response(response) or 0
+            if author_ids is not None and response.data:
+                author_ids.update(
+                    str(tweet.data.get("author_id")) for tweet in response.data
+                )
             response_count += 1
             if response_count % 100 == 0:
                 logger.info(
@@ -209,6 +278,12 @@ class AcademicClient:
             logger.error(f"Error saving response. {e}")
             return
 
+        if self.relation_parser:
+            try:
+                self.save_relations([tweet.data for tweet in response.data])
+            except Exception as e:
+                logger.error(f"Error extracting relations. {e}")
+
         if response.includes.get("media"):
             for media in response.includes.get("media"):
                 try:
@@ -239,6 +314,17 @@ class AcademicClient:
 
         return retrieved_tweet_count
 
+    def save_relations(self, tweets: list):
+        """Extract relations from a page of tweets at once, and add them to the
+        collections of their type."""
+
+        relations = self.relation_parser.get_relation_docs(
+            self.relation_parser.parse_relations_from_batch(tweets)
+        )
+        for relation_type, relation_docs in relations.items():
+            if relation_docs:
+                self.db_conn.add_to_collection(relation_type, relation_docs)
+
     def _get_query(
         self,
         keywords: list,
@@ -278,89 +364,19 @@ class AcademicClient:
         return query.strip()
 
     def _get_poll_fields(self):
-        poll_fields = [
-            "duration_minutes",
-            "end_datetime",
-            "id",
-            "options",
-            "voting_status",
-        ]
-        return poll_fields
+        return list(search_plan.POLL_FIELDS)
 
     def _get_place_fields(self):
-        place_fields = [
-            "contained_within",
-            "country",
-            "country_code",
-            "full_name",
-            "geo",
-            "id",
-            "name",
-            "place_type",
-        ]
-        return place_fields
+        return list(search_plan.PLACE_FIELDS)
 
     def _get_media_fields(self):
-        media_fields = [
-            "duration_ms",
-            "media_key",
-            "preview_image_url",
-            "type",
-            "url",
-            "public_metrics",
-            "alt_text",
-        ]
-        return media_fields
+        return list(search_plan.MEDIA_FIELDS)
 
     def _get_tweet_fields(self):
-        tweet_fields = [
-            "id",
-            "text",
-            "attachments",
-            "author_id",
-            "context_annotations",
-            "conversation_id",
-            "created_at",
-            "entities",
-            "geo",
-            "in_reply_to_user_id",
-            "lang",
-            "public_metrics",
-            "possibly_sensitive",
-            "referenced_tweets",
-        ]
-
-        return ",".join(tweet_fields)
+        return self.get_search_plan().request_kwargs["tweet_fields"]
 
     def _get_user_fields(self):
-        user_fields = [
-            "id",
-            "name",
-            "username",
-            "created_at",
-            "description",
-            "entities",
-            "location",
-            "pinned_tweet_id",
-            "profile_image_url",
-            "protected",
-            "public_metrics",
-            "url",
-            "verified",
-        ]
-
-        return ",".join(user_fields)
+        return self.get_search_plan().request_kwargs["user_fields"]
 
     def _get_expansions(self):
-        expansions = [
-            "author_id",
-            "referenced_tweets.id",
-            "in_reply_to_user_id",
-            "attachments.media_keys",
-            "attachments.poll_ids",
-            "geo.place_id",
-            "entities.mentions.username",
-            "referenced_tweets.id.author_id",
-        ]
-
-        return ",".join(expansions)
+        return self.get_search_plan().request_kwargs["expansions"]
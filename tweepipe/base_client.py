@@ -24,6 +24,10 @@ class BaseClient:
     :param schema: Specify an index schema for the retrieved Twitter data. For example, an index
         on tweet ids can be useful to quickly get to a tweet. Defaults to db_schema.INDEX_V3.
     :type schema: dict, optional
+    :param backend: Storage backend of the database client, either "mongo" or "local"
+        to write rotating compressed files under settings.OUTPUT_DIR instead, e.g. on
+        offline collection nodes. Defaults to "mongo".
+    :type backend: str, optional
     """
 
     def __init__(
@@ -33,12 +37,14 @@ class BaseClient:
         include_relations: bool = True,
         skip_db: bool = False,
         schema: dict = None,
+        backend: str = "mongo",
     ):
 
         self._issue = issue
         self._include_users = include_users
         self._include_relations = include_relations
         self._schema = schema if schema else db_schema.INDEX_V3
+        self._backend = backend
 
         if skip_db:
             self._db_conn = None
@@ -48,6 +54,7 @@ class BaseClient:
                 include_users=include_users,
                 include_relations=include_relations,
                 schema=schema,
+                backend=backend,
             )
 
         self._env_file = None
@@ -106,6 +113,7 @@ class BaseClient:
                 include_users=self.include_users,
                 include_relations=self.include_relations,
                 schema=self.schema,
+                backend=self._backend,
             )
 
     def set_mirror_collection_name(self, mirror_collection_name: str):
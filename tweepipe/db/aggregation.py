@@ -20,8 +20,8 @@ def _count_hashtag_over_tid_range(env_file, time_ranges, dbs, queries):
     for db in dbs:
         for time_range in tqdm(time_ranges):
             # recover approximative tid from date
-            start_tid = snowflake.get_tweet_id_from_time(time_range[0])
-            end_tid = snowflake.get_tweet_id_from_time(time_range[1])
+            start_tid = snowflake.SnowFlake.get_tweet_id_from_time(time_range[0])
+            end_tid = snowflake.SnowFlake.get_tweet_id_from_time(time_range[1])
 
             tid_range_query = {"tid": {"$gte": start_tid, "$lt": end_tid}}
             for query in queries:
@@ -0,0 +1,295 @@
+import datetime
+import math
+
+import pymongo
+from bson import json_util
+from loguru import logger
+
+from tweepipe.db import lease
+from tweepipe.utils import snowflake
+
+# target number of tweet ids per chunk
+DEFAULT_CHUNK_SIZE = 16384
+
+# sampled tweet ids per planned chunk, for the density estimate
+SAMPLES_PER_CHUNK = 16
+
+# statuses of work documents still to be hydrated
+PENDING_STATUSES = [0, 1]
+
+# id of the document of the chunk collection recording the plan
+PLAN_ID = "plan"
+
+
+def get_chunk_boundaries(sample: list, chunk_count: int) -> list:
+    """Split the tweet id space into ranges holding about the same number of ids,
+    given a uniform sample of the ids. Sampled ids estimate the density of tweets
+    over the snowflake timestamps of their ids, quantiles of the sample being placed
+    closer to each other where tweets are dense. Boundaries are aligned on the
+    millisecond of their timestamp.
+
+    :param sample: Sampled tweet ids, as integers.
+    :type sample: list
+    :param chunk_count: Number of ranges.
+    :type chunk_count: int
+    :return: Sorted distinct boundaries, at most chunk_count - 1 of them.
+    :rtype: list
+    """
+
+    sample = sorted(sample)
+    if not sample:
+        return []
+
+    boundaries = set()
+    for i in range(1, chunk_count):
+        tid = sample[i * len(sample) // chunk_count]
+        boundaries.add(tid >> snowflake.TIMESTAMP_SHIFT << snowflake.TIMESTAMP_SHIFT)
+
+    return sorted(boundaries)
+
+
+class TidRangeQueue:
+    """Work queue of tweet id ranges (chunks) of a collection of work documents
+    (e.g. `hydrating_tids`), pulled by idle workers until the queue drains, rather
+    than statically splitting work between workers.
+
+    Chunks are planned once, sized from the density of the pending tweet ids so
+    that each chunk holds about `chunk_size` ids whatever the time span it covers.
+    They are kept in a side collection and claimed one at a time under a lease, the
+    same way as work documents, so that chunks held by crashed workers are claimed
+    again by others. Ranges are matched on the integer `tid_int` field.
+
+    Workers checkpoint their progress in the chunk document: the last tid below which
+    all ids of the chunk were committed, and the number of hydrated and missing ids.
+    A chunk claimed again after a crash resumes after its checkpoint.
+
+    The filter of the planned work documents is recorded along with the chunks, in
+    the document of id PLAN_ID, pending chunks only being resumed for the same filter.
+
+    :param collection: Collection holding the work documents.
+    :type collection: pymongo.collection.Collection
+    :param chunk_collection: Name of the collection of chunks, defaults to None, i.e.
+        `<collection>_chunks`.
+    :type chunk_collection: str, optional
+    :param lease_seconds: Duration of a chunk lease, defaults to 900.
+    :type lease_seconds: int, optional
+    """
+
+    def __init__(
+        self,
+        collection: pymongo.collection.Collection,
+        chunk_collection: str = None,
+        lease_seconds: int = 900,
+    ):
+        self.collection = collection
+        self.name = (
+            chunk_collection if chunk_collection else f"{collection.name}_chunks"
+        )
+        self.chunks = collection.database[self.name]
+
+        self.claimer = lease.LeaseClaimer(
+            self.chunks,
+            block_size=1,
+            lease_seconds=lease_seconds,
+            projection={"_id": True, "start": True, "end": True, "checkpoint": True},
+        )
+
+    def _add_tid_int(self):
+        """Add the integer tweet id to work documents loaded without it."""
+
+        self.collection.update_many(
+            {"tid_int": {"$exists": False}},
+            [{"$set": {"tid_int": {"$toLong": "$tid"}}}],
+        )
+        self.collection.create_index("tid_int")
+
+    @staticmethod
+    def _get_filter_key(base_filter: dict = None) -> str:
+        # filters may hold operators, which cannot be stored as field names
+        return json_util.dumps(base_filter if base_filter else {}, sort_keys=True)
+
+    def plan(
+        self,
+        base_filter: dict = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        min_chunk_count: int = 1,
+        replan: bool = False,
+    ) -> int:
+        """Plan the chunks of the pending work documents. Chunks left pending by a
+        previous plan of the same filter are resumed instead, unless replanning.
+
+        :param base_filter: Filter restricting the work documents, defaults to None.
+        :type base_filter: dict, optional
+        :param chunk_size: Target number of ids per chunk, defaults to
+            DEFAULT_CHUNK_SIZE.
+        :type chunk_size: int, optional
+        :param min_chunk_count: Minimum number of chunks, e.g. a few per worker,
+            defaults to 1.
+        :type min_chunk_count: int, optional
+        :param replan: Whether to drop pending chunks and plan again, defaults to
+            False.
+        :type replan: bool, optional
+        :return: Number of pending chunks.
+        :rtype: int
+        """
+
+        filter_key = self._get_filter_key(base_filter)
+        pending_chunk_count = self.chunks.count_documents(
+            {"status": {"$in": PENDING_STATUSES}}
+        )
+        if pending_chunk_count and not replan:
+            plan = self.chunks.find_one({"_id": PLAN_ID})
+            if plan and plan.get("filter") == filter_key:
+                logger.info(
+                    f"Resuming {pending_chunk_count} pending chunks of {self.name}."
+                )
+                return pending_chunk_count
+
+            # statuses of work documents are kept, only their chunks being dropped
+            logger.warning(
+                f"Pending chunks of {self.name} were planned with another filter, planning them again."
+            )
+
+        self.chunks.drop()
+        self._add_tid_int()
+
+        pending_filter = {"status": {"$in": PENDING_STATUSES}}
+        if base_filter:
+            pending_filter = {"$and": [base_filter, pending_filter]}
+
+        pending_count = self.collection.count_documents(pending_filter)
+        if not pending_count:
+            return 0
+
+        chunk_count = max(min_chunk_count, math.ceil(pending_count / chunk_size))
+        sample = [
+            doc["tid_int"]
+            for doc in self.collection.aggregate(
+                [
+                    {"$match": pending_filter},
+                    {"$sample": {"size": chunk_count * SAMPLES_PER_CHUNK}},
+                    {"$project": {"_id": 0, "tid_int": 1}},
+                ],
+                allowDiskUse=True,
+            )
+        ]
+
+        # first and last ranges are left open
+        boundaries = [None] + get_chunk_boundaries(sample, chunk_count) + [None]
+        chunks = [
+            {
+                "_id": idx,
+                "start": start,
+                "end": end,
+                "status": 0,
+                "estimated_count": pending_count // (len(boundaries) - 1),
+            }
+            for idx, (start, end) in enumerate(zip(boundaries[:-1], boundaries[1:]))
+        ]
+        self.chunks.insert_many(chunks)
+        self.chunks.insert_one(
+            {
+                "_id": PLAN_ID,
+                "filter": filter_key,
+                "chunk_size": chunk_size,
+                "planned_at": datetime.datetime.utcnow(),
+            }
+        )
+        self.chunks.create_index(
+            [("status", pymongo.ASCENDING), ("lease_expires", pymongo.ASCENDING)]
+        )
+
+        logger.info(
+            f"Planned {len(chunks)} chunks of about {chunks[0]['estimated_count']} of the {pending_count} pending tweet ids in {self.name}."
+        )
+
+        return len(chunks)
+
+    def claim(self) -> dict:
+        """Claim the next chunk.
+
+        :return: Claimed chunk, None once the queue is drained.
+        :rtype: dict
+        """
+
+        claimed_chunks = self.claimer.claim()
+
+        return claimed_chunks[0] if claimed_chunks else None
+
+    def complete(self, chunk: dict):
+        """Mark a chunk as done, once none of its ids are left to be claimed."""
+
+        self.chunks.bulk_write([self.claimer.get_status_update(chunk["_id"], 2)])
+        self.claimer.complete()
+
+    def checkpoint(
+        self,
+        chunk: dict,
+        hydrated_count: int = 0,
+        missing_count: int = 0,
+        last_tid: int = None,
+    ):
+        """Record the progress of a chunk, once a block of its ids is committed.
+
+        :param chunk: Chunk.
+        :type chunk: dict
+        :param hydrated_count: Number of ids of the block hydrated, defaults to 0.
+        :type hydrated_count: int, optional
+        :param missing_count: Number of ids of the block missing, defaults to 0.
+        :type missing_count: int, optional
+        :param last_tid: Tid below which (inclusive) all ids of the chunk are
+            committed, defaults to None, i.e. unchanged.
+        :type last_tid: int, optional
+        """
+
+        update = {
+            "$inc": {
+                "checkpoint.hydrated_count": hydrated_count,
+                "checkpoint.missing_count": missing_count,
+            },
+            "$set": {"checkpoint.updated_at": datetime.datetime.utcnow()},
+        }
+        if last_tid is not None:
+            update["$max"] = {"checkpoint.last_tid": last_tid}
+
+        self.chunks.update_one({"_id": chunk["_id"]}, update)
+
+    def release(self):
+        """Give back the chunk held by this worker (e.g. upon exit)."""
+
+        self.claimer.release()
+
+    @staticmethod
+    def get_filter(chunk: dict) -> dict:
+        """Get the filter matching the work documents of a chunk left after its
+        checkpoint.
+
+        :param chunk: Chunk.
+        :type chunk: dict
+        :return: Filter on `tid_int`.
+        :rtype: dict
+        """
+
+        tid_range = {}
+        last_tid = chunk.get("checkpoint", {}).get("last_tid")
+        if last_tid is not None:
+            tid_range["$gt"] = last_tid
+        elif chunk.get("start") is not None:
+            tid_range["$gte"] = chunk["start"]
+        if chunk.get("end") is not None:
+            tid_range["$lt"] = chunk["end"]
+
+        return {"tid_int": tid_range} if tid_range else {}
+
+    def stats(self) -> dict:
+        """Get the number of chunks per status."""
+
+        return {
+            doc["_id"]: doc["count"]
+            for doc in self.chunks.aggregate(
+                [
+                    {"$match": {"_id": {"$ne": PLAN_ID}}},
+                    {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+                ]
+            )
+        }
@@ -0,0 +1,116 @@
+import os
+import threading
+
+import pymongo
+from loguru import logger
+from pymongo import MongoClient
+
+# process-wide registry of pooled clients, and of indexes already ensured
+_clients = {}
+_ensured_indexes = set()
+_lock = threading.Lock()
+
+
+def get_mongo_client(
+    host: str = None,
+    port: int = None,
+    username: str = None,
+    password: str = None,
+    ssl: bool = True,
+) -> MongoClient:
+    """Get the pooled client connected to a mongo server with the given credentials,
+    creating it on first use. Clients are thread-safe, and are shared by all database
+    clients of the process. Forked processes (e.g. parallel workers) get their own
+    clients, as pymongo clients cannot be used across forks.
+
+    :param host: Mongo server host, defaults to None.
+    :type host: str, optional
+    :param port: Mongo server port, defaults to None.
+    :type port: int, optional
+    :param username: Mongo username, defaults to None.
+    :type username: str, optional
+    :param password: Mongo password, defaults to None.
+    :type password: str, optional
+    :param ssl: Whether to connect with TLS, defaults to True.
+    :type ssl: bool, optional
+    :return: Shared mongo client.
+    :rtype: MongoClient
+    """
+
+    key = (os.getpid(), host, port, username, password, ssl)
+    with _lock:
+        if key not in _clients:
+            _clients[key] = MongoClient(
+                host,
+                port,
+                username=username,
+                password=password,
+                ssl=ssl,
+            )
+
+        return _clients[key]
+
+
+def _get_index_key(index) -> tuple:
+    """Hashable representation of an index specification."""
+
+    if isinstance(index, list):
+        return tuple(tuple(field) for field in index)
+
+    return (index,)
+
+
+def ensure_index(
+    client: MongoClient,
+    db_name: str,
+    collection_name: str,
+    index,
+    unique: bool = False,
+):
+    """Create an index unless it was already ensured by this process. Indexes which
+    failed to be created are tried again on the next call.
+
+    :param client: Mongo client.
+    :type client: MongoClient
+    :param db_name: Name of the database.
+    :type db_name: str
+    :param collection_name: Name of the collection.
+    :type collection_name: str
+    :param index: Index specification, either a field name or a list of (field,
+        direction) pairs.
+    :type index: Union[str, list]
+    :param unique: Whether the index is unique, defaults to False.
+    :type unique: bool, optional
+    """
+
+    key = (id(client), db_name, collection_name, _get_index_key(index), unique)
+    if key in _ensured_indexes:
+        return
+
+    try:
+        client[db_name][collection_name].create_index(index, unique=unique)
+    except pymongo.errors.OperationFailure as e:
+        logger.warning(
+            f"Failed to create index {index} on {db_name}.{collection_name}: {e}"
+        )
+        return
+
+    _ensured_indexes.add(key)
+
+
+def forget_indexes(client: MongoClient, db_name: str):
+    """Forget indexes ensured on a database, e.g. after dropping it.
+
+    :param client: Mongo client.
+    :type client: MongoClient
+    :param db_name: Name of the database.
+    :type db_name: str
+    """
+
+    with _lock:
+        for key in [
+            key
+            for key in _ensured_indexes
+            if key[0] == id(client) and key[1] == db_name
+        ]:
+            _ensured_indexes.discard(key)
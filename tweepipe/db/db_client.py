@@ -1,14 +1,26 @@
 import pymongo
-from pymongo import MongoClient
 import bson
 from typing import Any, Union
+import threading
 import time
 import json
+from pathlib import Path
 
 from loguru import logger
 
 from tweepipe import settings
-from tweepipe.db import db_schema
+from tweepipe.db import (
+    connection,
+    db_schema,
+    dedup,
+    flush_policy,
+    metrics,
+    records,
+    spill,
+    storage,
+    writer,
+)
+from tweepipe.db.utils import size
 from tweepipe.utils import errors
 
 
@@ -27,10 +39,65 @@ class DBClient:
     :type include_relations: bool, optional
     :param include_users: Whether to extract relations from users, defaults to True.
     :type include_users: bool, optional
-    :param batch_size: Batch size for bulk data lists, defaults to 128.
+    :param batch_size: Batch size for bulk data lists, defaults to 1024.
     :type batch_size: int, optional
     :param schema: Index schema for the working database, defaults to db_schema.DEFAULT_TWITTER_DB_SCHEMA.
     :type schema: dict, optional
+    :param async_flush: Whether to hand full buffers over to background writer threads
+        instead of writing them from the producer's thread, always enabled with a
+        spill log, defaults to False.
+    :type async_flush: bool, optional
+    :param writer_count: Number of background writer threads, defaults to 1.
+    :type writer_count: int, optional
+    :param max_pending_batches: Maximum number of full buffers waiting for a background
+        writer before producers are blocked, defaults to 16.
+    :type max_pending_batches: int, optional
+    :param max_inflight_bytes: Maximum estimated size of the buffers handed over to the
+        background writers before producers are blocked, defaults to 256MB.
+    :type max_inflight_bytes: int, optional
+    :param max_batch_bytes: Estimated BSON size of a bulk data list triggering its push
+        to the database, defaults to flush_policy.MAX_MESSAGE_BYTES.
+    :type max_batch_bytes: int, optional
+    :param max_batch_age: Maximum time (in seconds) data stays in a bulk data list before
+        being pushed, enforced by a timer thread, defaults to None (no limit).
+    :type max_batch_age: float, optional
+    :param flush_policies: Flush policies overriding the defaults for specific
+        collections, defaults to None.
+    :type flush_policies: dict, optional
+    :param stats_file: Jsonl file to periodically append client stats to, defaults
+        to None (no export).
+    :type stats_file: str, optional
+    :param stats_interval: Time in seconds between two exports of the client stats,
+        defaults to 60.
+    :type stats_interval: float, optional
+    :param dedup_mode: Drop tweets and users already added by the client before they are
+        pushed, keeping either an "lru" set or a "bloom" filter of seen tids and uids,
+        defaults to None (no deduplication).
+    :type dedup_mode: str, optional
+    :param dedup_capacity: Number of ids remembered per collection, defaults to 1000000.
+    :type dedup_capacity: int, optional
+    :param dedup_ttl: Time in seconds after which ids are forgotten (lru only),
+        defaults to 3600.
+    :type dedup_ttl: float, optional
+    :param upsert_collections: Collections written in upsert mode, mapped to the field
+        identifying their documents. Buffered duplicates are merged, and stored documents
+        replaced by fresher ones, e.g. upsert.UPSERT_KEY_FIELDS keeps the latest profile
+        of each user, defaults to None (insert only).
+    :type upsert_collections: dict, optional
+    :param backend: Storage of the bulk data lists, either "mongo", "local" (rotating
+        compressed jsonl files under settings.OUTPUT_DIR, no mongo connection) or a
+        storage.StorageBackend instance, defaults to "mongo".
+    :type backend: Union[str, storage.StorageBackend], optional
+    :param spill_dir: Directory of an on-disk log absorbing the batches which cannot be
+        written while the database is down, or while the background writers are
+        saturated, replayed once the database is back. Enables the background writers.
+        Defaults to None (no spill).
+    :type spill_dir: str, optional
+    :param spill_max_bytes: Disk budget of the spill log, defaults to 4GB.
+    :type spill_max_bytes: int, optional
+    :param spill_retry_interval: Time in seconds between two attempts at replaying
+        spilled batches, defaults to 30.
+    :type spill_retry_interval: float, optional
     """
 
     def __init__(
@@ -43,21 +110,55 @@ class DBClient:
         schema: dict = None,
         declared_collections: list = None,
         block_index_create: bool = False,
+        async_flush: bool = False,
+        writer_count: int = 1,
+        max_pending_batches: int = 16,
+        max_inflight_bytes: int = 256 * 1024 * 1024,
+        max_batch_bytes: int = flush_policy.MAX_MESSAGE_BYTES,
+        max_batch_age: float = None,
+        flush_policies: dict = None,
+        stats_file: str = None,
+        stats_interval: float = 60,
+        dedup_mode: str = None,
+        dedup_capacity: int = 1000000,
+        dedup_ttl: float = 3600,
+        upsert_collections: dict = None,
+        backend: Union[str, storage.StorageBackend] = "mongo",
+        spill_dir: str = None,
+        spill_max_bytes: int = 4 * 1024 * 1024 * 1024,
+        spill_retry_interval: float = 30,
     ):
-        self.conn = MongoClient(
-            settings.MONGO_HOST,
-            settings.MONGO_PORT,
-            username=settings.MONGO_USERNAME,
-            password=settings.MONGO_PASSWORD,
-            ssl=True,
-        )
-        self.block_index_create = block_index_create
-
         # determine db name
         self.declared_collections = declared_collections
         issue = self._get_db_name(db_name=issue)
         self.issue = issue if issue != None else "default"
 
+        self.upsert_collections = upsert_collections if upsert_collections else {}
+        self.conn = None
+        if backend == "mongo":
+            # pooled client, shared with all other clients of the process
+            self.conn = connection.get_mongo_client(
+                settings.MONGO_HOST,
+                settings.MONGO_PORT,
+                username=settings.MONGO_USERNAME,
+                password=settings.MONGO_PASSWORD,
+                ssl=True,
+            )
+            self.backend = storage.MongoBackend(
+                self.conn, self.issue, upsert_collections=self.upsert_collections
+            )
+        elif backend == "local":
+            self.backend = storage.LocalBackend(
+                output_dir=settings.OUTPUT_DIR, db_name=self.issue
+            )
+        elif isinstance(backend, storage.StorageBackend):
+            self.backend = backend
+        else:
+            raise ValueError("Unknown storage backend.")
+
+        # indexes are only relevant to mongo
+        self.block_index_create = block_index_create or self.conn is None
+
         self.response_mirror_name = (
             response_mirror_name
             if response_mirror_name != None
@@ -68,6 +169,29 @@ class DBClient:
         self.include_relations = include_relations
         self.batch_size = batch_size
         self.bulk_data = {}
+        self.bulk_bytes = {}
+        self.bulk_started = {}
+        self._size_estimator = size.SizeEstimator()
+        self._bulk_lock = threading.RLock()
+        self.metrics = metrics.DBMetrics()
+        # fresher copies of upserted documents must not be dropped
+        self._deduplicator = None
+        if dedup_mode:
+            self._deduplicator = dedup.Deduplicator(
+                mode=dedup_mode,
+                capacity=dedup_capacity,
+                ttl=dedup_ttl,
+                key_fields={
+                    collection_name: key_fields
+                    for collection_name, key_fields in dedup.DEDUP_KEY_FIELDS.items()
+                    if collection_name not in self.upsert_collections
+                },
+            )
+
+        self.default_flush_policy = flush_policy.FlushPolicy(
+            max_docs=batch_size, max_bytes=max_batch_bytes, max_age=max_batch_age
+        )
+        self.flush_policies = flush_policies if flush_policies else {}
 
         self._db_schema = db_schema._get_db_schema(
             issue=issue,
@@ -78,6 +202,56 @@ class DBClient:
         self.init_collections(_db_schema=self._db_schema)
         self.init_bulk_buffers()
 
+        self._writer = None
+        # spilling on saturation only makes sense when producers do not write
+        if async_flush or spill_dir:
+            self._writer = writer.BackgroundWriter(
+                write_fn=self._write_bulk_data,
+                writer_count=writer_count,
+                max_pending_batches=max_pending_batches,
+                max_inflight_bytes=max_inflight_bytes,
+            )
+
+        # enforce maximum age of buffered data even when no data comes in
+        self._flush_timer = None
+        max_ages = [
+            policy.max_age
+            for policy in [self.default_flush_policy, *self.flush_policies.values()]
+            if policy.max_age is not None
+        ]
+        if max_ages:
+            self._flush_timer = flush_policy.FlushTimer(
+                fn=self.flush_expired_content,
+                interval=max(0.1, min(max_ages) / 2),
+                on_error=self.metrics.record_timer_error,
+            )
+
+        # batches spilled by previous processes are replayed first
+        self._spill = None
+        self._spilling = False
+        self._replay_timer = None
+        if spill_dir:
+            self._spill = spill.SpillLog(
+                Path(spill_dir).joinpath(self.issue), max_disk_bytes=spill_max_bytes
+            )
+            self._spilling = not self._spill.is_empty()
+            self._replay_timer = flush_policy.FlushTimer(
+                fn=self.replay_spilled_content,
+                interval=spill_retry_interval,
+                name="tweepipe-spill-replay",
+                on_error=self.metrics.record_timer_error,
+            )
+
+        self.stats_file = stats_file
+        self._stats_timer = None
+        if stats_file:
+            self._stats_timer = flush_policy.FlushTimer(
+                fn=self.export_stats,
+                interval=stats_interval,
+                name="tweepipe-stats",
+                on_error=self.metrics.record_timer_error,
+            )
+
     def init_bulk_buffers(self):
         """Create temporary buffers to push data in bulk to the database. Initialize
         buffers after the employed schema. If the user is trying to push data not
@@ -87,32 +261,39 @@ class DBClient:
         if self.declared_collections:
             for collection_name in self.declared_collections:
                 self.bulk_data[collection_name] = []
+                self.bulk_bytes[collection_name] = 0
+                self.bulk_started[collection_name] = None
 
         for collection_name in self._db_schema.get(self.issue):
             self.bulk_data[collection_name] = []
+            self.bulk_bytes[collection_name] = 0
+            self.bulk_started[collection_name] = None
         # logger.debug(f"Initialized bulk buffers for {', '.join(list(self.bulk_data))}")
 
     def init_collections(self, _db_schema: dict):
-        """Re-create collections in MongoDB server using provided indexes."""
+        """Re-create collections in MongoDB server using provided indexes. Indexes
+        already ensured by the current process are skipped."""
+
+        if self.block_index_create:
+            return
 
         for db_name in _db_schema:
             for collection_name in _db_schema[db_name]:
-                # logger.info(f"Creating collection {collection_name} in db {db_name}")
-                collection_conn = self.conn[db_name][collection_name]
                 for index in _db_schema[db_name][collection_name]:
-                    try:
-                        if not self.block_index_create:
-                            collection_conn.create_index(
-                                index["index"],
-                                unique=index.get("unique", False),
-                            )
-                    except pymongo.errors.OperationFailure as e:
-                        pass
+                    connection.ensure_index(
+                        self.conn,
+                        db_name,
+                        collection_name,
+                        index["index"],
+                        unique=index.get("unique", False),
+                    )
 
     def _get_collection(self, collection_name: str, db_name: str = None):
         """Retrieve connection to the specified database collection."""
 
         db_name = self.issue if not db_name else db_name
+        if self.conn is None:
+            raise RuntimeError("No mongo connection with the current storage backend.")
 
         return self.conn[db_name][collection_name]
 
@@ -142,6 +323,8 @@ class DBClient:
         except pymongo.errors.OperationFailure as e:
             pass
 
+        connection.forget_indexes(self.conn, db_name)
+
     def _load_bson_object_ids(self, batch: Union[list, set]) -> list:
         """Load string bson ids to Bson Python objects."""
 
@@ -214,13 +397,49 @@ class DBClient:
         if collection_name not in self.bulk_data:
             raise ValueError("Undefined collection for current schema.")
 
-        if isinstance(data, list):
-            self.bulk_data[collection_name].extend(data)
-        else:
-            self.bulk_data[collection_name].append(data)
+        with self._bulk_lock:
+            if self._deduplicator:
+                data = self._deduplicator.filter(
+                    collection_name, data if isinstance(data, list) else [data]
+                )
+                if not data:
+                    return
+
+            if self.bulk_started[collection_name] is None:
+                self.bulk_started[collection_name] = time.monotonic()
+
+            if isinstance(data, list):
+                self.bulk_data[collection_name].extend(data)
+                self.bulk_bytes[collection_name] += self._size_estimator.estimate_many(
+                    collection_name, data
+                )
+            else:
+                self.bulk_data[collection_name].append(data)
+                self.bulk_bytes[collection_name] += self._size_estimator.estimate(
+                    collection_name, data
+                )
+
+            batch = None
+            policy = self.get_flush_policy(collection_name)
+            if policy.is_full(
+                len(self.bulk_data[collection_name]), self.bulk_bytes[collection_name]
+            ):
+                batch = self._swap_bulk_data(collection_name)
+
+        # written without holding the lock, other producers keep buffering meanwhile
+        if batch:
+            self._write_batch(collection_name, *batch)
+
+    def get_flush_policy(self, collection_name: str) -> flush_policy.FlushPolicy:
+        """Get the flush policy applied to a collection buffer.
+
+        :param collection_name: Name of the collection.
+        :type collection_name: str
+        :return: Flush policy of the collection.
+        :rtype: flush_policy.FlushPolicy
+        """
 
-        if len(self.bulk_data[collection_name]) >= self.batch_size:
-            self._push_bulk_data(collection_name)
+        return self.flush_policies.get(collection_name, self.default_flush_policy)
 
     def add_tweet(self, tweet: dict):
         self.add_to_collection("tweets", tweet)
@@ -273,6 +492,27 @@ class DBClient:
     def add_replies(self, replies: list):
         self.add_to_collection("replies", replies)
 
+    def add_relations(self, relations: dict):
+        """Add relations extracted from tweets to the collections of their type.
+
+        :param relations: Lists of relations per relation type, e.g. "hashtag".
+        :type relations: dict
+        :raises ValueError: only add relations with a collection in working db
+        """
+        for relation_type, relation_docs in relations.items():
+            if not relation_docs:
+                continue
+
+            collection_names = [
+                collection_name
+                for collection_name in db_schema.RELATION_COLLECTIONS[relation_type]
+                if collection_name in self.bulk_data
+            ]
+            if not collection_names:
+                raise ValueError("Undefined collection for current schema.")
+
+            self.add_to_collection(collection_names[0], relation_docs)
+
     def add_scores(self, scores: list):
         self.add_to_collection("users", scores)
 
@@ -302,41 +542,322 @@ class DBClient:
         )
         hydrating_tids_collection.create_index("tid", unique=True)
 
+        # claim tids of tid range chunks
+        hydrating_tids_collection.create_index("tid_int")
+
+        # claim and reclaim expired leases of tids without scanning the collection
+        hydrating_tids_collection.create_index(
+            [("status", pymongo.ASCENDING), ("lease_expires", pymongo.ASCENDING)]
+        )
+        hydrating_tids_collection.create_index("lease_id")
+
+    def _swap_bulk_data(self, collection_name: str) -> tuple:
+        """Swap out the buffer of a collection, the caller holding the buffer lock.
+
+        :param collection_name: Collection name of the buffer.
+        :type collection_name: str
+        :return: Buffered documents and their estimated size in bytes.
+        :rtype: tuple
+        """
+        docs = self.bulk_data[collection_name]
+        docs_size = self.bulk_bytes[collection_name]
+
+        # reset collection bulk buffer
+        self.bulk_data[collection_name] = []
+        self.bulk_bytes[collection_name] = 0
+        self.bulk_started[collection_name] = None
+
+        return docs, docs_size
+
     def _push_bulk_data(self, collection_name: str):
-        """Push a batch of data to the collection on the working database.
+        """Push a batch of data to the collection on the working database. With
+        background writers, the buffer is swapped out and handed over to the writers.
 
         :param collection_name: Collection name to push data to.
         :type collection_name: str
         """
-        collection = self._get_collection(collection_name, db_name=self.issue)
-        logger.info(f"Pushing to collection {collection_name} in db {self.issue}")
+        with self._bulk_lock:
+            docs, docs_size = self._swap_bulk_data(collection_name)
+
+        self._write_batch(collection_name, docs, docs_size)
+
+    def _write_batch(self, collection_name: str, docs: list, docs_size: int = 0):
+        """Write a swapped out batch, or hand it over to the background writers. Never
+        called while holding the buffer lock, as writes may block on a slow database.
+
+        :param collection_name: Collection name to push data to.
+        :type collection_name: str
+        :param docs: Documents to be inserted.
+        :type docs: list
+        :param docs_size: Estimated size of the documents in bytes, defaults to 0.
+        :type docs_size: int, optional
+        """
+        if not docs:
+            return
+
+        if self._spilling:
+            self._spill_bulk_data(collection_name, docs)
+        elif self._writer and self._spill:
+            # never block producers on a slow database
+            if not self._writer.try_submit(collection_name, docs, size=docs_size):
+                self._spill_bulk_data(collection_name, docs)
+        elif self._writer:
+            self._writer.submit(collection_name, docs, size=docs_size)
+        else:
+            self._write_bulk_data(collection_name, docs, docs_size, restore=True)
+
+    def _spill_bulk_data(self, collection_name: str, docs: list):
+        """Append a batch of documents to the spill log, to be replayed later on.
+
+        :param collection_name: Collection name the data was pushed to.
+        :type collection_name: str
+        :param docs: Documents to be inserted.
+        :type docs: list
+        """
+        docs = records.to_docs(docs)
+        if self._spill.append(collection_name, docs):
+            self._commit_dedup_keys(collection_name, docs)
+        else:
+            self._discard_dedup_keys(collection_name, docs)
+            self.metrics.record_error(collection_name)
+            logger.error(
+                f"Spill disk budget exhausted, dropping {len(docs)} documents of {collection_name}."
+            )
+
+    def _commit_dedup_keys(self, collection_name: str, docs: list):
+        if self._deduplicator:
+            self._deduplicator.commit(collection_name, docs)
+
+    def _discard_dedup_keys(self, collection_name: str, docs: list):
+        if self._deduplicator:
+            self._deduplicator.discard(collection_name, docs)
+
+    def _restore_bulk_data(self, collection_name: str, docs: list, docs_size: int = 0):
+        """Put a batch which failed to be written back in front of its buffer, for it
+        to be written again upon the next flush.
+
+        :param collection_name: Collection name of the buffer.
+        :type collection_name: str
+        :param docs: Documents of the failed batch.
+        :type docs: list
+        :param docs_size: Estimated size of the documents in bytes, defaults to 0.
+        :type docs_size: int, optional
+        """
+        with self._bulk_lock:
+            self.bulk_data[collection_name][:0] = docs
+            self.bulk_bytes[collection_name] += docs_size
+            if self.bulk_started[collection_name] is None:
+                self.bulk_started[collection_name] = time.monotonic()
+
+    def _write_bulk_data(
+        self,
+        collection_name: str,
+        docs: list,
+        docs_size: int = 0,
+        restore: bool = False,
+    ):
+        """Write a batch of documents to the collection with the storage backend. With a
+        spill log, batches failing on a database outage are spilled rather than lost.
+
+        :param collection_name: Collection name to write data to.
+        :type collection_name: str
+        :param docs: Documents to be inserted.
+        :type docs: list
+        :param docs_size: Estimated size of the documents in bytes, defaults to 0.
+        :type docs_size: int, optional
+        :param restore: Whether to put a batch which failed to be written back in its
+            buffer before raising, rather than dropping it, defaults to False.
+        :type restore: bool, optional
+        """
+        # relation records are only converted to documents once flushed
+        docs = records.to_docs(docs)
         try:
-            logger.info(
-                f"pushing {len(self.bulk_data[collection_name])} elements to {collection_name}"
+            self._write_to_backend(collection_name, docs, docs_size)
+        except spill.RECOVERABLE_ERRORS as e:
+            if not self._spill:
+                self._fail_bulk_data(collection_name, docs, docs_size, restore)
+                raise
+
+            if not self._spilling:
+                logger.warning(f"Spilling batches to disk until recovery: {e}.")
+            self._spilling = True
+            self._spill_bulk_data(collection_name, docs)
+        except Exception:
+            self._fail_bulk_data(collection_name, docs, docs_size, restore)
+            raise
+        else:
+            self._commit_dedup_keys(collection_name, docs)
+
+    def _fail_bulk_data(
+        self, collection_name: str, docs: list, docs_size: int, restore: bool
+    ):
+        if restore:
+            # keys of restored documents stay pending, as they are still buffered
+            self._restore_bulk_data(collection_name, docs, docs_size)
+        else:
+            # failed documents must not be dropped as duplicates when added again
+            self._discard_dedup_keys(collection_name, docs)
+
+    def _write_to_backend(self, collection_name: str, docs: list, docs_size: int = 0):
+        """Write a batch of documents to the collection with the storage backend, and
+        record write metrics.
+
+        :param collection_name: Collection name to write data to.
+        :type collection_name: str
+        :param docs: Documents to be inserted.
+        :type docs: list
+        :param docs_size: Estimated size of the documents in bytes, defaults to 0.
+        :type docs_size: int, optional
+        """
+        start = time.perf_counter()
+        try:
+            result = self.backend.write(collection_name, docs)
+            self.metrics.record_write(
+                collection_name,
+                doc_count=len(docs),
+                byte_count=docs_size,
+                latency=time.perf_counter() - start,
+                inserted_count=result.written_count,
+                write_errors=result.write_errors,
             )
-            if collection_name == "users":
-                logger.info(
-                    f"Individual user ids: {len(set([user.get('uid') for user in self.bulk_data[collection_name]]))}"
-                )
-                logger.info(
-                    f"Number of records to insert: {len(self.bulk_data[collection_name])}"
-                )
-            # print(json.dumps(self.bulk_data[collection_name][0], indent=2))
-            # time.sleep(100)
-            collection.insert_many(self.bulk_data[collection_name], ordered=False)
-        except pymongo.errors.BulkWriteError as e:
-            print(f"Encountered error while pushing to {collection_name}")  # , e)
-            pass
+        except Exception:
+            self.metrics.record_error(collection_name)
+            raise
+
+    def _replay_bulk_data(self, collection_name: str, docs: list):
+        self._write_to_backend(
+            collection_name,
+            docs,
+            self._size_estimator.estimate_many(collection_name, docs),
+        )
 
-        # reset collection bulk buffer
-        self.bulk_data[collection_name] = []
+    def replay_spilled_content(self):
+        """Write spilled batches back to the database, resuming direct writes once the
+        spill log is drained."""
+
+        if self._spill is None or self._spill.is_empty():
+            self._spilling = False
+            return
 
-    def flush_content(self):
-        """Flush cached tweets to db upon exit."""
+        if self._spill.replay(self._replay_bulk_data):
+            self._spilling = False
+            logger.info("Replayed spilled batches, resuming direct writes.")
 
-        for collection_name in self.bulk_data:
-            if len(self.bulk_data.get(collection_name)) > 0:
-                self._push_bulk_data(collection_name)
+    def stats(self) -> dict:
+        """Get stats on the data pushed and buffered by the client.
+
+        :return: Write metrics per collection, current buffer sizes, as well as the
+            state of the background writers if any.
+        :rtype: dict
+        """
+
+        with self._bulk_lock:
+            buffers = {
+                collection_name: {
+                    "docs": len(self.bulk_data[collection_name]),
+                    "bytes": self.bulk_bytes[collection_name],
+                }
+                for collection_name in self.bulk_data
+            }
+
+        stats = {"issue": self.issue, "collections": self.metrics.to_dict()}
+        stats["buffers"] = buffers
+        stats["timer_errors"] = self.metrics.timer_errors()
+        if self._deduplicator:
+            stats["dedup"] = self._deduplicator.stats()
+        if self._writer:
+            stats["writer"] = {
+                "written_batches": self._writer.written_batch_count,
+                "failed_batches": self._writer.failed_batch_count,
+                "pending_batches": self._writer.pending_batch_count,
+                "inflight_bytes": self._writer.inflight_bytes,
+                "backpressure_seconds": self._writer.backpressure_seconds,
+            }
+        if self._spill:
+            stats["spill"] = {**self._spill.stats(), "spilling": self._spilling}
+
+        return stats
+
+    def export_stats(self, output_file: str = None):
+        """Append the current client stats to a jsonl file.
+
+        :param output_file: Path to the jsonl file, defaults to the client's stats file.
+        :type output_file: str, optional
+        """
+
+        output_file = output_file if output_file else self.stats_file
+        if not output_file:
+            raise ValueError("No file to export stats to.")
+
+        metrics.export_stats(self.stats(), output_file)
+
+    def flush_content(self, wait: bool = True):
+        """Flush cached tweets to db upon exit.
+
+        :param wait: Whether to wait for the background writers to be done writing
+            all flushed buffers, defaults to True.
+        :type wait: bool, optional
+        :raises writer.BatchWriteError: If background writers failed to write batches
+            since the last wait.
+        """
+
+        with self._bulk_lock:
+            batches = [
+                (collection_name, *self._swap_bulk_data(collection_name))
+                for collection_name in self.bulk_data
+                if len(self.bulk_data.get(collection_name)) > 0
+            ]
+
+        for collection_name, docs, docs_size in batches:
+            self._write_batch(collection_name, docs, docs_size)
+
+        if self._writer and wait:
+            self._writer.join()
+
+    def flush_expired_content(self):
+        """Flush buffers holding data older than their flush policy's maximum age.
+        Batches failing a synchronous write are put back in their buffer, and flushed
+        again once expired."""
+
+        now = time.monotonic()
+        with self._bulk_lock:
+            batches = [
+                (collection_name, *self._swap_bulk_data(collection_name))
+                for collection_name, started in self.bulk_started.items()
+                if started is not None
+                and self.get_flush_policy(collection_name).is_expired(now - started)
+            ]
+
+        for collection_name, docs, docs_size in batches:
+            self._write_batch(collection_name, docs, docs_size)
+
+    def close(self):
+        """Flush all buffers and stop the background writers and flush timer.
+
+        :raises writer.BatchWriteError: If background writers failed to write batches,
+            once everything else is closed.
+        """
+
+        if self._flush_timer:
+            self._flush_timer.stop()
+        if self._replay_timer:
+            self._replay_timer.stop()
+        try:
+            self.flush_content(wait=True)
+            if self._writer:
+                self._writer.close()
+        finally:
+            if self._writer and not self._writer.closed:
+                self._writer.close(raise_errors=False)
+            if self._spill:
+                # left over batches are replayed by the next client on the same issue
+                if not self._spilling:
+                    self.replay_spilled_content()
+                self._spill.close()
+            self.backend.close()
+            if self._stats_timer:
+                self._stats_timer.stop()
+                self.export_stats()
 
     def reset_twitter_credentials_statuses(self):
         """Resets Twitter credentials use statuses."""
@@ -102,6 +102,14 @@ INDEX_V3 = {
             {"index": "tid", "unique": True},
             {"index": "key", "unique": False},
             {"index": "created_at", "unique": False},
+            {
+                "index": [
+                    ("status", pymongo.ASCENDING),
+                    ("lease_expires", pymongo.ASCENDING),
+                ],
+                "unique": False,
+            },
+            {"index": "lease_id", "unique": False},
         ],
         "likes": [
             {"index": "tid", "unique": True},
@@ -163,6 +171,17 @@ INDEX_V3 = {
             {"index": "tid", "unique": True},
             {"index": "key", "unique": False},
             {"index": "created_at", "unique": False},
+            {
+                "index": [
+                    ("status", pymongo.ASCENDING),
+                    ("lease_expires", pymongo.ASCENDING),
+                ],
+                "unique": False,
+            },
+            {"index": "lease_id", "unique": False},
+        ],
+        "missing_tids": [
+            {"index": "id", "unique": True},
         ],
         "likes": [
             {"index": "tid", "unique": True},
@@ -215,6 +234,15 @@ TWITTER_RELATION_TYPES = [
     "reply_relations",
 ]
 
+# collections of each type of extracted relations, in INDEX_V3 and the default schema
+RELATION_COLLECTIONS = {
+    "hashtag": ("hashtags", "hashtag_relations"),
+    "retweet": ("retweets", "retweet_relations"),
+    "mention": ("mentions", "mention_relations"),
+    "quote": ("quotes", "quote_relations"),
+    "reply": ("replies", "reply_relations"),
+}
+
 DEFAULT_ACADEMIC_V2_SCHEMA = {
     "default": {
         "places": [{"index": "id", "unique": True}],
@@ -0,0 +1,322 @@
+import collections
+import hashlib
+import math
+import threading
+import time
+
+# fields identifying duplicate documents, for both v1.1 and v2 documents
+DEDUP_KEY_FIELDS = {"tweets": ("tid", "id"), "users": ("uid", "id")}
+
+
+class SeenSet:
+    """Bounded set of recently seen keys, evicting the least recently seen keys
+    once full, as well as keys seen more than `ttl` seconds ago.
+
+    :param capacity: Maximum number of keys held, defaults to 1000000.
+    :type capacity: int, optional
+    :param ttl: Time in seconds after which a key is forgotten, defaults to None
+        (no expiry).
+    :type ttl: float, optional
+    """
+
+    def __init__(self, capacity: int = 1000000, ttl: float = None):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._keys = collections.OrderedDict()
+
+    def contains(self, key: str) -> bool:
+        """Check whether a key is in the set, refreshing its recency if so.
+
+        :param key: Key to look up.
+        :type key: str
+        :return: Whether the key is in the set.
+        :rtype: bool
+        """
+
+        seen_at = self._keys.get(key)
+        if seen_at is None:
+            return False
+
+        if self.ttl is not None and time.monotonic() - seen_at >= self.ttl:
+            return False
+
+        self._keys.move_to_end(key)
+        return True
+
+    def add(self, key: str):
+        """Add a key to the set, evicting the least recently seen keys if full.
+
+        :param key: Key to add.
+        :type key: str
+        """
+
+        self._keys[key] = time.monotonic()
+        self._keys.move_to_end(key)
+        while len(self._keys) > self.capacity:
+            self._keys.popitem(last=False)
+
+    def check_and_add(self, key: str) -> bool:
+        """Add a key to the set.
+
+        :param key: Key to add.
+        :type key: str
+        :return: Whether the key was already in the set.
+        :rtype: bool
+        """
+
+        if self.contains(key):
+            return True
+
+        self.add(key)
+        return False
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class BloomFilter:
+    """Space efficient approximate set of seen keys. Some unseen keys are reported
+    as seen with a probability of `error_rate`. Two generations of filters are kept:
+    once the current filter holds `capacity` keys, it replaces the previous one and a
+    fresh filter is started, so that old keys are eventually forgotten.
+
+    :param capacity: Number of keys held by a generation, defaults to 1000000.
+    :type capacity: int, optional
+    :param error_rate: Probability of false positives, defaults to 0.001.
+    :type error_rate: float, optional
+    """
+
+    def __init__(self, capacity: int = 1000000, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.bit_count = math.ceil(
+            -capacity * math.log(error_rate) / (math.log(2) ** 2)
+        )
+        self.hash_count = max(1, round(self.bit_count / capacity * math.log(2)))
+
+        self._current = bytearray(math.ceil(self.bit_count / 8))
+        self._previous = None
+        self._current_count = 0
+
+    def _get_positions(self, key: str) -> list:
+        # double hashing from a single digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+
+        return [(h1 + i * h2) % self.bit_count for i in range(self.hash_count)]
+
+    @staticmethod
+    def _contains(bits: bytearray, positions: list) -> bool:
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in positions)
+
+    def contains(self, key: str) -> bool:
+        """Check whether a key is (probably) in the filter.
+
+        :param key: Key to look up.
+        :type key: str
+        :return: Whether the key was (probably) added to the filter.
+        :rtype: bool
+        """
+
+        positions = self._get_positions(key)
+
+        return self._contains(self._current, positions) or (
+            self._previous is not None and self._contains(self._previous, positions)
+        )
+
+    def add(self, key: str):
+        """Add a key to the current generation of the filter.
+
+        :param key: Key to add.
+        :type key: str
+        """
+
+        positions = self._get_positions(key)
+        if self._contains(self._current, positions):
+            return
+
+        self._add_positions(positions)
+
+    def _add_positions(self, positions: list):
+        for pos in positions:
+            self._current[pos >> 3] |= 1 << (pos & 7)
+        self._current_count += 1
+
+        if self._current_count >= self.capacity:
+            self._previous = self._current
+            self._current = bytearray(len(self._previous))
+            self._current_count = 0
+
+    def check_and_add(self, key: str) -> bool:
+        """Add a key to the filter.
+
+        :param key: Key to add.
+        :type key: str
+        :return: Whether the key was (probably) already in the filter.
+        :rtype: bool
+        """
+
+        positions = self._get_positions(key)
+        if self._contains(self._current, positions):
+            return True
+
+        seen = self._previous is not None and self._contains(self._previous, positions)
+        self._add_positions(positions)
+
+        return seen
+
+    def __len__(self) -> int:
+        return self._current_count
+
+
+class Deduplicator:
+    """Drop documents already added to a collection before they get serialized and
+    sent to the database, where they would be rejected by unique indexes anyway.
+
+    Keys of documents let through are pending until their batch is written: they are
+    only marked as seen once the write succeeded (see `commit`), and forgotten if it
+    failed (see `discard`), so that documents of failed batches are not dropped when
+    added again. Keys cannot be removed from a bloom filter, hence the pending keys
+    being kept aside.
+
+    :param mode: Kind of seen set, either "lru" or "bloom", defaults to "lru".
+    :type mode: str, optional
+    :param capacity: Number of keys held per collection, defaults to 1000000.
+    :type capacity: int, optional
+    :param ttl: Time in seconds after which keys are forgotten (lru only), defaults
+        to 3600.
+    :type ttl: float, optional
+    :param key_fields: Fields identifying documents per collection, defaults to
+        DEDUP_KEY_FIELDS.
+    :type key_fields: dict, optional
+    """
+
+    def __init__(
+        self,
+        mode: str = "lru",
+        capacity: int = 1000000,
+        ttl: float = 3600,
+        key_fields: dict = None,
+    ):
+        if mode not in ("lru", "bloom"):
+            raise ValueError("Deduplication mode must be either 'lru' or 'bloom'.")
+
+        self.mode = mode
+        self.capacity = capacity
+        self.ttl = ttl
+        self.key_fields = key_fields if key_fields is not None else DEDUP_KEY_FIELDS
+
+        self._seen = {}
+        self._pending = collections.defaultdict(set)
+        self._lock = threading.Lock()
+        self._hits = collections.Counter()
+        self._misses = collections.Counter()
+
+    def _get_seen(self, collection_name: str):
+        if collection_name not in self._seen:
+            if self.mode == "bloom":
+                self._seen[collection_name] = BloomFilter(capacity=self.capacity)
+            else:
+                self._seen[collection_name] = SeenSet(
+                    capacity=self.capacity, ttl=self.ttl
+                )
+
+        return self._seen[collection_name]
+
+    def _get_key(self, collection_name: str, doc: dict) -> str:
+        for field in self.key_fields[collection_name]:
+            key = doc.get(field)
+            if key is not None:
+                return str(key)
+
+        return None
+
+    def filter(self, collection_name: str, docs: list) -> list:
+        """Remove documents already seen in a collection.
+
+        :param collection_name: Collection the documents are added to.
+        :type collection_name: str
+        :param docs: Documents to be added.
+        :type docs: list
+        :return: Documents never seen before.
+        :rtype: list
+        """
+
+        if collection_name not in self.key_fields:
+            return docs
+
+        unseen_docs = []
+        with self._lock:
+            seen = self._get_seen(collection_name)
+            pending = self._pending[collection_name]
+            for doc in docs:
+                key = self._get_key(collection_name, doc)
+                if key is not None and (key in pending or seen.contains(key)):
+                    self._hits[collection_name] += 1
+                    continue
+
+                if key is not None:
+                    pending.add(key)
+                self._misses[collection_name] += 1
+                unseen_docs.append(doc)
+
+        return unseen_docs
+
+    def _get_keys(self, collection_name: str, docs: list) -> list:
+        keys = (self._get_key(collection_name, doc) for doc in docs)
+
+        return [key for key in keys if key is not None]
+
+    def commit(self, collection_name: str, docs: list):
+        """Mark documents as seen, once their batch was written (or spilled).
+
+        :param collection_name: Collection the documents were written to.
+        :type collection_name: str
+        :param docs: Written documents.
+        :type docs: list
+        """
+
+        if collection_name not in self.key_fields:
+            return
+
+        with self._lock:
+            seen = self._get_seen(collection_name)
+            pending = self._pending[collection_name]
+            for key in self._get_keys(collection_name, docs):
+                pending.discard(key)
+                seen.add(key)
+
+    def discard(self, collection_name: str, docs: list):
+        """Forget documents of a batch which failed to be written, for them not to be
+        dropped as duplicates when added again.
+
+        :param collection_name: Collection the documents failed to be written to.
+        :type collection_name: str
+        :param docs: Documents of the failed batch.
+        :type docs: list
+        """
+
+        if collection_name not in self.key_fields:
+            return
+
+        with self._lock:
+            pending = self._pending[collection_name]
+            for key in self._get_keys(collection_name, docs):
+                pending.discard(key)
+
+    def stats(self) -> dict:
+        """Get duplicate hit rates per collection."""
+
+        stats = {}
+        for collection_name in self._seen:
+            hits = self._hits[collection_name]
+            total = hits + self._misses[collection_name]
+            stats[collection_name] = {
+                "hits": hits,
+                "misses": self._misses[collection_name],
+                "hit_rate": hits / total if total else 0.0,
+                "size": len(self._seen[collection_name]),
+                "pending": len(self._pending[collection_name]),
+            }
+
+        return stats
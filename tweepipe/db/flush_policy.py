@@ -0,0 +1,95 @@
+import threading
+from typing import Callable
+
+from loguru import logger
+
+# size of the messages insert_many splits batches into
+MAX_MESSAGE_BYTES = 48 * 1000 * 1000
+
+
+class FlushPolicy:
+    """Decide when a collection buffer should be pushed to the database. A buffer
+    is flushed as soon as any of the limits is reached.
+
+    :param max_docs: Maximum number of buffered documents, defaults to 1024.
+    :type max_docs: int, optional
+    :param max_bytes: Maximum estimated BSON size of the buffered documents,
+        defaults to MAX_MESSAGE_BYTES.
+    :type max_bytes: int, optional
+    :param max_age: Maximum time (in seconds) a document stays buffered, enforced
+        even when no new data is added, defaults to None (no limit).
+    :type max_age: float, optional
+    """
+
+    def __init__(
+        self,
+        max_docs: int = 1024,
+        max_bytes: int = MAX_MESSAGE_BYTES,
+        max_age: float = None,
+    ):
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def is_full(self, doc_count: int, byte_count: int) -> bool:
+        """Whether the buffer reached its size limits."""
+
+        if self.max_docs and doc_count >= self.max_docs:
+            return True
+        if self.max_bytes and byte_count >= self.max_bytes:
+            return True
+
+        return False
+
+    def is_expired(self, age: float) -> bool:
+        """Whether the oldest buffered document reached the age limit."""
+
+        return self.max_age is not None and age >= self.max_age
+
+
+class FlushTimer:
+    """Periodically run a check from a daemon thread, used to flush buffers which
+    went past their maximum age while no new data came in.
+
+    :param fn: Function to run periodically.
+    :type fn: Callable
+    :param interval: Time in seconds between two runs.
+    :type interval: float
+    :param name: Name of the timer thread, defaults to "tweepipe-flush-timer".
+    :type name: str, optional
+    :param on_error: Function called with the name of the timer upon a failed run,
+        e.g. to count errors, defaults to None.
+    :type on_error: Callable, optional
+    """
+
+    def __init__(
+        self,
+        fn: Callable,
+        interval: float,
+        name: str = "tweepipe-flush-timer",
+        on_error: Callable = None,
+    ):
+        self.fn = fn
+        self.interval = interval
+        self.name = name
+        self.on_error = on_error
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.fn()
+            except Exception as e:
+                # never let a failed run stop the timer, flushes which failed keep
+                # their batch buffered until the next run
+                logger.error(f"Error in {self.name}: {e}.")
+                if self.on_error:
+                    self.on_error(self.name)
+
+    def stop(self):
+        """Stop the timer thread."""
+
+        self._stopped.set()
+        self._thread.join()
@@ -0,0 +1,207 @@
+import datetime
+
+import bson
+import pymongo
+from loguru import logger
+
+from tweepipe.utils import keywords as keywords_utils
+
+# keywords looked up per query, each keyword adding a clause to the query
+KEYWORD_BATCH_SIZE = 64
+
+# seconds of tweets rescanned behind the last indexed `_id` upon updates
+SAFETY_WINDOW_SECONDS = 600
+
+
+class KeywordIndex:
+    """Inverted n-gram index of the texts of stored tweets, kept in a side collection
+    of the issue database, so that repeated keyword searches only fetch and verify
+    candidate tweets rather than scanning the whole tweets collection.
+
+    Each indexed tweet gets a document holding the distinct n-grams of its texts (see
+    keywords_utils.get_tweet_texts), with a multikey index on the n-grams. A tweet
+    containing a keyword contains all n-grams of the keyword, candidates are therefore
+    a superset of the matching tweets, to be verified with a KeywordMatcher. Keywords
+    shorter than the n-grams cannot be looked up.
+
+    The index is updated incrementally, tweets inserted since the last update being
+    indexed in `_id` order. Object ids are assigned by the writers rather than by the
+    server, a tweet committed after the last update may therefore get a lower `_id`
+    than the last indexed one: updates rescan the tweets whose `_id` was generated up
+    to `safety_seconds` before the last indexed one, skipping those already indexed.
+
+    :param db: Issue database.
+    :type db: pymongo.database.Database
+    :param search_collection: Collection of the indexed tweets, defaults to "tweets".
+    :type search_collection: str, optional
+    :param search_field: Field holding the texts of tweets, defaults to "text".
+    :type search_field: str, optional
+    :param safety_seconds: Time span rescanned behind the last indexed `_id`,
+        defaults to SAFETY_WINDOW_SECONDS.
+    :type safety_seconds: float, optional
+    """
+
+    def __init__(
+        self,
+        db: pymongo.database.Database,
+        search_collection: str = "tweets",
+        search_field: str = "text",
+        safety_seconds: float = SAFETY_WINDOW_SECONDS,
+    ):
+        self.db = db
+        self.search_collection = search_collection
+        self.search_field = search_field
+        self.safety_seconds = safety_seconds
+
+        self.name = f"{search_collection}_{search_field}_keyword_index"
+        self.collection = db[self.name]
+        self.state_collection = db["keyword_indexes"]
+
+    def _get_state(self) -> dict:
+        state = self.state_collection.find_one({"_id": self.name})
+        return state if state else {}
+
+    def _get_update_filter(self, last_id) -> tuple:
+        """Get the filter of the tweets to be scanned by an update, and the ids of the
+        tweets of the safety window already indexed."""
+
+        if last_id is None:
+            return {}, set()
+        if not isinstance(last_id, bson.ObjectId) or not self.safety_seconds:
+            return {"_id": {"$gt": last_id}}, set()
+
+        window_start = bson.ObjectId.from_datetime(
+            last_id.generation_time - datetime.timedelta(seconds=self.safety_seconds)
+        )
+        indexed_ids = {
+            doc["_id"]
+            for doc in self.collection.find(
+                {"_id": {"$gte": window_start, "$lte": last_id}}, projection={"_id": 1}
+            )
+        }
+
+        return {"_id": {"$gte": window_start}}, indexed_ids
+
+    def update(self, batch_size: int = 4096, rebuild: bool = False) -> int:
+        """Index the tweets inserted since the last update.
+
+        :param batch_size: Number of tweets indexed per bulk write, defaults to 4096.
+        :type batch_size: int, optional
+        :param rebuild: Whether to drop and rebuild the whole index, defaults to False.
+        :type rebuild: bool, optional
+        :return: Number of newly indexed tweets.
+        :rtype: int
+        """
+
+        if rebuild:
+            self.collection.drop()
+            self.state_collection.delete_one({"_id": self.name})
+        self.collection.create_index("grams")
+
+        last_id = self._get_state().get("last_id")
+        update_filter, indexed_ids = self._get_update_filter(last_id)
+        cursor = self.db[self.search_collection].find(
+            filter=update_filter,
+            projection={
+                **keywords_utils.get_text_projection(self.search_field),
+                "uid": 1,
+            },
+            sort=[("_id", pymongo.ASCENDING)],
+            batch_size=batch_size,
+        )
+
+        indexed_count = 0
+        operations = []
+        for doc in cursor:
+            if doc["_id"] in indexed_ids:
+                continue
+
+            try:
+                texts = keywords_utils.get_tweet_texts(doc["json"], self.search_field)
+            except KeyError:
+                texts = []
+            operations.append(
+                pymongo.operations.ReplaceOne(
+                    {"_id": doc["_id"]},
+                    {
+                        "uid": doc.get("uid"),
+                        "grams": list(keywords_utils.get_ngrams(texts)),
+                    },
+                    upsert=True,
+                )
+            )
+            # late tweets of the safety window must not move the checkpoint back
+            if last_id is None or doc["_id"] > last_id:
+                last_id = doc["_id"]
+
+            if len(operations) >= batch_size:
+                indexed_count += self._write(operations, last_id)
+                operations = []
+
+        if operations:
+            indexed_count += self._write(operations, last_id)
+
+        if indexed_count:
+            logger.info(f"Indexed {indexed_count} tweets in {self.name}.")
+
+        return indexed_count
+
+    def _write(self, operations: list, last_id) -> int:
+        self.collection.bulk_write(operations, ordered=False)
+        # checkpoint only once the batch is written
+        self.state_collection.update_one(
+            {"_id": self.name},
+            {"$set": {"last_id": last_id, "updated_at": datetime.datetime.utcnow()}},
+            upsert=True,
+        )
+
+        return len(operations)
+
+    @staticmethod
+    def is_indexable(keyword: str) -> bool:
+        """Whether a keyword can be looked up, i.e. spans at least one n-gram."""
+
+        return len(keywords_utils.normalize(keyword)) >= keywords_utils.NGRAM_SIZE
+
+    def get_candidate_ids(self, keywords: list) -> list:
+        """Get the `_id` of the tweets which may contain any of the keywords.
+
+        :param keywords: Keywords, all of them indexable.
+        :type keywords: list
+        :raises ValueError: If a keyword is too short to be looked up.
+        :return: Sorted candidate ids.
+        :rtype: list
+        """
+
+        unindexable_keywords = [kw for kw in keywords if not self.is_indexable(kw)]
+        if unindexable_keywords:
+            raise ValueError(
+                f"Keywords shorter than {keywords_utils.NGRAM_SIZE} characters cannot be looked up: {unindexable_keywords}."
+            )
+
+        # keywords sharing the same n-grams are looked up once
+        ngram_sets = list({frozenset(keywords_utils.get_ngrams(kw)) for kw in keywords})
+
+        candidate_ids = set()
+        for i in range(0, len(ngram_sets), KEYWORD_BATCH_SIZE):
+            query = {
+                "$or": [
+                    {"grams": {"$all": sorted(ngrams)}}
+                    for ngrams in ngram_sets[i : i + KEYWORD_BATCH_SIZE]
+                ]
+            }
+            candidate_ids.update(
+                doc["_id"] for doc in self.collection.find(query, projection={"_id": 1})
+            )
+
+        return sorted(candidate_ids)
+
+    def stats(self) -> dict:
+        """Get the number of indexed tweets and the state of the last update."""
+
+        state = self._get_state()
+        return {
+            "indexed_docs": self.collection.estimated_document_count(),
+            "last_id": state.get("last_id"),
+            "updated_at": state.get("updated_at"),
+        }
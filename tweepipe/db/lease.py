@@ -0,0 +1,233 @@
+import datetime
+import os
+import socket
+import threading
+import uuid
+from typing import Any
+
+import pymongo
+
+
+def _get_default_owner() -> str:
+    """Identify the current worker by host, process and a random suffix."""
+
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaseClaimer:
+    """Claim blocks of work documents (e.g. tweet ids in `hydrating_tids`) for a
+    single worker. Instead of flagging each document individually, a whole block is
+    claimed with a single bulk update writing the lease owner and its expiry date.
+    Documents held by a lease which expired (crashed or stalled worker) are claimable
+    again, so that no document gets stranded with the `1` (processing) status.
+
+    Each claimed block gets its own lease, a worker may hold several blocks at once
+    (e.g. one being written while the next one is looked up), leases being dropped
+    with `complete` once their documents got their final status.
+
+    Work documents follow the hydration status convention:
+        0: waiting
+        1: processing (leased)
+        2: done
+        -1: missing
+
+    :param collection: Collection holding the work documents.
+    :type collection: pymongo.collection.Collection
+    :param base_filter: Additional filter restricting the claimable documents, for
+        example on a `key` or a `tid_int` range, defaults to None.
+    :type base_filter: dict, optional
+    :param block_size: Maximum number of documents claimed at once, defaults to 4096.
+    :type block_size: int, optional
+    :param lease_seconds: Duration of a lease before it can be reclaimed by another
+        worker, defaults to 900.
+    :type lease_seconds: int, optional
+    :param owner: Name of the worker holding the leases, defaults to None.
+    :type owner: str, optional
+    :param projection: Fields returned for each claimed document, defaults to None.
+    :type projection: dict, optional
+    :param sort: Order in which documents are claimed, e.g. by `tid_int` for blocks to
+        cover consecutive ids, defaults to None.
+    :type sort: list, optional
+    """
+
+    def __init__(
+        self,
+        collection: pymongo.collection.Collection,
+        base_filter: dict = None,
+        block_size: int = 4096,
+        lease_seconds: int = 900,
+        owner: str = None,
+        projection: dict = None,
+        sort: list = None,
+    ):
+        self.collection = collection
+        self.base_filter = base_filter if base_filter else {}
+        self.block_size = block_size
+        self.lease_seconds = lease_seconds
+        self.owner = owner if owner else _get_default_owner()
+        self.projection = projection if projection else {"tid": True, "_id": True}
+        self.sort = sort
+
+        # lease of the last claimed block
+        self.lease_id = None
+        self.lease_expires = None
+        self.claimed_count = 0
+
+        # expiry dates of the leases held, by lease id
+        self._leases = {}
+        self._leases_lock = threading.Lock()
+
+    def _get_claimable_filter(self, now: datetime.datetime) -> dict:
+        """Match waiting documents, as well as documents whose lease expired."""
+
+        claimable_filter = {
+            "$or": [
+                {"status": 0},
+                {"status": 1, "lease_expires": {"$lt": now}},
+                # processing documents left over without any lease
+                {"status": 1, "lease_expires": {"$exists": False}},
+            ]
+        }
+        if self.base_filter:
+            claimable_filter = {"$and": [self.base_filter, claimable_filter]}
+
+        return claimable_filter
+
+    def claim(self) -> list:
+        """Claim the next block of documents for the current worker.
+
+        Claims are race-free: concurrent workers may select the same candidates, but
+        only the documents actually updated under this worker's lease are returned.
+
+        :return: Claimed documents, an empty list once no work is left.
+        :rtype: list
+        """
+
+        now = datetime.datetime.utcnow()
+        claimable_filter = self._get_claimable_filter(now)
+        candidates = self.collection.find(
+            filter=claimable_filter,
+            projection={"_id": True},
+            limit=self.block_size,
+            sort=self.sort,
+        )
+        candidate_ids = [doc["_id"] for doc in candidates]
+        if not candidate_ids:
+            return []
+
+        lease_id = uuid.uuid4().hex
+        lease_expires = now + datetime.timedelta(seconds=self.lease_seconds)
+        self.collection.update_many(
+            {"$and": [{"_id": {"$in": candidate_ids}}, claimable_filter]},
+            {
+                "$set": {
+                    "status": 1,
+                    "lease_owner": self.owner,
+                    "lease_id": lease_id,
+                    "lease_expires": lease_expires,
+                }
+            },
+        )
+
+        claimed_docs = list(
+            self.collection.find(
+                filter={"_id": {"$in": candidate_ids}, "lease_id": lease_id},
+                projection=self.projection,
+                sort=self.sort,
+            )
+        )
+        self.claimed_count += len(claimed_docs)
+
+        if claimed_docs:
+            self.lease_id, self.lease_expires = lease_id, lease_expires
+            with self._leases_lock:
+                self._leases[lease_id] = lease_expires
+
+        return claimed_docs
+
+    def _get_leases(self) -> dict:
+        with self._leases_lock:
+            return dict(self._leases)
+
+    def should_renew(self) -> bool:
+        """Whether any held lease went past half of its duration."""
+
+        leases = self._get_leases()
+        if not leases:
+            return False
+
+        remaining = min(leases.values()) - datetime.datetime.utcnow()
+
+        return remaining.total_seconds() < self.lease_seconds / 2
+
+    def renew(self):
+        """Extend the held leases on all documents still held by this worker."""
+
+        leases = self._get_leases()
+        if not leases:
+            return
+
+        lease_expires = datetime.datetime.utcnow() + datetime.timedelta(
+            seconds=self.lease_seconds
+        )
+        self.collection.update_many(
+            {"lease_id": {"$in": list(leases)}, "status": 1},
+            {"$set": {"lease_expires": lease_expires}},
+        )
+        with self._leases_lock:
+            for lease_id in leases:
+                if lease_id in self._leases:
+                    self._leases[lease_id] = lease_expires
+        if self.lease_id in leases:
+            self.lease_expires = lease_expires
+
+    def complete(self, lease_id: str = None):
+        """Stop renewing a lease once all of its documents got their final status.
+
+        :param lease_id: Lease of a claimed block, defaults to None, i.e. the lease
+            of the last claimed block.
+        :type lease_id: str, optional
+        """
+
+        with self._leases_lock:
+            self._leases.pop(lease_id if lease_id else self.lease_id, None)
+
+    def release(self):
+        """Give back all documents still held by this worker (e.g. upon exit)."""
+
+        leases = self._get_leases()
+        if not leases:
+            return
+
+        self.collection.update_many(
+            {"lease_id": {"$in": list(leases)}, "status": 1},
+            {
+                "$set": {"status": 0},
+                "$unset": {"lease_owner": "", "lease_id": "", "lease_expires": ""},
+            },
+        )
+        with self._leases_lock:
+            for lease_id in leases:
+                self._leases.pop(lease_id, None)
+        self.lease_id = None
+        self.lease_expires = None
+
+    @staticmethod
+    def get_status_update(_id: Any, status: int) -> pymongo.operations.UpdateOne:
+        """Build the final status update of a document, clearing its lease.
+
+        :param _id: Id of the work document.
+        :type _id: Any
+        :param status: Final status of the document (2: done, -1: missing).
+        :type status: int
+        :return: Update operation to be bulk written.
+        :rtype: pymongo.operations.UpdateOne
+        """
+
+        return pymongo.operations.UpdateOne(
+            {"_id": _id},
+            {
+                "$set": {"status": status},
+                "$unset": {"lease_owner": "", "lease_id": "", "lease_expires": ""},
+            },
+        )
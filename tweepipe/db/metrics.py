@@ -0,0 +1,143 @@
+import bisect
+import datetime
+import json
+import threading
+
+# upper bounds (in seconds) of the write latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, float("inf"))
+
+DUPLICATE_KEY_ERROR_CODE = 11000
+
+
+class CollectionMetrics:
+    """Counters on the writes of a single collection."""
+
+    def __init__(self):
+        self.batch_count = 0
+        self.doc_count = 0
+        self.inserted_count = 0
+        self.byte_count = 0
+        self.duplicate_key_error_count = 0
+        self.write_error_count = 0
+        self.error_count = 0
+        self.latency_sum = 0.0
+        self.latency_histogram = [0] * len(LATENCY_BUCKETS)
+
+    def to_dict(self) -> dict:
+        return {
+            "batches": self.batch_count,
+            "docs": self.doc_count,
+            "inserted": self.inserted_count,
+            "bytes": self.byte_count,
+            "duplicate_key_errors": self.duplicate_key_error_count,
+            "write_errors": self.write_error_count,
+            "errors": self.error_count,
+            "latency_sum": self.latency_sum,
+            "latency_histogram": {
+                str(bound): count
+                for bound, count in zip(LATENCY_BUCKETS, self.latency_histogram)
+            },
+        }
+
+
+class DBMetrics:
+    """Thread-safe metrics on the bulk writes of a database client, covering the
+    number of documents and (estimated) bytes pushed, duplicate key and other
+    errors, as well as a histogram of write latencies per collection.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._collections = {}
+        self._timer_errors = {}
+
+    def _get_collection_metrics(self, collection_name: str) -> CollectionMetrics:
+        if collection_name not in self._collections:
+            self._collections[collection_name] = CollectionMetrics()
+
+        return self._collections[collection_name]
+
+    def record_write(
+        self,
+        collection_name: str,
+        doc_count: int,
+        byte_count: int,
+        latency: float,
+        inserted_count: int = None,
+        write_errors: list = None,
+    ):
+        """Record a bulk write to a collection.
+
+        :param collection_name: Name of the collection written to.
+        :type collection_name: str
+        :param doc_count: Number of documents in the batch.
+        :type doc_count: int
+        :param byte_count: Estimated size of the batch in bytes.
+        :type byte_count: int
+        :param latency: Duration of the write in seconds.
+        :type latency: float
+        :param inserted_count: Number of documents actually written, defaults to
+            doc_count.
+        :type inserted_count: int, optional
+        :param write_errors: Write errors reported by the server, defaults to None.
+        :type write_errors: list, optional
+        """
+
+        write_errors = write_errors if write_errors else []
+        duplicate_count = sum(
+            1 for error in write_errors if error.get("code") == DUPLICATE_KEY_ERROR_CODE
+        )
+
+        with self._lock:
+            metrics = self._get_collection_metrics(collection_name)
+            metrics.batch_count += 1
+            metrics.doc_count += doc_count
+            metrics.inserted_count += (
+                inserted_count if inserted_count is not None else doc_count
+            )
+            metrics.byte_count += byte_count
+            metrics.duplicate_key_error_count += duplicate_count
+            metrics.write_error_count += len(write_errors) - duplicate_count
+            metrics.latency_sum += latency
+            metrics.latency_histogram[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def record_error(self, collection_name: str):
+        """Record a failed bulk write to a collection."""
+
+        with self._lock:
+            self._get_collection_metrics(collection_name).error_count += 1
+
+    def record_timer_error(self, timer_name: str):
+        """Record a failed run of a background timer (e.g. age based flushes)."""
+
+        with self._lock:
+            self._timer_errors[timer_name] = self._timer_errors.get(timer_name, 0) + 1
+
+    def timer_errors(self) -> dict:
+        """Snapshot of the number of failed runs per background timer."""
+
+        with self._lock:
+            return dict(self._timer_errors)
+
+    def to_dict(self) -> dict:
+        """Snapshot of the metrics of all collections."""
+
+        with self._lock:
+            return {
+                collection_name: metrics.to_dict()
+                for collection_name, metrics in self._collections.items()
+            }
+
+
+def export_stats(stats: dict, output_file: str):
+    """Append a timestamped snapshot of database client stats to a jsonl file.
+
+    :param stats: Stats of the database client.
+    :type stats: dict
+    :param output_file: Path to the jsonl file.
+    :type output_file: str
+    """
+
+    record = {"ts": datetime.datetime.utcnow().isoformat(), **stats}
+    with open(output_file, "a") as f:
+        f.write(json.dumps(record) + "\n")
@@ -0,0 +1,84 @@
+class Record:
+    """Compact, immutable-by-convention document, holding its fields in slots rather
+    than in a dict. Records are buffered as is by database clients, and only
+    converted to documents when flushed, off the extraction hot path."""
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for field, value in zip(self.__slots__, values):
+            setattr(self, field, value)
+
+    def to_doc(self) -> dict:
+        """Convert the record into a document, fields in declaration order."""
+
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and self.to_doc() == other.to_doc()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_doc()})"
+
+
+class ReplyRelation(Record):
+    __slots__ = (
+        "in_reply_to_tweet_id",
+        "in_reply_to_user_id",
+        "in_reply_to_screen_name",
+        "tid",
+        "user_id",
+        "user_screen_name",
+        "created_at",
+    )
+
+
+class HashtagRelation(Record):
+    __slots__ = ("user_id", "user_screen_name", "hashtag", "tid", "created_at")
+
+
+class MentionRelation(Record):
+    __slots__ = (
+        "user_id",
+        "user_screen_name",
+        "mentioned_user_id",
+        "mentioned_user_screen_name",
+        "tid",
+        "created_at",
+    )
+
+
+class QuoteRelation(Record):
+    __slots__ = (
+        "user_id",
+        "user_screen_name",
+        "quoted_user_screen_name",
+        "quoted_user_id",
+        "quoted_tweet_id",
+        "tid",
+        "created_at",
+    )
+
+
+class RetweetRelation(Record):
+    __slots__ = (
+        "user_id",
+        "user_screen_name",
+        "retweeted_user_screen_name",
+        "retweeted_user_id",
+        "retweet_id",
+        "tid",
+        "created_at",
+    )
+
+
+def to_docs(docs: list) -> list:
+    """Convert the records of a list of documents, other documents being kept as is.
+
+    :param docs: Documents and records.
+    :type docs: list
+    :return: Documents.
+    :rtype: list
+    """
+
+    return [doc.to_doc() if isinstance(doc, Record) else doc for doc in docs]
@@ -0,0 +1,237 @@
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Callable
+
+import bson
+import pymongo
+from loguru import logger
+
+# errors after which writes are retried later on, rather than dropped
+RECOVERABLE_ERRORS = (
+    pymongo.errors.ConnectionFailure,
+    pymongo.errors.ExecutionTimeout,
+    pymongo.errors.WTimeoutError,
+    OSError,
+)
+
+# payload length, payload crc32, flags, collection name length
+RECORD_HEADER = struct.Struct(">IIBH")
+FLAG_COMPRESSED = 1
+
+SEGMENT_PREFIX = "spill-"
+SEGMENT_SUFFIX = ".log"
+
+
+class SpillLog:
+    """Append-only, on-disk log of batches which could not be written to the
+    database, later replayed in bulk once the database is back.
+
+    Batches are appended as length-prefixed records to segment files, holding the
+    collection name and the concatenated bson documents, optionally compressed with
+    zlib. Segments are deleted once replayed, and segments left over by a previous
+    process are picked up and replayed as well. Records torn by a crash are detected
+    with a checksum and skipped.
+
+    Documents keep the `_id` set by a failed insert, so that batches partially
+    written before a failure are not duplicated upon replay.
+
+    :param directory: Directory of the segment files.
+    :type directory: str
+    :param max_segment_bytes: Size of a segment triggering the start of a new one,
+        defaults to 64MB.
+    :type max_segment_bytes: int, optional
+    :param max_disk_bytes: Maximum size of all segments, batches beyond it are
+        rejected, defaults to 4GB.
+    :type max_disk_bytes: int, optional
+    :param compress: Whether to compress records with zlib, defaults to True.
+    :type compress: bool, optional
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_segment_bytes: int = 64 * 1024 * 1024,
+        max_disk_bytes: int = 4 * 1024 * 1024 * 1024,
+        compress: bool = True,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_segment_bytes = max_segment_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.compress = compress
+
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._file = None
+        self._file_path = None
+        self._file_bytes = 0
+
+        # segments left over by previous processes
+        self._segments = sorted(
+            self.directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"),
+            key=self._get_segment_sequence,
+        )
+        self._sequence = (
+            self._get_segment_sequence(self._segments[-1]) if self._segments else 0
+        )
+        self._disk_bytes = sum(path.stat().st_size for path in self._segments)
+        # offsets of the first records not yet replayed, per segment
+        self._replay_offsets = {}
+
+        self.spilled_doc_count = 0
+        self.replayed_doc_count = 0
+        self.rejected_doc_count = 0
+
+    @staticmethod
+    def _get_segment_sequence(path: Path) -> int:
+        return int(path.name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)])
+
+    def _open_segment(self):
+        self._sequence += 1
+        self._file_path = self.directory.joinpath(
+            f"{SEGMENT_PREFIX}{self._sequence:08d}{SEGMENT_SUFFIX}"
+        )
+        self._file = open(self._file_path, "ab")
+        self._file_bytes = 0
+        self._segments.append(self._file_path)
+
+    def _seal_segment(self):
+        if self._file is None:
+            return
+
+        self._file.close()
+        self._file = None
+        self._file_path = None
+
+    def append(self, collection_name: str, docs: list) -> bool:
+        """Append a batch of documents to the log, and flush it to disk.
+
+        :param collection_name: Collection the documents are written to.
+        :type collection_name: str
+        :param docs: Documents to be written.
+        :type docs: list
+        :return: Whether the batch was logged, False once the disk budget is exhausted.
+        :rtype: bool
+        """
+
+        payload = b"".join(bson.encode(doc) for doc in docs)
+        flags = 0
+        if self.compress:
+            payload = zlib.compress(payload, 1)
+            flags |= FLAG_COMPRESSED
+
+        name = collection_name.encode("utf-8")
+        record = (
+            RECORD_HEADER.pack(len(payload), zlib.crc32(payload), flags, len(name))
+            + name
+            + payload
+        )
+
+        with self._lock:
+            if self._disk_bytes + len(record) > self.max_disk_bytes:
+                self.rejected_doc_count += len(docs)
+                return False
+
+            if self._file is None or self._file_bytes >= self.max_segment_bytes:
+                self._seal_segment()
+                self._open_segment()
+
+            self._file.write(record)
+            self._file.flush()
+            self._file_bytes += len(record)
+            self._disk_bytes += len(record)
+            self.spilled_doc_count += len(docs)
+
+        return True
+
+    @staticmethod
+    def _read_records(path: Path, start: int = 0):
+        """Iterate over the (offset, collection name, documents) records of a segment,
+        starting from a given offset."""
+
+        with open(path, "rb") as f:
+            f.seek(start)
+            while True:
+                offset = f.tell()
+                header = f.read(RECORD_HEADER.size)
+                if not header:
+                    return
+                if len(header) < RECORD_HEADER.size:
+                    logger.warning(f"Skipping torn record at {offset} in {path}.")
+                    return
+
+                length, crc, flags, name_length = RECORD_HEADER.unpack(header)
+                name = f.read(name_length)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    logger.warning(f"Skipping torn record at {offset} in {path}.")
+                    return
+
+                if flags & FLAG_COMPRESSED:
+                    payload = zlib.decompress(payload)
+
+                yield offset, name.decode("utf-8"), bson.decode_all(payload)
+
+    def replay(self, write_fn: Callable) -> bool:
+        """Write logged batches back, oldest first, deleting segments once written.
+        Replay stops upon the first failed write, and resumes from the failed batch
+        next time.
+
+        :param write_fn: Function writing a batch of documents to a collection, called
+            as `write_fn(collection_name, docs)`.
+        :type write_fn: Callable
+        :return: Whether all logged batches were written.
+        :rtype: bool
+        """
+
+        with self._replay_lock:
+            with self._lock:
+                self._seal_segment()
+                segments = list(self._segments)
+
+            for path in segments:
+                start = self._replay_offsets.get(path, 0)
+                for offset, collection_name, docs in self._read_records(path, start):
+                    try:
+                        write_fn(collection_name, docs)
+                    except Exception as e:
+                        logger.warning(f"Stopping replay of spilled batches: {e}.")
+                        self._replay_offsets[path] = offset
+                        return False
+
+                    self.replayed_doc_count += len(docs)
+
+                with self._lock:
+                    self._disk_bytes -= path.stat().st_size
+                    self._segments.remove(path)
+                    os.remove(path)
+                    self._replay_offsets.pop(path, None)
+
+        return True
+
+    def is_empty(self) -> bool:
+        """Whether no batch is waiting to be replayed."""
+
+        with self._lock:
+            return not self._segments
+
+    def stats(self) -> dict:
+        """Get the state of the log."""
+
+        with self._lock:
+            return {
+                "segments": len(self._segments),
+                "disk_bytes": self._disk_bytes,
+                "spilled_docs": self.spilled_doc_count,
+                "replayed_docs": self.replayed_doc_count,
+                "rejected_docs": self.rejected_doc_count,
+            }
+
+    def close(self):
+        """Close the current segment, logged batches remaining on disk."""
+
+        with self._lock:
+            self._seal_segment()
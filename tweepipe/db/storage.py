@@ -0,0 +1,186 @@
+import datetime
+import json
+from pathlib import Path
+
+import pymongo
+
+from tweepipe.db import upsert
+from tweepipe.utils import file_sink
+
+
+class WriteResult:
+    """Outcome of a bulk write to a storage backend.
+
+    :param written_count: Number of documents actually written.
+    :type written_count: int
+    :param write_errors: Errors reported for individual documents, defaults to None.
+    :type write_errors: list, optional
+    """
+
+    def __init__(self, written_count: int, write_errors: list = None):
+        self.written_count = written_count
+        self.write_errors = write_errors if write_errors else []
+
+
+class StorageBackend:
+    """Storage of the bulk data lists flushed by database clients."""
+
+    def write(self, collection_name: str, docs: list) -> WriteResult:
+        """Write a batch of documents to a collection.
+
+        :param collection_name: Name of the collection.
+        :type collection_name: str
+        :param docs: Documents to be written.
+        :type docs: list
+        :return: Outcome of the write.
+        :rtype: WriteResult
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        """Release resources held by the backend."""
+        pass
+
+
+class MongoBackend(StorageBackend):
+    """Write bulk data lists to the collections of a mongo database.
+
+    :param conn: Mongo client.
+    :type conn: pymongo.MongoClient
+    :param db_name: Name of the working database.
+    :type db_name: str
+    :param upsert_collections: Collections written in upsert mode, mapped to the field
+        identifying their documents, defaults to None.
+    :type upsert_collections: dict, optional
+    """
+
+    def __init__(
+        self, conn: pymongo.MongoClient, db_name: str, upsert_collections: dict = None
+    ):
+        self.conn = conn
+        self.db_name = db_name
+        self.upsert_collections = upsert_collections if upsert_collections else {}
+
+    def write(self, collection_name: str, docs: list) -> WriteResult:
+        collection = self.conn[self.db_name][collection_name]
+        try:
+            if collection_name in self.upsert_collections:
+                operations = upsert.get_upsert_operations(
+                    docs, key_field=self.upsert_collections[collection_name]
+                )
+                result = collection.bulk_write(operations, ordered=False)
+                return WriteResult(
+                    result.inserted_count
+                    + result.upserted_count
+                    + result.modified_count
+                )
+
+            result = collection.insert_many(docs, ordered=False)
+            return WriteResult(len(result.inserted_ids))
+        except pymongo.errors.BulkWriteError as e:
+            # duplicates are expected, rejected by unique indexes
+            return WriteResult(
+                e.details.get("nInserted", 0)
+                + e.details.get("nUpserted", 0)
+                + e.details.get("nModified", 0),
+                write_errors=e.details.get("writeErrors", []),
+            )
+
+
+class LocalBackend(StorageBackend):
+    """Write bulk data lists to local files, one directory per collection, e.g. to
+    collect data on offline nodes and bulk load it into mongo later on.
+
+    Documents are written either as rotating, compressed jsonl partitions (mongo
+    extended json, compatible with mongoimport), or as one parquet partition per
+    flushed batch. Parquet requires pandas and pyarrow, nested fields are stored as
+    json strings.
+
+    :param output_dir: Root directory of the files.
+    :type output_dir: str
+    :param db_name: Name of the working database, used as sub directory.
+    :type db_name: str
+    :param file_format: Either "jsonl" or "parquet", defaults to "jsonl".
+    :type file_format: str, optional
+    :param compression: Compression of jsonl partitions, defaults to "gzip".
+    :type compression: str, optional
+    :param max_file_bytes: Size of jsonl partitions triggering rotation, defaults to
+        256MB.
+    :type max_file_bytes: int, optional
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        db_name: str,
+        file_format: str = "jsonl",
+        compression: str = "gzip",
+        max_file_bytes: int = 256 * 1024 * 1024,
+    ):
+        if file_format not in ("jsonl", "parquet"):
+            raise ValueError(
+                "Local storage format must be either 'jsonl' or 'parquet'."
+            )
+        if file_format == "parquet":
+            # fail early rather than upon the first flush
+            import pandas
+            import pyarrow
+
+        self.directory = Path(output_dir).joinpath(db_name)
+        self.file_format = file_format
+        self.compression = compression
+        self.max_file_bytes = max_file_bytes
+
+        self._sinks = {}
+        self._parquet_sequence = 0
+
+    def _get_sink(self, collection_name: str) -> file_sink.FileSink:
+        if collection_name not in self._sinks:
+            self._sinks[collection_name] = file_sink.FileSink(
+                directory=self.directory.joinpath(collection_name),
+                prefix=collection_name,
+                compression=self.compression,
+                max_file_bytes=self.max_file_bytes,
+            )
+
+        return self._sinks[collection_name]
+
+    def _write_parquet(self, collection_name: str, docs: list):
+        import pandas
+
+        # nested documents (e.g. raw tweets) do not map onto parquet columns
+        rows = [
+            {
+                k: (
+                    json.dumps(v, default=file_sink._to_extended_json)
+                    if isinstance(v, (dict, list))
+                    else v
+                )
+                for k, v in doc.items()
+                if k != "_id"
+            }
+            for doc in docs
+        ]
+
+        directory = self.directory.joinpath(collection_name)
+        directory.mkdir(parents=True, exist_ok=True)
+        self._parquet_sequence += 1
+        timestamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        pandas.DataFrame(rows).to_parquet(
+            directory.joinpath(
+                f"{collection_name}-{timestamp}-{self._parquet_sequence:05d}.parquet"
+            ),
+            index=False,
+        )
+
+    def write(self, collection_name: str, docs: list) -> WriteResult:
+        if self.file_format == "parquet":
+            self._write_parquet(collection_name, docs)
+        else:
+            self._get_sink(collection_name).write_many(docs)
+
+        return WriteResult(len(docs))
+
+    def close(self):
+        for sink in self._sinks.values():
+            sink.close()
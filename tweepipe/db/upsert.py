@@ -0,0 +1,84 @@
+import pymongo
+
+# fields identifying the documents of collections written in upsert mode
+UPSERT_KEY_FIELDS = {"users": "uid"}
+
+# creation date of the tweet the document (e.g. a user profile) was extracted from
+FRESHNESS_FIELD = "seen_at"
+
+
+def merge_latest(
+    docs: list, key_field: str, freshness_field: str = FRESHNESS_FIELD
+) -> list:
+    """Merge buffered documents sharing the same key, keeping the freshest one.
+    Documents without freshness information are considered fresher than previous
+    ones, documents without a key are all kept.
+
+    :param docs: Buffered documents.
+    :type docs: list
+    :param key_field: Field identifying documents.
+    :type key_field: str
+    :param freshness_field: Field ordering documents, defaults to FRESHNESS_FIELD.
+    :type freshness_field: str, optional
+    :return: Single freshest document per key.
+    :rtype: list
+    """
+
+    latest_docs, unkeyed_docs = {}, []
+    for doc in docs:
+        key = doc.get(key_field)
+        if key is None:
+            unkeyed_docs.append(doc)
+            continue
+
+        previous_doc = latest_docs.get(key)
+        if (
+            previous_doc is None
+            or doc.get(freshness_field) is None
+            or previous_doc.get(freshness_field) is None
+            or doc[freshness_field] >= previous_doc[freshness_field]
+        ):
+            latest_docs[key] = doc
+
+    return list(latest_docs.values()) + unkeyed_docs
+
+
+def get_upsert_operations(
+    docs: list, key_field: str, freshness_field: str = FRESHNESS_FIELD
+) -> list:
+    """Build bulk operations replacing stored documents by fresher buffered ones.
+
+    A stored document fresher than the buffered one is left untouched: the filter
+    does not match it, and the upsert is rejected by the unique index on the key.
+
+    :param docs: Buffered documents.
+    :type docs: list
+    :param key_field: Field identifying documents.
+    :type key_field: str
+    :param freshness_field: Field ordering documents, defaults to FRESHNESS_FIELD.
+    :type freshness_field: str, optional
+    :return: Operations to be bulk written.
+    :rtype: list
+    """
+
+    operations = []
+    for doc in merge_latest(docs, key_field, freshness_field=freshness_field):
+        # _id is immutable, set by previous insert attempts of the document
+        replacement = {k: v for k, v in doc.items() if k != "_id"}
+        key = replacement.get(key_field)
+        if key is None:
+            operations.append(pymongo.operations.InsertOne(replacement))
+            continue
+
+        doc_filter = {key_field: key}
+        freshness = replacement.get(freshness_field)
+        if freshness is not None:
+            doc_filter["$or"] = [
+                {freshness_field: {"$lte": freshness}},
+                {freshness_field: {"$exists": False}},
+            ]
+        operations.append(
+            pymongo.operations.ReplaceOne(doc_filter, replacement, upsert=True)
+        )
+
+    return operations
@@ -1,5 +1,6 @@
 import typing
-import json
+
+from tweepipe.utils import fastjson
 
 
 class MongoExportIterator:
@@ -55,7 +56,7 @@ class MongoExportIterator:
         self.tmp = self.start_of_doc_marker
 
         if not self.done:
-            return json.loads(output)
+            return fastjson.loads(output)
         else:
             raise StopIteration()
 
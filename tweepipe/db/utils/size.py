@@ -0,0 +1,79 @@
+import bson
+
+from tweepipe.db import records
+
+
+def estimate_bson_size(doc: dict) -> int:
+    """Get the size of a document once encoded to BSON.
+
+    :param doc: Document to be measured.
+    :type doc: dict
+    :return: Size of the document in bytes.
+    :rtype: int
+    """
+
+    if isinstance(doc, records.Record):
+        doc = doc.to_doc()
+
+    try:
+        return len(bson.encode(doc))
+    except (bson.errors.InvalidDocument, TypeError):
+        # fallback on the size of the document representation
+        return len(repr(doc))
+
+
+class SizeEstimator:
+    """Estimate the BSON size of documents added to a collection buffer. Encoding
+    every document twice (once to measure it, once to send it) is wasteful, so only
+    one document every `sample_every` is encoded, others being assigned the running
+    average size of the collection.
+
+    :param sample_every: Sampling period of measured documents, defaults to 16.
+    :type sample_every: int, optional
+    """
+
+    def __init__(self, sample_every: int = 16):
+        self.sample_every = max(1, sample_every)
+        self._counts = {}
+        self._sampled_counts = {}
+        self._sampled_bytes = {}
+
+    def estimate(self, collection_name: str, doc: dict) -> int:
+        """Estimate the size of a single document of a collection.
+
+        :param collection_name: Collection the document belongs to.
+        :type collection_name: str
+        :param doc: Document to be measured.
+        :type doc: dict
+        :return: Estimated size of the document in bytes.
+        :rtype: int
+        """
+
+        count = self._counts.get(collection_name, 0)
+        self._counts[collection_name] = count + 1
+
+        if count % self.sample_every == 0:
+            size = estimate_bson_size(doc)
+            self._sampled_counts[collection_name] = (
+                self._sampled_counts.get(collection_name, 0) + 1
+            )
+            self._sampled_bytes[collection_name] = (
+                self._sampled_bytes.get(collection_name, 0) + size
+            )
+            return size
+
+        return self.get_average_size(collection_name)
+
+    def estimate_many(self, collection_name: str, docs: list) -> int:
+        """Estimate the total size of a list of documents of a collection."""
+
+        return sum(self.estimate(collection_name, doc) for doc in docs)
+
+    def get_average_size(self, collection_name: str) -> int:
+        """Average size of the sampled documents of a collection."""
+
+        sampled_count = self._sampled_counts.get(collection_name, 0)
+        if sampled_count == 0:
+            return 0
+
+        return self._sampled_bytes[collection_name] // sampled_count
@@ -0,0 +1,227 @@
+import queue
+import threading
+import time
+from typing import Callable
+
+from loguru import logger
+
+
+class BatchWriteError(Exception):
+    """Batches failed to be written by the background writers.
+
+    :param failed_batches: Failed batches, as (collection name, documents, error)
+        tuples.
+    :type failed_batches: list
+    """
+
+    def __init__(self, failed_batches: list):
+        self.failed_batches = failed_batches
+        doc_count = sum(len(docs) for _, docs, _ in failed_batches)
+        super().__init__(
+            f"Failed to write {len(failed_batches)} batches ({doc_count} documents), last error: {failed_batches[-1][2]}."
+        )
+
+
+class BackgroundWriter:
+    """Push bulk buffers to the database from dedicated writer threads, so that
+    producers (stream listeners, hydration loops, academic searches) keep parsing
+    while previous batches are being written.
+
+    Backpressure is applied to producers once either `max_pending_batches` batches
+    are waiting to be written, or the batches in flight add up to more than
+    `max_inflight_bytes`. A single batch larger than the byte budget is still let
+    through when nothing else is in flight.
+
+    :param write_fn: Function writing a batch of documents to a collection, called as
+        `write_fn(collection_name, docs, size)`.
+    :type write_fn: Callable
+    :param writer_count: Number of writer threads, defaults to 1.
+    :type writer_count: int, optional
+    :param max_pending_batches: Maximum number of batches waiting to be written,
+        defaults to 16.
+    :type max_pending_batches: int, optional
+    :param max_inflight_bytes: Maximum estimated size of the batches handed to the
+        writers and not yet written, defaults to 256MB.
+    :type max_inflight_bytes: int, optional
+    :param on_error: Function called with (collection_name, docs, error) upon a failed
+        write, returning whether the batch was handled (e.g. spilled), defaults to
+        None.
+    :type on_error: Callable, optional
+    """
+
+    def __init__(
+        self,
+        write_fn: Callable,
+        writer_count: int = 1,
+        max_pending_batches: int = 16,
+        max_inflight_bytes: int = 256 * 1024 * 1024,
+        on_error: Callable = None,
+    ):
+        self.write_fn = write_fn
+        self.max_inflight_bytes = max_inflight_bytes
+        self.on_error = on_error
+
+        self._queue = queue.Queue(maxsize=max_pending_batches)
+        self._inflight_bytes = 0
+        self._inflight_condition = threading.Condition()
+
+        self.written_batch_count = 0
+        self.failed_batch_count = 0
+        self.backpressure_seconds = 0.0
+
+        # failed batches not handled by on_error, raised from join and close
+        self._failed_batches = []
+        self._failed_lock = threading.Lock()
+
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._run, name=f"tweepipe-writer-{i}", daemon=True)
+            for i in range(max(1, writer_count))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+
+            collection_name, docs, size = item
+            try:
+                self.write_fn(collection_name, docs, size)
+                self.written_batch_count += 1
+            except Exception as e:
+                self.failed_batch_count += 1
+                logger.error(
+                    f"Error while writing {len(docs)} documents to {collection_name}: {e}."
+                )
+                self._handle_error(collection_name, docs, e)
+            finally:
+                with self._inflight_condition:
+                    self._inflight_bytes -= size
+                    self._inflight_condition.notify_all()
+                self._queue.task_done()
+
+    def _handle_error(self, collection_name: str, docs: list, error: Exception):
+        try:
+            if self.on_error and self.on_error(collection_name, docs, error):
+                return
+        except Exception as e:
+            logger.error(
+                f"Error while handling a failed batch of {collection_name}: {e}."
+            )
+
+        with self._failed_lock:
+            self._failed_batches.append((collection_name, docs, error))
+
+    def _raise_failed_batches(self):
+        with self._failed_lock:
+            failed_batches = self._failed_batches
+            self._failed_batches = []
+
+        if failed_batches:
+            raise BatchWriteError(failed_batches)
+
+    def submit(self, collection_name: str, docs: list, size: int = 0):
+        """Hand a batch of documents over to the writer threads. Blocks while the
+        writers are saturated.
+
+        :param collection_name: Collection to write the documents to.
+        :type collection_name: str
+        :param docs: Documents to be written, no longer modified by the caller.
+        :type docs: list
+        :param size: Estimated size of the batch in bytes, defaults to 0.
+        :type size: int, optional
+        """
+
+        if self._closed:
+            raise RuntimeError("Cannot submit batches to a closed writer.")
+
+        start = time.perf_counter()
+        with self._inflight_condition:
+            while (
+                self._inflight_bytes > 0
+                and self._inflight_bytes + size > self.max_inflight_bytes
+            ):
+                self._inflight_condition.wait()
+            self._inflight_bytes += size
+
+        self._queue.put((collection_name, docs, size))
+        self.backpressure_seconds += time.perf_counter() - start
+
+    def try_submit(self, collection_name: str, docs: list, size: int = 0) -> bool:
+        """Hand a batch of documents over to the writer threads, unless the writers
+        are saturated.
+
+        :param collection_name: Collection to write the documents to.
+        :type collection_name: str
+        :param docs: Documents to be written, no longer modified by the caller.
+        :type docs: list
+        :param size: Estimated size of the batch in bytes, defaults to 0.
+        :type size: int, optional
+        :return: Whether the batch was accepted.
+        :rtype: bool
+        """
+
+        if self._closed:
+            raise RuntimeError("Cannot submit batches to a closed writer.")
+
+        with self._inflight_condition:
+            if (
+                self._inflight_bytes > 0
+                and self._inflight_bytes + size > self.max_inflight_bytes
+            ):
+                return False
+
+            try:
+                self._queue.put_nowait((collection_name, docs, size))
+            except queue.Full:
+                return False
+            self._inflight_bytes += size
+
+        return True
+
+    def join(self):
+        """Wait until all submitted batches have been written.
+
+        :raises BatchWriteError: If batches failed since the last join.
+        """
+
+        self._queue.join()
+        self._raise_failed_batches()
+
+    def close(self, raise_errors: bool = True):
+        """Write all pending batches, then stop the writer threads.
+
+        :param raise_errors: Whether to raise failed batches, defaults to True.
+        :type raise_errors: bool, optional
+        :raises BatchWriteError: If batches failed since the last join.
+        """
+
+        if self._closed:
+            return
+
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        if raise_errors:
+            self._raise_failed_batches()
+
+    @property
+    def closed(self) -> bool:
+        """Whether the writer threads were stopped."""
+        return self._closed
+
+    @property
+    def inflight_bytes(self) -> int:
+        """Estimated size of the batches submitted and not yet written."""
+        return self._inflight_bytes
+
+    @property
+    def pending_batch_count(self) -> int:
+        """Number of batches waiting for a writer."""
+        return self._queue.qsize()
@@ -1,4 +1,9 @@
+import collections
 import datetime
+import functools
+import threading
+import time
+from typing import Callable
 
 import pymongo
 from tweepipe.legacy.utils import extract
@@ -6,8 +11,396 @@ import tweepy
 from loguru import logger
 
 from tweepipe import settings
-from tweepipe.db import db_client, db_schema
-from tweepipe.utils import snowflake
+from tweepipe.db import chunk_queue, db_client, db_schema, lease
+from tweepipe.utils import pipeline, snowflake, tid_queue
+
+# maximum number of tweet ids per statuses lookup
+LOOKUP_BATCH_SIZE = 100
+
+# seconds between two checks of the lease of the block being hydrated
+LEASE_CHECK_INTERVAL = 30
+
+# maximum number of seconds between two restarts of a failing hydration
+MAX_RETRY_DELAY = 900
+
+# minimum number of tid range chunks planned per worker, for workers getting idle
+# to pull work from slower ones
+CHUNKS_PER_WORKER = 8
+
+# claimed blocks in flight per worker, the next blocks being looked up while the
+# previous ones are written
+MAX_PENDING_BLOCKS = 2
+
+
+class HydrationError(Exception):
+    """Tweet ids failed to be looked up or written by a hydration run.
+
+    :param failed_tids: Tweet ids which failed to be hydrated.
+    :type failed_tids: list
+    :param counts: (hydrated, missing, processed) counts of the run.
+    :type counts: tuple
+    """
+
+    def __init__(self, failed_tids: list, counts: tuple):
+        self.failed_tids = failed_tids
+        self.counts = counts
+        super().__init__(
+            f"Failed to hydrate {len(failed_tids)} tweet ids, {counts[2]} processed."
+        )
+
+
+class _BatchGroup:
+    """Lookup batches of the ids added at once to a HydrationEngine, reported
+    together once all of them are written, or failed."""
+
+    def __init__(self, batch_count: int, on_done: Callable):
+        self.remaining = batch_count
+        self.failed = False
+        self.statuses = []
+        self.on_done = on_done
+        self._lock = threading.Lock()
+
+    def add_statuses(self, statuses: list):
+        with self._lock:
+            self.statuses.extend(statuses)
+
+    def batch_done(self, failed: bool = False):
+        with self._lock:
+            self.failed = self.failed or failed
+            self.remaining -= 1
+            if self.remaining:
+                return
+
+        self.on_done(self.statuses, self.failed)
+
+
+class HydrationEngine:
+    """Pipelined hydration of tweet ids, overlapping lookups with extraction and
+    writes rather than waiting for each lookup to be processed:
+
+    - lookup: `concurrency` lookups in flight at once on the same API access, rate
+      limits being waited for by tweepy,
+    - extract: extract tweet docs, relations and user profiles of hydrated tweets,
+    - write: add extracted content and missing tweets to the database buffers, then
+      report the status of each tweet id.
+
+    Stages are connected by bounded queues, ids added by the reader being prefetched
+    up to the queue sizes, and the reader waiting for lookups to catch up beyond.
+    Stage metrics show where the time goes.
+
+    :param twitter_api: API access used for lookups.
+    :type twitter_api: tweepy.API
+    :param db_conn: Database client of the hydrated tweets.
+    :type db_conn: db_client.DBClient
+    :param include_users: Whether to extract user profiles, defaults to True.
+    :type include_users: bool, optional
+    :param include_relations: Whether to extract relations, defaults to True.
+    :type include_relations: bool, optional
+    :param concurrency: Number of lookups in flight, defaults to 4.
+    :type concurrency: int, optional
+    :param extract_worker_count: Number of extraction threads, defaults to 2.
+    :type extract_worker_count: int, optional
+    :param max_queue_size: Maximum number of lookup batches waiting in each stage,
+        defaults to 64.
+    :type max_queue_size: int, optional
+    :param on_status: Function called from the write stage with (work id, status)
+        tuples, 2 for hydrated and -1 for missing tweets, defaults to None.
+    :type on_status: Callable, optional
+    :param store_missing: Whether to add missing tweet ids to the `missing_tids`
+        collection, defaults to True.
+    :type store_missing: bool, optional
+    """
+
+    def __init__(
+        self,
+        twitter_api: tweepy.API,
+        db_conn: db_client.DBClient,
+        include_users: bool = True,
+        include_relations: bool = True,
+        concurrency: int = 4,
+        extract_worker_count: int = 2,
+        max_queue_size: int = 64,
+        on_status: Callable = None,
+        store_missing: bool = True,
+    ):
+        self.twitter_api = twitter_api
+        self.db_conn = db_conn
+        self.include_users = include_users
+        self.include_relations = include_relations
+        self.on_status = on_status
+        self.store_missing = store_missing
+
+        # only updated by the single write thread
+        self.hydrated_count = 0
+        self.missing_count = 0
+        self.processed_count = 0
+
+        # lookup batches added but not yet written (or failed)
+        self._pending_count = 0
+        self._pending_condition = threading.Condition()
+
+        self.pipeline = pipeline.Pipeline(
+            [
+                pipeline.Stage(
+                    "lookup",
+                    self.lookup,
+                    worker_count=concurrency,
+                    max_queue_size=max_queue_size,
+                ),
+                pipeline.Stage(
+                    "extract",
+                    self.extract,
+                    worker_count=extract_worker_count,
+                    max_queue_size=max_queue_size,
+                ),
+                pipeline.Stage("write", self.write, max_queue_size=max_queue_size),
+            ]
+        )
+
+    def put(self, tids: list, work_ids: dict = None, on_done: Callable = None):
+        """Add tweet ids to be hydrated, split into lookup batches.
+
+        :param tids: Tweet ids.
+        :type tids: list
+        :param work_ids: Work document ids (e.g. in `hydrating_tids`) of the tweet ids,
+            reported along with their status, defaults to None.
+        :type work_ids: dict, optional
+        :param on_done: Function called once all of the ids are written or failed,
+            with the (work id, status) tuples of the written ids and whether any
+            lookup batch failed, defaults to None.
+        :type on_done: Callable, optional
+        """
+
+        batches = [
+            tids[i : i + LOOKUP_BATCH_SIZE]
+            for i in range(0, len(tids), LOOKUP_BATCH_SIZE)
+        ]
+        group = None
+        if on_done:
+            if not batches:
+                on_done([], False)
+                return
+            group = _BatchGroup(len(batches), on_done)
+
+        for batch in batches:
+            with self._pending_condition:
+                self._pending_count += 1
+            self.pipeline.put((batch, work_ids, group))
+
+    def _batch_done(self, group: _BatchGroup = None, failed: bool = False):
+        try:
+            if group:
+                group.batch_done(failed=failed)
+        finally:
+            with self._pending_condition:
+                self._pending_count -= 1
+                if self._pending_count == 0:
+                    self._pending_condition.notify_all()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait until all ids added so far are hydrated and written, or failed.
+
+        :param timeout: Maximum number of seconds to wait, defaults to None.
+        :type timeout: float, optional
+        :return: Whether all ids were processed.
+        :rtype: bool
+        """
+
+        with self._pending_condition:
+            return self._pending_condition.wait_for(
+                lambda: self._pending_count == 0, timeout=timeout
+            )
+
+    def lookup(self, batch: tuple) -> tuple:
+        tids, work_ids, group = batch
+        try:
+            lookedup_tweets = self.twitter_api.statuses_lookup(
+                tids, tweet_mode="extended", map_=True
+            )
+        except Exception:
+            # ids of failed lookups are left to lease expiry
+            self._batch_done(group, failed=True)
+            raise
+
+        return [tweet._json for tweet in lookedup_tweets], work_ids, group
+
+    def extract(self, item: tuple) -> tuple:
+        try:
+            return self._extract(item)
+        except Exception:
+            self._batch_done(item[-1], failed=True)
+            raise
+
+    def _extract(self, item: tuple) -> tuple:
+        tweets, work_ids, group = item
+
+        # missing tweets, potentially from suspended accounts, only hold their id
+        missing_tweets = [tweet for tweet in tweets if len(tweet) == 1]
+        contents = [
+            extract.extract_content_from_tweet(
+                tweet,
+                include_users=self.include_users,
+                include_relations=self.include_relations,
+            )
+            for tweet in tweets
+            if len(tweet) != 1
+        ]
+
+        return contents, missing_tweets, work_ids, group
+
+    def write(self, item: tuple):
+        failed = True
+        try:
+            self._write(item)
+            failed = False
+        finally:
+            self._batch_done(item[-1], failed=failed)
+
+    def _write(self, item: tuple):
+        contents, missing_tweets, work_ids, group = item
+        for tweet_doc, relations, users in contents:
+            extract.add_content_from_tweet(
+                tweet_doc,
+                relations,
+                users,
+                db_conn=self.db_conn,
+                include_users=self.include_users,
+                include_relations=self.include_relations,
+            )
+        if self.store_missing:
+            self.db_conn.add_missing_tids(missing_tweets)
+
+        self.hydrated_count += len(contents)
+        self.missing_count += len(missing_tweets)
+        self.processed_count += len(contents) + len(missing_tweets)
+
+        if work_ids and (self.on_status or group):
+            statuses = [
+                (work_ids[tweet_doc["tid"]], 2) for tweet_doc, _, _ in contents
+            ] + [(work_ids[str(tweet["id"])], -1) for tweet in missing_tweets]
+            if self.on_status:
+                self.on_status(statuses)
+            if group:
+                group.add_statuses(statuses)
+
+    def close(self):
+        """Hydrate all ids added so far, then stop the stages."""
+
+        self.pipeline.close()
+        logger.info(f"Hydration stage metrics: {self.stats()}.")
+
+    def stats(self) -> dict:
+        """Get throughput, lag and busy time metrics of each stage."""
+
+        return self.pipeline.stats()
+
+
+class _BlockWindow:
+    """Claimed blocks of tweet ids in flight in a HydrationEngine, up to `max_blocks`
+    of them, so that the next block is claimed and looked up while the previous ones
+    are written. The statuses of each block are committed as soon as all of its ids
+    are written, from the write stage. Once a block failed, no other block gets
+    committed, the uncommitted blocks being hydrated again by the restarted run.
+
+    :param engine: Engine hydrating the blocks.
+    :type engine: HydrationEngine
+    :param commit_fn: Function committing a block, called with the block and the
+        (work id, status) tuples of its ids.
+    :type commit_fn: Callable
+    :param renew_fn: Function renewing the leases of blocks in flight, called with
+        the uncommitted blocks while waiting for blocks to be written.
+    :type renew_fn: Callable
+    :param max_blocks: Maximum number of blocks in flight, defaults to
+        MAX_PENDING_BLOCKS.
+    :type max_blocks: int, optional
+    """
+
+    def __init__(
+        self,
+        engine: HydrationEngine,
+        commit_fn: Callable,
+        renew_fn: Callable,
+        max_blocks: int = MAX_PENDING_BLOCKS,
+    ):
+        self.engine = engine
+        self.commit_fn = commit_fn
+        self.renew_fn = renew_fn
+        self.max_blocks = max(1, max_blocks)
+
+        # uncommitted blocks, in claim order
+        self.blocks = []
+        self._in_flight_count = 0
+        self._error = None
+        self._condition = threading.Condition()
+
+    def put(self, block, tids: list, work_ids: dict):
+        """Hydrate the ids of a block, then wait until fewer than `max_blocks` blocks
+        are in flight.
+
+        :param block: Claimed block.
+        :param tids: Tweet ids of the block.
+        :type tids: list
+        :param work_ids: Work ids of the tweet ids, reported with their status.
+        :type work_ids: dict
+        """
+
+        with self._condition:
+            self.blocks.append(block)
+            self._in_flight_count += 1
+
+        self.engine.put(
+            tids,
+            work_ids=work_ids,
+            on_done=functools.partial(self._block_done, block, len(tids)),
+        )
+        self.wait(max_blocks=self.max_blocks - 1)
+
+    def _block_done(self, block, tid_count: int, statuses: list, failed: bool):
+        committed = False
+        try:
+            if self._error is None:
+                if failed or len(statuses) < tid_count:
+                    # tids of failed lookups are handed back, to be retried by the
+                    # restarted run from the last checkpoint
+                    raise RuntimeError(
+                        f"Failed to hydrate {tid_count - len(statuses)} of {tid_count} claimed tweets."
+                    )
+
+                self.commit_fn(block, statuses)
+                committed = True
+        except Exception as e:
+            with self._condition:
+                self._error = self._error if self._error else e
+        finally:
+            with self._condition:
+                if committed:
+                    self.blocks.remove(block)
+                self._in_flight_count -= 1
+                self._condition.notify_all()
+
+    def wait(self, max_blocks: int = 0):
+        """Wait until at most `max_blocks` blocks are in flight, renewing leases in
+        the meantime as rate limits may stall lookups longer than the leases.
+
+        :param max_blocks: Number of blocks left in flight, defaults to 0.
+        :type max_blocks: int, optional
+        :raises RuntimeError: If a block failed to be hydrated, or the error raised
+            while committing a block.
+        """
+
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._error or self._in_flight_count <= max_blocks,
+                    timeout=LEASE_CHECK_INTERVAL,
+                )
+                if self._error:
+                    raise self._error
+                if self._in_flight_count <= max_blocks:
+                    return
+                blocks = list(self.blocks)
+
+            self.renew_fn(blocks)
 
 
 def _run_hydration(
@@ -17,51 +410,55 @@ def _run_hydration(
     env_file: str = None,
     include_users: bool = True,
     include_relations: bool = True,
+    concurrency: int = 4,
 ):
-    """Execute hydration process."""
+    """Execute hydration process.
+
+    :raises HydrationError: If some of the tweet ids failed to be looked up or
+        written, once all other ids are hydrated.
+    """
 
     if env_file:
         settings.load_config(env_file=env_file)
 
+    # missing tids are only part of the hydration schema
     db_conn = db_client.DBClient(
-        issue=issue, include_relations=include_relations, include_users=include_users
+        issue=issue,
+        include_relations=include_relations,
+        include_users=include_users,
+        schema=db_schema.INDEX_V3,
     )
 
-    hydrated_count = 0
-    processed_count = 0
-    missing_count = 0
-    lookup_batch_size = 100
-    for i in range(0, len(tweet_ids), lookup_batch_size):
-        all_lookedup_tweets = twitter_api.statuses_lookup(
-            tweet_ids[i : i + lookup_batch_size], tweet_mode="extended", map_=True
-        )
-
-        missing_tids = [
-            tweet._json for tweet in all_lookedup_tweets if len(tweet._json) == 1
-        ]
-        lookedup_tweets = [
-            tweet for tweet in all_lookedup_tweets if len(tweet._json) != 1
-        ]
-
-        for lookedup_tweet in lookedup_tweets:
-            processed_tweet = extract.retrieve_content_from_tweet(
-                lookedup_tweet._json,
-                include_users=include_users,
-                include_relations=include_relations,
-                db_conn=db_conn,
-            )
-
-        # store all missing tweets, potentially from suspended accounts
-        db_conn.add_missing_tids(missing_tids)
-
-        missing_count += len(missing_tids)
-        hydrated_count += len(lookedup_tweets)
-        processed_count += len(all_lookedup_tweets)
-
-    if db_conn:
+    engine = HydrationEngine(
+        twitter_api,
+        db_conn,
+        include_users=include_users,
+        include_relations=include_relations,
+        concurrency=concurrency,
+    )
+    failed_tids = []
+    failed_lock = threading.Lock()
+
+    def batch_done(tids: list, statuses: list, failed: bool):
+        if failed:
+            with failed_lock:
+                failed_tids.extend(tids)
+
+    try:
+        # one group per lookup batch, for failures to be tracked per batch
+        for i in range(0, len(tweet_ids), LOOKUP_BATCH_SIZE):
+            batch = tweet_ids[i : i + LOOKUP_BATCH_SIZE]
+            engine.put(batch, on_done=functools.partial(batch_done, batch))
+    finally:
+        engine.close()
         db_conn.flush_content()
 
-    return (hydrated_count, missing_count, processed_count)
+    counts = (engine.hydrated_count, engine.missing_count, engine.processed_count)
+    if failed_tids:
+        logger.error(f"Failed to hydrate {len(failed_tids)} tweet ids.")
+        raise HydrationError(failed_tids, counts)
+
+    return counts
 
 
 def handle_db_hydration(
@@ -76,11 +473,18 @@ def handle_db_hydration(
     start_date: datetime.datetime = None,
     end_date: datetime.datetime = None,
     key: int = None,
+    chunk_collection: str = None,
+    max_retries: int = 10,
 ):
-    # hydrate all tweets from database, if error arises log it
+    """Run hydration from database until no tid is left to be claimed, restarting it
+    upon errors. Restarts resume from the statuses and chunk checkpoints committed so
+    far, tids held by the failed run being released to be hydrated again. Errors are
+    raised after `max_retries` restarts."""
+
+    retry_count = 0
     while True:
         try:
-            _run_hydration_from_db(
+            return _run_hydration_from_db(
                 twitter_api=twitter_api,
                 issue=issue,
                 env_file=env_file,
@@ -92,9 +496,18 @@ def handle_db_hydration(
                 start_date=start_date,
                 end_date=end_date,
                 key=key,
+                chunk_collection=chunk_collection,
             )
         except Exception as e:
-            logger.error(f"Error arising from hydrating {e}.")
+            retry_count += 1
+            if retry_count > max_retries:
+                raise
+
+            delay = min(MAX_RETRY_DELAY, 2**retry_count)
+            logger.error(
+                f"Error arising from hydrating {e}, restarting in {delay} seconds ({retry_count}/{max_retries})."
+            )
+            time.sleep(delay)
 
 
 def _run_hydration_from_db(
@@ -109,8 +522,26 @@ def _run_hydration_from_db(
     start_date: datetime.datetime = None,
     end_date: datetime.datetime = None,
     key: int = None,
+    lease_seconds: int = 900,
+    async_flush: bool = False,
+    concurrency: int = 4,
+    chunk_collection: str = None,
+    max_pending_blocks: int = MAX_PENDING_BLOCKS,
 ):
-    """Run hydration by taking tweets from database and hydrating them"""
+    """Run hydration by taking tweets from database and hydrating them. Tweet ids
+    are claimed in blocks of `batch_size` under a lease expiring after `lease_seconds`,
+    so that ids held by crashed workers get hydrated by others. Claimed blocks are
+    hydrated by a HydrationEngine with `concurrency` lookups in flight, up to
+    `max_pending_blocks` blocks being in flight so that the next block is looked up
+    while the previous one is written.
+
+    With a `chunk_collection` planned by a chunk_queue.TidRangeQueue, tid range
+    chunks are pulled from the queue one at a time, blocks being claimed within the
+    current chunk, until no chunk is left.
+
+    Statuses of a block are committed once its content is flushed, and chunks are
+    checkpointed past the blocks committed in claim order, so that a restarted run
+    neither loses nor redoes the hydration of committed tids."""
 
     if env_file:
         settings.load_config(env_file=env_file)
@@ -126,108 +557,257 @@ def _run_hydration_from_db(
         include_relations=include_relations,
         include_users=include_users,
         schema=db_schema.INDEX_V3,
+        async_flush=async_flush,
     )
     hydrating_tids_collection = db_conn._get_collection(collection, db_name=issue)
 
-    filter = {"status": 0}
-    if start_date and end_date:
-        start_tid = snowflake.get_tweet_id_from_time(start_date)
-        end_tid = snowflake.get_tweet_id_from_time(end_date)
-        tid_range_query = {"tid_int": {"$gte": start_tid, "$lt": end_tid}}
-        filter.update(tid_range_query)
-    if key:
-        filter.update({"key": key})
-
-    projection = {"tid": True, "_id": True}
+    # waiting (or expired) statuses are matched by the claimers
+    filter = _get_hydrating_filter(start_date=start_date, end_date=end_date, key=key)
     logger.info(f"Filtering tweets with the key {key} - full filter : {filter}.")
-    cursor = hydrating_tids_collection.find(
-        filter=filter, projection=projection, batch_size=batch_size, allow_disk_use=True
+
+    queue = None
+    if chunk_collection:
+        queue = chunk_queue.TidRangeQueue(
+            hydrating_tids_collection,
+            chunk_collection=chunk_collection,
+            lease_seconds=lease_seconds,
+        )
+
+    engine = HydrationEngine(
+        twitter_api,
+        db_conn,
+        include_users=include_users,
+        include_relations=include_relations,
+        concurrency=concurrency,
     )
 
-    success_batch, missing_batch, lookup_batch = [], [], []
-    for doc in cursor:
-        hydrating_tids_collection.update_one(
-            {"_id": doc["_id"]}, {"$set": {"status": 1}}
+    claimers = []
+
+    def hydrate_claimed(chunk: dict = None):
+        claimer = lease.LeaseClaimer(
+            hydrating_tids_collection,
+            base_filter=_merge_filters(
+                filter, queue.get_filter(chunk) if chunk else {}
+            ),
+            block_size=batch_size,
+            lease_seconds=lease_seconds,
+            projection={"_id": True, "tid": True, "tid_int": True},
+            # blocks of consecutive tids, for the checkpoint to move forward
+            sort=[("tid_int", pymongo.ASCENDING)] if chunk else None,
+        )
+        claimers.append(claimer)
+
+        # blocks of the chunk not yet checkpointed, in claim order
+        chunk_blocks = collections.deque()
+
+        def commit_block(block: dict, block_statuses: list):
+            # statuses are only committed once the content of their tids is written
+            # (waiting for background writers), a crash in between redoing
+            # (idempotent) writes rather than losing tweets
+            db_conn.flush_content(wait=True)
+
+            # update status of processed tids to 'error' or 'done'
+            _push_status_updates(
+                hydrating_tids_collection,
+                [
+                    lease.LeaseClaimer.get_status_update(_id, status)
+                    for _id, status in block_statuses
+                ],
+            )
+            claimer.complete(block["lease_id"])
+
+            if chunk:
+                # the checkpoint only moves past blocks committed in claim order
+                block["committed"] = True
+                last_tid = None
+                while chunk_blocks and chunk_blocks[0]["committed"]:
+                    last_tid = chunk_blocks.popleft()["last_tid"]
+
+                hydrated_count = sum(1 for _, status in block_statuses if status == 2)
+                queue.checkpoint(
+                    chunk,
+                    hydrated_count=hydrated_count,
+                    missing_count=len(block_statuses) - hydrated_count,
+                    last_tid=last_tid,
+                )
+
+        def renew_leases(blocks: list):
+            for held_claimer in (claimer, queue.claimer if queue else None):
+                if held_claimer and held_claimer.should_renew():
+                    held_claimer.renew()
+
+        window = _BlockWindow(
+            engine, commit_block, renew_leases, max_blocks=max_pending_blocks
         )
-        lookup_batch.append(doc)
 
-        # max lookup batch size is 100
-        if len(lookup_batch) == 100:
-            batch_tid_id_map = {doc["tid"]: doc["_id"] for doc in lookup_batch}
-            all_lookedup_tweets = twitter_api.statuses_lookup(
-                [doc["tid"] for doc in lookup_batch], tweet_mode="extended", map_=True
+        claimed_docs = claimer.claim()
+        while claimed_docs:
+            block = {
+                "lease_id": claimer.lease_id,
+                "last_tid": claimed_docs[-1].get("tid_int"),
+                "committed": False,
+            }
+            chunk_blocks.append(block)
+            window.put(
+                block,
+                [doc["tid"] for doc in claimed_docs],
+                work_ids={doc["tid"]: doc["_id"] for doc in claimed_docs},
             )
 
-            for tweet in all_lookedup_tweets:
-                if len(tweet._json) == 1:
-                    missing_batch.append(
-                        pymongo.operations.UpdateOne(
-                            {"_id": batch_tid_id_map[str(tweet.id)]},
-                            {"$set": {"status": -1}},
-                        )
-                    )
-                else:
-                    processed_tweet = extract.retrieve_content_from_tweet(
-                        tweet._json,
-                        include_users=include_users,
-                        include_relations=include_relations,
-                        db_conn=db_conn,
-                    )
-                    success_batch.append(
-                        pymongo.operations.UpdateOne(
-                            {"_id": batch_tid_id_map[str(tweet.id)]},
-                            {"$set": {"status": 2}},
-                        )
-                    )
+            claimed_docs = claimer.claim()
+
+        window.wait()
+
+    try:
+        if queue:
+            chunk = queue.claim()
+            while chunk:
+                hydrate_claimed(chunk=chunk)
+                queue.complete(chunk)
+                chunk = queue.claim()
+
+        # once the queue is drained, help with the ids left in chunks still held by
+        # other workers, the job ending when the last of them drains
+        hydrate_claimed()
+    finally:
+        # blocks still in flight are committed from the write stage, before the
+        # client is closed
+        engine.close()
+        try:
+            db_conn.close()
+        finally:
+            # hand tids and chunks back to other workers rather than waiting for
+            # lease expiry, uncommitted tids being hydrated again
+            for claimer in claimers:
+                claimer.release()
+            if queue:
+                queue.release()
 
-            lookup_batch = []
+    claimed_count = sum(claimer.claimed_count for claimer in claimers)
+    logger.info(f"Done hydrating {claimed_count} claimed tweets.")
 
-        # if enough, update status of tweets to 'error'
-        if len(missing_batch) >= batch_size:
-            try:
-                result = hydrating_tids_collection.bulk_write(
-                    missing_batch, ordered=False
-                )
-            except pymongo.errors.BulkWriteError as e:
-                pass
+    return (engine.hydrated_count, engine.missing_count, engine.processed_count)
 
-            missing_batch = []
 
-        # same, update status of tweets to 'done'
-        if len(success_batch) >= batch_size:
-            try:
-                result = hydrating_tids_collection.bulk_write(
-                    success_batch, ordered=False
-                )
-            except pymongo.errors.BulkWriteError as e:
-                pass
+def _run_hydration_from_queue(
+    twitter_api: tweepy.API,
+    queue_path: str,
+    issue: str,
+    env_file: str = None,
+    include_users: bool = True,
+    include_relations: bool = True,
+    batch_size: int = 1024,
+    lease_seconds: int = 900,
+    concurrency: int = 4,
+    max_pending_blocks: int = MAX_PENDING_BLOCKS,
+):
+    """Run hydration by taking tweet ids from a local tid_queue.TidQueue rather than
+    from the database. Ranges of ids are claimed the same way as blocks of hydrating
+    tids, statuses being recorded in the queue once the content of their tids is
+    flushed. Missing ids are only kept in the queue, see TidQueue.export_missing."""
+
+    if env_file:
+        settings.load_config(env_file=env_file)
+
+    queue = tid_queue.TidQueue(queue_path)
+    logger.info(f"Hydrating tweets from {queue_path} to {issue}.")
+
+    db_conn = db_client.DBClient(
+        issue=issue,
+        include_relations=include_relations,
+        include_users=include_users,
+        schema=db_schema.INDEX_V3,
+    )
+
+    def commit_block(block: tid_queue.TidBlock, block_statuses: list):
+        db_conn.flush_content(wait=True)
+        queue.set_statuses(
+            block,
+            done_tids=[tid for tid, status in block_statuses if status == 2],
+            missing_tids=[tid for tid, status in block_statuses if status == -1],
+        )
+        queue.complete(block)
 
-            success_batch = []
+    renewed_at = time.monotonic()
 
-    # if enough, update status of tweets to 'error'
-    if len(missing_batch) > 0:
+    def renew_blocks(blocks: list):
+        nonlocal renewed_at
+        if time.monotonic() - renewed_at > lease_seconds / 2:
+            for block in blocks:
+                queue.renew(block, lease_seconds=lease_seconds)
+            renewed_at = time.monotonic()
+
+    engine = HydrationEngine(
+        twitter_api,
+        db_conn,
+        include_users=include_users,
+        include_relations=include_relations,
+        concurrency=concurrency,
+        store_missing=False,
+    )
+    window = _BlockWindow(
+        engine, commit_block, renew_blocks, max_blocks=max_pending_blocks
+    )
+
+    try:
+        block = queue.claim(count=batch_size, lease_seconds=lease_seconds)
+        while block:
+            tids = [str(tid) for tid in block.tids]
+            window.put(block, tids, work_ids={tid: tid for tid in tids})
+            block = queue.claim(count=batch_size, lease_seconds=lease_seconds)
+
+        window.wait()
+    finally:
+        # blocks still in flight are committed from the write stage, before the
+        # client is closed
+        engine.close()
         try:
-            result = hydrating_tids_collection.bulk_write(missing_batch, ordered=False)
-        except pymongo.errors.BulkWriteError as e:
-            pass
+            db_conn.close()
+        finally:
+            # pending ids of uncommitted blocks are claimed again right away
+            for block in window.blocks:
+                queue.release(block)
+
+    logger.info(f"Done hydrating from {queue_path}: {queue.stats()}.")
 
-        missing_batch = []
+    return (engine.hydrated_count, engine.missing_count, engine.processed_count)
 
-    # same, update status of tweets to 'done'
-    if len(success_batch) > 0:
+
+def _push_status_updates(collection, status_updates: list):
+    """Bulk write status updates of hydrating tids."""
+
+    if len(status_updates) > 0:
         try:
-            result = hydrating_tids_collection.bulk_write(success_batch, ordered=False)
+            result = collection.bulk_write(status_updates, ordered=False)
         except pymongo.errors.BulkWriteError as e:
             pass
 
-        success_batch = []
 
+def _get_hydrating_filter(
+    start_date: datetime.datetime = None,
+    end_date: datetime.datetime = None,
+    key: int = None,
+) -> dict:
+    """Get the filter of the hydrating tids of a time interval and/or key."""
+
+    filter = {}
+    if start_date and end_date:
+        start_tid = snowflake.SnowFlake.get_tweet_id_from_time(start_date)
+        end_tid = snowflake.SnowFlake.get_tweet_id_from_time(end_date)
+        tid_range_query = {"tid_int": {"$gte": start_tid, "$lt": end_tid}}
+        filter.update(tid_range_query)
+    if key:
+        filter.update({"key": key})
+
+    return filter
 
-def _split_time_interval(start_date, end_date, n):
-    dt = (end_date - start_date) / n
-    dts = [(start_date + i * dt, start_date + (i + 1) * dt) for i in range(n)]
 
-    return dts
+def _merge_filters(*filters) -> dict:
+    filters = [f for f in filters if f]
+    if len(filters) > 1:
+        return {"$and": filters}
+
+    return filters[0] if filters else {}
 
 
 def _get_parallel_hydrating_from_db_kwargs(
@@ -241,23 +821,35 @@ def _get_parallel_hydrating_from_db_kwargs(
     collection: str = "hydrating_tids",
     start_date: datetime.datetime = None,
     end_date: datetime.datetime = None,
+    chunk_size: int = chunk_queue.DEFAULT_CHUNK_SIZE,
 ):
     """Get list of keyword args for the hydration process with tids
-    sourced from the database."""
+    sourced from the database.
 
-    if start_date and end_date:
-        # split the time periods into len(twitter_apis) pieces
-        dts = _split_time_interval(start_date, end_date, len(twitter_apis))
-    else:
-        keys = list(range(1, 1 + len(twitter_apis)))
+    Rather than splitting the tids between workers by key or time interval, tids
+    are planned into a queue of tid range chunks sized from the density of tids,
+    pulled by workers as they get idle."""
+
+    if env_file:
+        settings.load_config(env_file=env_file)
 
-    logger.info(f"Preparing workload distribution on keys {keys}.")
+    db_conn = db_client.DBClient(issue=issue)
+    queue = chunk_queue.TidRangeQueue(
+        db_conn._get_collection(collection, db_name=issue)
+    )
+    chunk_count = queue.plan(
+        base_filter=_get_hydrating_filter(start_date=start_date, end_date=end_date),
+        chunk_size=chunk_size,
+        min_chunk_count=CHUNKS_PER_WORKER * len(twitter_apis),
+    )
+    db_conn.close()
 
-    kwargs_list = []
-    iterator = (
-        zip(twitter_apis, dts) if (start_date and end_date) else zip(twitter_apis, keys)
+    logger.info(
+        f"Preparing workload distribution of {chunk_count} chunks on {len(twitter_apis)} workers."
     )
-    for twitter_api, dt in iterator:
+
+    kwargs_list = []
+    for twitter_api in twitter_apis:
         kwargs = {
             "twitter_api": twitter_api,
             "include_users": include_users,
@@ -267,17 +859,10 @@ def _get_parallel_hydrating_from_db_kwargs(
             "collection": collection,
             "env_file": env_file,
             "batch_size": batch_size,
+            "start_date": start_date,
+            "end_date": end_date,
+            "chunk_collection": queue.name,
         }
-        if start_date and end_date:
-            kwargs.update(
-                {
-                    "start_date": dt[0],
-                    "end_date": dt[1],
-                }
-            )
-        else:
-            kwargs.update({"key": dt})
-
         kwargs_list.append(kwargs)
 
     return kwargs_list
@@ -7,6 +7,7 @@ from typing import Union
 
 from tweepipe import settings
 from tweepipe.db import db_client, db_schema
+from tweepipe.utils import timestamps
 from tweepipe.legacy.botspot.bfreq import _get_bfreq
 
 
@@ -64,7 +65,7 @@ class BotSpot:
         feature_vec = np.zeros(20)
 
         created_at = user["created_at"]
-        creation_time = datetime.strptime(created_at, "%a %b %d %H:%M:%S +0000 %Y")
+        creation_time = timestamps.parse_tweet_timestamp(created_at)
         probe_time = datetime.now()
         age = probe_time - creation_time
         user_age = age.days * 24 + 1
@@ -23,15 +23,20 @@ if semver.VersionInfo.parse(tweepy.__version__).major < 4:
 from tweepipe import hydrating, settings, searching, lookup
 from tweepipe.db import db_client, db_schema
 from tweepipe.utils import (
+    credential_pool,
     credentials,
     loader,
     parallel,
     streaming_client,
+    tid_queue,
 )
 from tweepipe.base import history
 from tweepipe.utils.migration import convert, versions
 from tweepipe.utils.snowflake import SnowFlake
 
+# lookups in flight per credential when hydrating with a credential pool
+POOLED_LOOKUPS_PER_KEY = 2
+
 
 class LegacyClient:
     """
@@ -319,10 +324,14 @@ class LegacyClient:
         include_users: bool = True,
         collection: str = "hydrating_tids",
         free_api: bool = False,
+        pooled: bool = False,
     ):
         """Same as the hydrate tweets method, however take all tids from
             database instead of taking them from a file or input list.
 
+        With `pooled`, a single worker dispatches lookups to all credentials through
+            a credential pool, rather than binding each worker to a credential.
+
         Note that the current hydrating tids for the usc elections database
             use a field tid_int which stores all tweet ids as integers additionally
             to the tid field which stores the tweet ids as strings. All additional
@@ -338,6 +347,28 @@ class LegacyClient:
             f"Hydrating data from {tmp_issue}. Include users: {include_users}. Include relations {include_relations}."
         )
 
+        if pooled:
+            pool = credential_pool.get_credential_pool(
+                db_conn=self.db_conn,
+                purpose="hydrate",
+                api_count=api_count,
+                shared_state="mongo",
+            )
+            logger.info(f"Hydrating with a pool of {len(pool.keys)} api accesses.")
+            return hydrating._run_hydration_from_db(
+                twitter_api=pool.get_api(),
+                include_relations=include_relations,
+                include_users=include_users,
+                target_db=target_db,
+                issue=tmp_issue,
+                collection=collection,
+                env_file=self.env_file,
+                batch_size=batch_size,
+                start_date=start_date,
+                end_date=end_date,
+                concurrency=POOLED_LOOKUPS_PER_KEY * len(pool.keys),
+            )
+
         twitter_apis, twitter_credentials = credentials._get_twitter_apis(
             db_conn=self.db_conn,
             api_count=api_count,
@@ -382,20 +413,98 @@ class LegacyClient:
 
         return results
 
+    def load_tweet_files_to_queue(self, files: list, queue_path: str) -> int:
+        """Load tweet ids from files into a local work queue for hydration, storing
+        ids and their status in memory mapped files rather than in the database."""
+
+        return loader.load_tids_from_file_to_queue(files=files, queue_path=queue_path)
+
+    def hydrate_tweets_from_queue(
+        self,
+        queue_path: str,
+        api_count: int = 1,
+        issue: str = None,
+        batch_size: int = 1024,
+        include_relations: bool = True,
+        include_users: bool = True,
+        free_api: bool = False,
+        missing_file: str = None,
+    ):
+        """Same as the hydrate tweets from db method, however take all tids from a
+            local work queue loaded with load_tweet_files_to_queue, only hydrated
+            tweets being stored in the database.
+
+        Missing tids are written to `missing_file` once done, if provided.
+        """
+
+        include_users = self._get_include_users(include_users)
+        include_relations = self._get_include_relations(include_relations)
+        tmp_issue = self._get_issue(issue=issue)
+
+        twitter_apis, _ = credentials._get_twitter_apis(
+            db_conn=self.db_conn,
+            api_count=api_count,
+            purpose="hydrate",
+            free_api=free_api,
+        )
+        logger.info(f"Retrieved {len(twitter_apis)} api accesses.")
+
+        kwargs_list = [
+            {
+                "twitter_api": twitter_api,
+                "queue_path": queue_path,
+                "issue": tmp_issue,
+                "env_file": self.env_file,
+                "include_users": include_users,
+                "include_relations": include_relations,
+                "batch_size": batch_size,
+            }
+            for twitter_api in twitter_apis
+        ]
+        results = parallel.run_parallel(
+            fn=hydrating._run_hydration_from_queue,
+            kwargs_list=kwargs_list,
+            max_workers=len(twitter_apis),
+        )
+
+        if missing_file:
+            missing_count = tid_queue.TidQueue(queue_path).export_missing(missing_file)
+            logger.info(f"Wrote {missing_count} missing tids to {missing_file}.")
+
+        return results
+
     def hydrate_tweets(
         self,
         tweet_ids: list = [],
         tweet_ids_file: str = None,
         issue: str = None,
         api_count: int = 1,
+        pooled: bool = False,
     ):
-        """Recover tweet contents from tweet ids."""
+        """Recover tweet contents from tweet ids. With `pooled`, a single worker
+        dispatches lookups to all credentials through a credential pool."""
 
         if tweet_ids_file:
             tweet_ids = loader._load_from_file(tweet_ids_file)
 
         tmp_issue = self._get_issue(issue=issue)
 
+        if pooled:
+            pool = credential_pool.get_credential_pool(
+                db_conn=self.db_conn,
+                purpose="hydrate",
+                api_count=api_count,
+                shared_state="mongo",
+            )
+            return hydrating._run_hydration(
+                twitter_api=pool.get_api(),
+                tweet_ids=tweet_ids,
+                issue=tmp_issue,
+                include_users=self.include_users,
+                include_relations=self.include_relations,
+                concurrency=POOLED_LOOKUPS_PER_KEY * len(pool.keys),
+            )
+
         # retrieve twitter apis
         twitter_apis, _ = credentials._get_twitter_apis(
             db_conn=self.db_conn, api_count=api_count, purpose="hydrate"
@@ -1189,6 +1298,7 @@ class LegacyClient:
         search_collection: str = "tweets",
         issue: str = None,
         output_issue: str = None,
+        mode: str = "uid",
     ):
         """Run filter search on database with a given set of keywords. Two methods are available:
         text search in aggregation (therefore directly using db computational resources) or
@@ -1208,6 +1318,7 @@ class LegacyClient:
             issue=tmp_issue,
             output_issue=output_issue,
             db_conn=self.db_conn,
+            mode=mode,
         )
 
     def _create_yaml_env(self, filename, env_dict):
@@ -1,10 +1,11 @@
 import copy
 import datetime
-import json
 
 from loguru import logger
 
 from tweepipe import settings
+from tweepipe.db import records
+from tweepipe.utils import file_sink, timestamps
 
 
 def extract_likes(uid, tweet, db_conn):
@@ -26,11 +27,55 @@ def get_like_relation(uid, tweet):
 def retrieve_content_from_tweet(
     tweet, db_conn=None, include_users=True, include_relations=True, output_file=None
 ):
-    relations = _get_relations(tweet) if include_relations else {}
-    users = _get_users(tweet) if include_users else []
+    tweet_doc, relations, users = extract_content_from_tweet(
+        tweet,
+        include_users=include_users,
+        include_relations=include_relations,
+        output_file=output_file,
+    )
+    add_content_from_tweet(
+        tweet_doc,
+        relations,
+        users,
+        db_conn=db_conn,
+        include_users=include_users,
+        include_relations=include_relations,
+        output_file=output_file,
+    )
+
+
+def extract_content_from_tweet(
+    tweet, include_users=True, include_relations=True, output_file=None
+):
+    """Extract the tweet doc, relations and user docs from a tweet, without
+    touching the database nor modifying the tweet."""
+
+    # parsed once, for the tweet doc as well as relations and users
+    created_at = _get_creation_time_stamp(tweet["created_at"])
+    relations, users = _get_content(
+        tweet,
+        include_relations=include_relations,
+        include_users=include_users,
+        created_at=created_at,
+    )
+    relations = relations if include_relations else {}
+    tweet_doc = _format_tweet_doc(tweet, output_file=output_file, created_at=created_at)
+
+    return tweet_doc, relations, users
+
+
+def add_content_from_tweet(
+    tweet_doc,
+    relations,
+    users,
+    db_conn=None,
+    include_users=True,
+    include_relations=True,
+    output_file=None,
+):
+    """Add content extracted from a tweet to the database, or to the output file."""
 
     # add a single tweet - original doc
-    tweet_doc = _format_tweet_doc(tweet, output_file=output_file)
     if db_conn:
         db_conn.add_tweet(tweet_doc)
     elif output_file:
@@ -48,10 +93,12 @@ def retrieve_content_from_tweet(
     # TODO: add handling of user file
 
 
-def add_tweet_to_file(tweet_doc: dict, output_file: str):
-    logger.info(f"Got tweet {tweet_doc.get('tid')}.")
-    with open(output_file, "a") as f:
-        f.write(json.dumps(tweet_doc) + "\n")
+def add_tweet_to_file(tweet_doc: dict, output_file):
+    """Write a tweet doc to a file sink, or to the sink shared by the writers of an
+    output file path."""
+    if not isinstance(output_file, file_sink.FileSink):
+        output_file = file_sink.get_sink(output_file)
+    output_file.write(tweet_doc)
 
 
 def retrieve_content_from_extended_tweet():
@@ -71,10 +118,17 @@ def _get_raw_response_doc(tweet_batch: list):
     return {tweet_batch[-1]["oldest_id"]: tweet_batch}
 
 
-def _format_tweet_doc(tweet: dict, output_file: str = None):
-    """From user tweet produce a tweet doc to be inserted in mongodb."""
+def _format_tweet_doc(
+    tweet: dict, output_file: str = None, created_at: datetime.datetime = None
+):
+    """From user tweet produce a tweet doc to be inserted in mongodb. The tweet is
+    left untouched, its creation date being set on a shallow copy embedding nested
+    objects by reference."""
     if not output_file:
-        tweet["created_at"] = _get_creation_time_stamp(tweet["created_at"])
+        if created_at is None:
+            created_at = _get_creation_time_stamp(tweet["created_at"])
+        if tweet["created_at"] is not created_at:
+            tweet = {**tweet, "created_at": created_at}
     tweet_doc = {
         "json": tweet,
         "tid": tweet["id_str"],
@@ -84,10 +138,16 @@ def _format_tweet_doc(tweet: dict, output_file: str = None):
     return tweet_doc
 
 
-def _format_user_doc(user: dict):
-    """From user dict produce a user doc to be inserted in mongodb."""
+def _format_user_doc(user: dict, seen_at: datetime.datetime = None):
+    """From user dict produce a user doc to be inserted in mongodb. The creation
+    date of the tweet the profile was found in tells how fresh the profile is."""
 
-    user_doc = {"json": user, "uid": user["id_str"], "screen_name": user["screen_name"]}
+    user_doc = {
+        "json": user,
+        "uid": user["id_str"],
+        "screen_name": user["screen_name"],
+        "seen_at": seen_at,
+    }
 
     return user_doc
 
@@ -95,33 +155,20 @@ def _format_user_doc(user: dict):
 def _get_users(tweet):
     """Retrieves all fields with user profiles specified."""
 
-    users = [_format_user_doc(field["user"]) for field in _get_fields(tweet)]
-
-    return users
+    return _get_content(tweet, include_relations=False)[1]
 
 
 def _get_creation_time_stamp(ts):
+    # e.g. tweets loaded back from the database
+    if isinstance(ts, datetime.datetime):
+        return ts
+
     try:
-        return datetime.datetime.strptime(ts, settings.TWEET_TS_STR_FORMAT)
+        return timestamps.parse_tweet_timestamp(ts)
     except TypeError as e:
         return ts
 
 
-def _get_fields(tweet):
-    fields = [tweet]
-
-    if "quoted_status" in tweet:
-        fields.append(tweet["quoted_status"])
-
-    if "retweeted_status" in tweet:
-        fields.append(tweet["retweeted_status"])
-
-        if "quoted_status" in tweet["retweeted_status"]:
-            fields.append(tweet["retweeted_status"]["quoted_status"])
-
-    return fields
-
-
 def _get_relations(tweet):
     """Extract all relations from tweets.
 
@@ -129,161 +176,161 @@ def _get_relations(tweet):
         from a retweet means double extracting from the retweeted content, should we consider the
         retweet as producing the content itself?
     """
-    relations = {"hashtag": [], "retweet": [], "mention": [], "quote": [], "reply": []}
-
-    # NOTE: rever tto previous relations extraction pattern
-    # get reply relations from tweets
-    relations["reply"].extend(_get_reply_relations(tweet))
-    relations["hashtag"].extend(_get_hashtag_relations(tweet))
-    relations["mention"].extend(_get_mention_relations(tweet))
 
-    # note: quoted status cannot be a retweet
-    if "quoted_status" in tweet:
-        try:
-            relations["quote"].extend(_get_quote_relations(tweet))
-        except KeyError as e:
-            pass
-        relations["reply"].extend(_get_reply_relations(tweet["quoted_status"]))
-        relations["mention"].extend(_get_mention_relations(tweet["quoted_status"]))
-        relations["hashtag"].extend(_get_hashtag_relations(tweet["quoted_status"]))
+    relations = _get_content(tweet, include_users=False)[0]
 
-    if "retweeted_status" in tweet:
-        try:
-            relations["retweet"].extend(_get_retweet_relations(tweet))
-        except KeyError as e:
-            pass
+    return {
+        relation_type: records.to_docs(relation_records)
+        for relation_type, relation_records in relations.items()
+    }
 
-        # extract data from original retweeted tweet
-        relations["reply"].extend(_get_reply_relations(tweet["retweeted_status"]))
-        relations["mention"].extend(_get_mention_relations(tweet["retweeted_status"]))
-        relations["hashtag"].extend(_get_hashtag_relations(tweet["retweeted_status"]))
 
-        # retweet can be itself a quote
-        if "quoted_status" in tweet:
-            try:
-                relations["quote"].extend(
-                    _get_quote_relations(tweet["retweeted_status"])
-                )
-            except KeyError as e:
-                pass
-            relations["reply"].extend(
-                _get_reply_relations(tweet["retweeted_status"]["quoted_status"])
-            )
-            relations["mention"].extend(
-                _get_mention_relations(tweet["retweeted_status"]["quoted_status"])
-            )
-            relations["hashtag"].extend(
-                _get_hashtag_relations(tweet["retweeted_status"]["quoted_status"])
-            )
+def _get_content(tweet, include_relations=True, include_users=True, created_at=None):
+    """Extract relations and user profiles from a tweet in a single traversal,
+    visiting the tweet and each embedded status (quote, retweet, quote of the
+    retweet) once and parsing their creation date once.
 
-    return relations
+    Relations of a retweet's quote are extracted whenever the tweet itself has a
+    quoted status, user profiles whenever the retweet has one. Relations are
+    emitted as records, converted to documents once flushed by the database client.
+    """
 
+    relations = {"hashtag": [], "retweet": [], "mention": [], "quote": [], "reply": []}
+    users = []
 
-def _get_quote_relations(tweet):
-    quote_relations = []
-    created_at = _get_creation_time_stamp(tweet["created_at"])
+    if created_at is None:
+        created_at = _get_creation_time_stamp(tweet["created_at"])
+    if include_relations:
+        _add_status_relations(relations, tweet, created_at)
+    if include_users:
+        users.append(_format_user_doc(tweet["user"], seen_at=created_at))
 
+    # note: quoted status cannot be a retweet
     if "quoted_status" in tweet:
-        quote_relation = {}
-        quote_relation["user_id"] = tweet["user"]["id_str"]
-        quote_relation["user_screen_name"] = tweet["user"]["screen_name"]
-
-        # case where quoted tweets is no longer available (removed or user removed)
-        quote_relation["quoted_user_screen_name"] = tweet["quoted_status"]["user"][
-            "screen_name"
-        ]
-        quote_relation["quoted_user_id"] = tweet["quoted_status"]["user"]["id_str"]
-        quote_relation["quoted_tweet_id"] = tweet["quoted_status"]["id_str"]
-        quote_relation["tid"] = tweet["id_str"]
-        quote_relation["created_at"] = created_at
-        quote_relations.append(quote_relation)
-
-    return quote_relations
-
-
-def _get_retweet_relations(tweet):
-    created_at = _get_creation_time_stamp(tweet["created_at"])
-    retweet_relations = []
+        quoted_status = tweet["quoted_status"]
+        quoted_created_at = _get_creation_time_stamp(quoted_status["created_at"])
+        if include_relations:
+            _add_quote_relation(relations, tweet, created_at)
+            _add_status_relations(relations, quoted_status, quoted_created_at)
+        if include_users:
+            users.append(
+                _format_user_doc(quoted_status["user"], seen_at=quoted_created_at)
+            )
 
     if "retweeted_status" in tweet:
-        retweet_relation = {}
-        retweet_relation["user_id"] = tweet["user"]["id_str"]
-        retweet_relation["user_screen_name"] = tweet["user"]["screen_name"]
+        retweeted_status = tweet["retweeted_status"]
+        retweeted_created_at = _get_creation_time_stamp(retweeted_status["created_at"])
+        if include_relations:
+            _add_retweet_relation(relations, tweet, created_at)
+            _add_status_relations(relations, retweeted_status, retweeted_created_at)
 
-        # case where user has gone missing and was not returned
-        retweet_relation["retweeted_user_screen_name"] = tweet["retweeted_status"][
-            "user"
-        ]["screen_name"]
-        retweet_relation["retweeted_user_id"] = tweet["retweeted_status"]["user"][
-            "id_str"
-        ]
-        retweet_relation["retweet_id"] = tweet["retweeted_status"]["id_str"]
+        # retweet can be itself a quote
+        if (include_relations and "quoted_status" in tweet) or (
+            include_users and "quoted_status" in retweeted_status
+        ):
+            retweeted_quote = retweeted_status["quoted_status"]
+            retweeted_quote_created_at = _get_creation_time_stamp(
+                retweeted_quote["created_at"]
+            )
+        if include_relations and "quoted_status" in tweet:
+            _add_quote_relation(relations, retweeted_status, retweeted_created_at)
+            _add_status_relations(
+                relations, retweeted_quote, retweeted_quote_created_at
+            )
 
-        retweet_relation["tid"] = tweet["id_str"]
-        retweet_relation["created_at"] = created_at
-        retweet_relations.append(retweet_relation)
+        if include_users:
+            users.append(
+                _format_user_doc(retweeted_status["user"], seen_at=retweeted_created_at)
+            )
+            if "quoted_status" in retweeted_status:
+                users.append(
+                    _format_user_doc(
+                        retweeted_quote["user"], seen_at=retweeted_quote_created_at
+                    )
+                )
 
-    return retweet_relations
+    return relations, users
 
 
-def _get_mention_relations(tweet):
-    mentions = tweet["entities"]["user_mentions"]
-    created_at = _get_creation_time_stamp(tweet["created_at"])
+def _add_status_relations(relations, tweet, created_at):
+    """Add the reply, hashtag and mention relations of a single status."""
 
-    mention_relations = []
-    for mention in mentions:
-        mention_relation = {}
-        mention_relation["user_id"] = tweet["user"]["id_str"]
-        mention_relation["user_screen_name"] = tweet["user"]["screen_name"]
+    if tweet["in_reply_to_status_id"] and tweet["in_reply_to_user_id"]:
+        relations["reply"].append(
+            records.ReplyRelation(
+                tweet["in_reply_to_status_id_str"],
+                tweet["in_reply_to_user_id_str"],
+                tweet.get("in_reply_to_screen_name"),
+                tweet["id_str"],
+                tweet["user"]["id_str"],
+                tweet["user"]["screen_name"],
+                created_at,
+            )
+        )
+
+    entities = tweet["entities"]
+    for hashtag in entities["hashtags"]:
+        relations["hashtag"].append(
+            records.HashtagRelation(
+                tweet["user"]["id_str"],
+                tweet["user"]["screen_name"],
+                hashtag["text"],
+                tweet["id_str"],
+                created_at,
+            )
+        )
 
-        # in case has username but no user id, set flag missing to true
-        try:
-            mention_relation["mentioned_user_id"] = mention["id_str"]
-        except KeyError as e:
+    for mention in entities["user_mentions"]:
+        # in case has username but no user id, skip the mention
+        if "id_str" not in mention:
             continue
 
-        mention_relation["mentioned_user_screen_name"] = mention["screen_name"]
-        mention_relation["tid"] = tweet["id_str"]
-        mention_relation["created_at"] = created_at
-        mention_relations.append(mention_relation)
-
-    return mention_relations
-
-
-def _get_hashtag_relations(tweet):
-    hashtags = tweet["entities"]["hashtags"]
-    created_at = _get_creation_time_stamp(tweet["created_at"])
-
-    hashtag_relations = []
-    for hashtag in hashtags:
-        hashtag_relation = {}
-        hashtag_relation["user_id"] = tweet["user"]["id_str"]
-        hashtag_relation["user_screen_name"] = tweet["user"]["screen_name"]
-        hashtag_relation["hashtag"] = hashtag["text"]
-        hashtag_relation["tid"] = tweet["id_str"]
-        hashtag_relation["created_at"] = created_at
-        hashtag_relations.append(hashtag_relation)
-
-    return hashtag_relations
+        relations["mention"].append(
+            records.MentionRelation(
+                tweet["user"]["id_str"],
+                tweet["user"]["screen_name"],
+                mention["id_str"],
+                mention["screen_name"],
+                tweet["id_str"],
+                created_at,
+            )
+        )
 
 
-def _get_reply_relations(tweet):
-    reply_relations = []
-    created_at = _get_creation_time_stamp(tweet["created_at"])
+def _add_quote_relation(relations, tweet, created_at):
+    if "quoted_status" not in tweet:
+        return
 
-    if tweet["in_reply_to_status_id"] and tweet["in_reply_to_user_id"]:
-        reply_relation = {}
-        reply_relation["in_reply_to_tweet_id"] = tweet["in_reply_to_status_id_str"]
-        reply_relation["in_reply_to_user_id"] = tweet["in_reply_to_user_id_str"]
-        if "in_reply_to_screen_name" in tweet:
-            reply_relation["in_reply_to_screen_name"] = tweet["in_reply_to_screen_name"]
-        else:
-            reply_relation["in_reply_to_screen_name"] = None
-        reply_relation["tid"] = tweet["id_str"]
-        reply_relation["user_id"] = tweet["user"]["id_str"]
-        reply_relation["user_screen_name"] = tweet["user"]["screen_name"]
-        reply_relation["created_at"] = created_at
-
-        reply_relations.append(reply_relation)
-
-    return reply_relations
+    # case where quoted tweets is no longer available (removed or user removed)
+    try:
+        quote_relation = records.QuoteRelation(
+            tweet["user"]["id_str"],
+            tweet["user"]["screen_name"],
+            tweet["quoted_status"]["user"]["screen_name"],
+            tweet["quoted_status"]["user"]["id_str"],
+            tweet["quoted_status"]["id_str"],
+            tweet["id_str"],
+            created_at,
+        )
+    except KeyError as e:
+        return
+
+    relations["quote"].append(quote_relation)
+
+
+def _add_retweet_relation(relations, tweet, created_at):
+    # case where user has gone missing and was not returned
+    try:
+        retweet_relation = records.RetweetRelation(
+            tweet["user"]["id_str"],
+            tweet["user"]["screen_name"],
+            tweet["retweeted_status"]["user"]["screen_name"],
+            tweet["retweeted_status"]["user"]["id_str"],
+            tweet["retweeted_status"]["id_str"],
+            tweet["id_str"],
+            created_at,
+        )
+    except KeyError as e:
+        return
+
+    relations["retweet"].append(retweet_relation)
@@ -1,5 +1,7 @@
 import json
 import datetime
+import math
+from typing import Union
 
 import pymongo
 from tweepipe.legacy.utils import extract
@@ -7,8 +9,14 @@ import tweepy
 from loguru import logger
 
 from tweepipe import settings
-from tweepipe.db import db_client, db_schema
+from tweepipe.db import db_client, db_schema, keyword_index
 from tweepipe.utils import parallel
+from tweepipe.utils import keywords as keywords_utils
+
+LOCAL_SEARCH_MODES = ("uid", "scan", "index")
+
+# more ranges than workers, so that workers finishing early pick up remaining ranges
+SCAN_PARTITIONS_PER_WORKER = 4
 
 
 def run_local_tweets_search(
@@ -19,25 +27,98 @@ def run_local_tweets_search(
     issue: str,
     db_conn: db_client.DBClient,
     env_file: str = None,
+    mode: str = "uid",
 ):
     """We search for all tweets which may contain a relevant keyword. Note that we strive
     to gather as much data as possible. If a retweet contains relevant keywords then it
     should be included here.
+
+    Three modes are available:
+
+    - uid: query the tweets of each fetched user id,
+    - scan: partition the search collection into `_id` ranges, each worker scanning
+      its ranges sequentially, fetching only the searched text fields of tweets posted
+      by fetched users (filtered server side), then the full matching tweets,
+    - index: update the n-gram index of the search collection (see
+      keyword_index.KeywordIndex) with tweets inserted since the last search, then
+      only fetch and verify candidate tweets of the index.
+
+    The scan mode avoids one query per user, and is the fastest one when most tweets
+    of the collection are searched. The index mode is meant for repeated searches on
+    the same collection, falling back on the scan mode for keywords too short to be
+    looked up.
     """
-    # assemble all user ids for which tweets have been collected
-    fetched_uids = _get_uids_fetched(issue=issue, db_conn=db_conn)
-    kwargs_list = _get_local_tweets_search_kwargs(
-        fetched_uids=fetched_uids,
-        keywords=keywords,
-        search_field=search_field,
-        search_collection=search_collection,
-        output_issue=output_issue,
-        issue=issue,
-        env_file=env_file,
-    )
+    if mode not in LOCAL_SEARCH_MODES:
+        raise ValueError(f"Local search mode must be one of {LOCAL_SEARCH_MODES}.")
+    if mode == "index" and not all(
+        map(keyword_index.KeywordIndex.is_indexable, keywords)
+    ):
+        logger.warning(
+            "Some keywords are too short to be looked up in the keyword index, scanning the tweets instead."
+        )
+        mode = "scan"
+
+    if mode == "scan":
+        search_collection_ = db_conn._get_collection(search_collection, db_name=issue)
+        id_ranges = _get_id_ranges(
+            search_collection_,
+            partition_count=settings.WORKER_COUNT * SCAN_PARTITIONS_PER_WORKER,
+        )
+        kwargs_list = [
+            {
+                "id_range": id_range,
+                "search_collection": search_collection,
+                "search_field": search_field,
+                "issue": issue,
+                "output_issue": output_issue,
+                "keywords": keywords,
+                "env_file": env_file,
+            }
+            for id_range in id_ranges
+        ]
+        fn = _run_local_tweets_scan_exec
+    elif mode == "index":
+        index = keyword_index.KeywordIndex(
+            db_conn._get_collection(search_collection, db_name=issue).database,
+            search_collection=search_collection,
+            search_field=search_field,
+        )
+        index.update()
+        candidate_ids = index.get_candidate_ids(keywords)
+        logger.info(
+            f"Found {len(candidate_ids)} candidate tweets in {index.name} for {len(keywords)} keywords."
+        )
+
+        batch_size = math.ceil(len(candidate_ids) / settings.WORKER_COUNT)
+        kwargs_list = [
+            {
+                "candidate_ids": candidate_ids[i : i + batch_size],
+                "search_collection": search_collection,
+                "search_field": search_field,
+                "issue": issue,
+                "output_issue": output_issue,
+                "keywords": keywords,
+                "env_file": env_file,
+            }
+            for i in range(0, len(candidate_ids), batch_size)
+        ]
+        fn = _run_local_tweets_candidates_exec
+    else:
+        # assemble all user ids for which tweets have been collected
+        fetched_uids = _get_uids_fetched(issue=issue, db_conn=db_conn)
+        kwargs_list = _get_local_tweets_search_kwargs(
+            fetched_uids=fetched_uids,
+            keywords=keywords,
+            search_field=search_field,
+            search_collection=search_collection,
+            output_issue=output_issue,
+            issue=issue,
+            env_file=env_file,
+        )
+        fn = _run_local_tweets_search_exec
 
     results = parallel.run_parallel(
-        fn=_run_local_tweets_search_exec,
+        fn=fn,
         kwargs_list=kwargs_list,
         max_workers=settings.WORKER_COUNT,
     )
@@ -49,7 +130,7 @@ def run_local_tweets_search(
         processed_tweet_count += result[1]
 
     logger.info(
-        f"Successfully filtered {added_tweet_count} tweets with {len(keywords)} keywords ({float(100*added_tweet_count/processed_tweet_count):.2f}%)."
+        f"Successfully filtered {added_tweet_count} tweets with {len(keywords)} keywords ({float(100*added_tweet_count/max(processed_tweet_count, 1)):.2f}%)."
     )
 
     return added_tweet_count, processed_tweet_count
@@ -77,6 +158,9 @@ def _run_local_tweets_search_exec(
         include_users=True,
     )
 
+    # keywords are compiled once for all uids
+    matcher = keywords_utils.KeywordMatcher(keywords)
+
     # re-extract data for all uids
     processed_doc_count = 0
     added_doc_count = 0
@@ -90,7 +174,7 @@ def _run_local_tweets_search_exec(
         )
         for doc in cursor:
             if is_tweet_related(
-                doc["json"], keywords=keywords, search_field=search_field
+                doc["json"], keywords=matcher, search_field=search_field
             ):
                 processed_tweet = extract.retrieve_content_from_tweet(
                     doc["json"],
@@ -109,48 +193,270 @@ def _run_local_tweets_search_exec(
     return added_doc_count, processed_doc_count
 
 
-def is_tweet_related(tweet: dict, keywords: list, search_field: str = "text"):
-    """Check if tweet is related to explored content."""
+def _get_id_ranges(
+    collection: pymongo.collection.Collection,
+    partition_count: int,
+    sample_size: int = 64,
+) -> list:
+    """Split a collection into `_id` ranges holding about as many documents, based on
+    a random sample of ids. Ranges are half-open, the first and last ones being
+    unbounded.
+
+    :param collection: Collection to be partitioned.
+    :type collection: pymongo.collection.Collection
+    :param partition_count: Number of ranges.
+    :type partition_count: int
+    :param sample_size: Number of sampled ids per range, defaults to 64.
+    :type sample_size: int, optional
+    :return: List of (lower bound, upper bound) tuples, None standing for no bound.
+    :rtype: list
+    """
+
+    if partition_count <= 1:
+        return [(None, None)]
+
+    sampled_ids = sorted(
+        doc["_id"]
+        for doc in collection.aggregate(
+            [
+                {"$sample": {"size": partition_count * sample_size}},
+                {"$project": {"_id": 1}},
+            ],
+            allowDiskUse=True,
+        )
+    )
+    step = len(sampled_ids) / partition_count
+    bounds = sorted(
+        {sampled_ids[int(i * step)] for i in range(1, partition_count)}
+        if sampled_ids
+        else set()
+    )
+    bounds = [None] + bounds + [None]
 
-    def is_related(text, keywords):
-        """Search subtext contained in tweet for a mentioned keyword."""
-        text = text.lower().strip().replace("ー", "-")
-        for keyword in keywords:
-            if keyword in text:
-                return True
-        return False
+    return list(zip(bounds[:-1], bounds[1:]))
 
-    # produce set of keywords in lowercase for searching
-    str_strip = lambda x: x.strip().lower().replace("ー", "-")
-    keywords = list(map(str_strip, keywords))
 
-    if "quoted_status" in tweet and is_related(
-        tweet["quoted_status"][search_field], keywords
-    ):
-        return True
-    if (
-        "retweeted_status" in tweet
-        and "quoted_status" in tweet["retweeted_status"]
-        and is_related(
-            tweet["retweeted_status"]["quoted_status"][search_field], keywords
+def _run_local_tweets_scan_exec(
+    id_range: tuple,
+    search_collection: str,
+    search_field: str,
+    issue: str,
+    output_issue: str,
+    keywords: list,
+    env_file: str = None,
+    batch_size: int = 4096,
+):
+    if env_file:
+        settings.load_config(env_file=env_file)
+
+    input_conn = db_client.DBClient(issue=issue)
+    input_collection = input_conn._get_collection(search_collection, db_name=issue)
+    output_conn = db_client.DBClient(
+        issue=output_issue,
+        schema=db_schema.INDEX_V3,
+        include_relations=True,
+        include_users=True,
+    )
+    matcher = keywords_utils.KeywordMatcher(keywords)
+
+    lower_id, upper_id = id_range
+    id_filter = {}
+    if lower_id is not None:
+        id_filter["$gte"] = lower_id
+    if upper_id is not None:
+        id_filter["$lt"] = upper_id
+
+    # sequential scan of the range
+    db_pipeline = _get_fetched_tweets_pipeline(
+        match={"_id": id_filter} if id_filter else {},
+        projection=keywords_utils.get_text_projection(search_field),
+        sort={"_id": pymongo.ASCENDING},
+    )
+    cursor = input_collection.aggregate(
+        db_pipeline, batchSize=batch_size, allowDiskUse=True
+    )
+
+    processed_doc_count = 0
+    added_doc_count = 0
+    related_ids = []
+    for doc in cursor:
+        if is_tweet_related(doc["json"], keywords=matcher, search_field=search_field):
+            related_ids.append(doc["_id"])
+        processed_doc_count += 1
+
+        if len(related_ids) >= batch_size:
+            added_doc_count += _add_related_tweets(
+                input_collection, related_ids, output_conn
+            )
+            related_ids = []
+
+        if processed_doc_count % (64 * batch_size) == 0:
+            logger.info(
+                f"Scanned {processed_doc_count} tweets. Found {added_doc_count + len(related_ids)} related tweets."
+            )
+
+    added_doc_count += _add_related_tweets(input_collection, related_ids, output_conn)
+    output_conn.flush_content()
+
+    return added_doc_count, processed_doc_count
+
+
+def _run_local_tweets_candidates_exec(
+    candidate_ids: list,
+    search_collection: str,
+    search_field: str,
+    issue: str,
+    output_issue: str,
+    keywords: list,
+    env_file: str = None,
+    batch_size: int = 1024,
+):
+    if env_file:
+        settings.load_config(env_file=env_file)
+
+    input_conn = db_client.DBClient(issue=issue)
+    input_collection = input_conn._get_collection(search_collection, db_name=issue)
+    output_conn = db_client.DBClient(
+        issue=output_issue,
+        schema=db_schema.INDEX_V3,
+        include_relations=True,
+        include_users=True,
+    )
+    matcher = keywords_utils.KeywordMatcher(keywords)
+
+    # verify candidates of the keyword index, which may not contain any keyword
+    processed_doc_count = 0
+    added_doc_count = 0
+    for i in range(0, len(candidate_ids), batch_size):
+        db_pipeline = _get_fetched_tweets_pipeline(
+            match={"_id": {"$in": candidate_ids[i : i + batch_size]}},
+            projection={"json": 1},
         )
-    ):
-        return True
-    if "retweeted_status" in tweet and is_related(
-        tweet["retweeted_status"][search_field], keywords
-    ):
-        return True
-    if is_related(tweet[search_field], keywords):
-        return True
-    else:
-        return False
+        for doc in input_collection.aggregate(db_pipeline, allowDiskUse=True):
+            if is_tweet_related(
+                doc["json"], keywords=matcher, search_field=search_field
+            ):
+                extract.retrieve_content_from_tweet(
+                    doc["json"],
+                    include_users=output_conn.include_users,
+                    include_relations=output_conn.include_relations,
+                    db_conn=output_conn,
+                )
+                added_doc_count += 1
+            processed_doc_count += 1
+
+    output_conn.flush_content()
+
+    return added_doc_count, processed_doc_count
+
+
+def _get_fetched_tweets_pipeline(
+    match: dict, projection: dict, sort: dict = None
+) -> list:
+    """Aggregation pipeline of the tweets matching a filter, tweets of users which
+    were not fully fetched being filtered out on the server through the unique uid
+    index of fetching_uids."""
+
+    db_pipeline = [{"$match": match}]
+    if sort:
+        db_pipeline.append({"$sort": sort})
+    db_pipeline += [
+        {
+            "$lookup": {
+                "from": "fetching_uids",
+                "localField": "uid",
+                "foreignField": "uid",
+                "as": "fetching_uid",
+            }
+        },
+        {"$match": {"fetching_uid.status": 2}},
+        {"$project": projection},
+    ]
+
+    return db_pipeline
+
+
+def _add_related_tweets(
+    input_collection: pymongo.collection.Collection,
+    related_ids: list,
+    output_conn: db_client.DBClient,
+) -> int:
+    """Fetch full related tweets by `_id`, and re-extract their content."""
+
+    if not related_ids:
+        return 0
+
+    added_doc_count = 0
+    cursor = input_collection.find(
+        filter={"_id": {"$in": related_ids}}, projection={"json": 1}
+    )
+    for doc in cursor:
+        extract.retrieve_content_from_tweet(
+            doc["json"],
+            include_users=output_conn.include_users,
+            include_relations=output_conn.include_relations,
+            db_conn=output_conn,
+        )
+        added_doc_count += 1
+
+    return added_doc_count
+
+
+def is_tweet_related(
+    tweet: dict,
+    keywords: Union[list, keywords_utils.KeywordMatcher],
+    search_field: str = "text",
+):
+    """Check if tweet is related to explored content, i.e. if its text, or the text
+    of a quoted or retweeted tweet, contains any of the keywords.
+
+    :param tweet: Raw tweet.
+    :type tweet: dict
+    :param keywords: Keywords, or a matcher built once for all tweets.
+    :type keywords: Union[list, keywords_utils.KeywordMatcher]
+    :param search_field: Field holding the text, defaults to "text".
+    :type search_field: str, optional
+    :return: Whether a keyword was found.
+    :rtype: bool
+    """
+
+    if not isinstance(keywords, keywords_utils.KeywordMatcher):
+        keywords = keywords_utils.KeywordMatcher(keywords)
+
+    return keywords.search(keywords_utils.get_tweet_texts(tweet, search_field))
+
+
+def get_matched_keywords(
+    tweet: dict,
+    keywords: Union[list, keywords_utils.KeywordMatcher],
+    search_field: str = "text",
+) -> set:
+    """Get the keywords contained in the texts searched by is_tweet_related.
+
+    :param tweet: Raw tweet.
+    :type tweet: dict
+    :param keywords: Keywords, or a matcher built once for all tweets.
+    :type keywords: Union[list, keywords_utils.KeywordMatcher]
+    :param search_field: Field holding the text, defaults to "text".
+    :type search_field: str, optional
+    :return: Keywords found.
+    :rtype: set
+    """
+
+    if not isinstance(keywords, keywords_utils.KeywordMatcher):
+        keywords = keywords_utils.KeywordMatcher(keywords)
+
+    return keywords.find(keywords_utils.get_tweet_texts(tweet, search_field))
 
 
 def _get_uids_fetched(issue: str, db_conn: db_client.DBClient):
     query = {"status": 2}
     collection = db_conn._get_collection("fetching_uids", db_name=issue)
     fetched_uid_docs = collection.find(
-        filter=query, sort=[("tid", pymongo.ASCENDING)], allow_disk_use=True
+        filter=query,
+        projection={"_id": 0, "uid": 1},
+        sort=[("uid", pymongo.ASCENDING)],
+        allow_disk_use=True,
     )
     fetched_uids = [doc["uid"] for doc in fetched_uid_docs]
 
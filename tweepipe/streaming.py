@@ -1,15 +1,15 @@
 import json
 import math
 import time
-import threading
-import queue
+from typing import Union
 from tweepipe.legacy.utils import extract
 
 import tweepy
 from loguru import logger
 
+from tweepipe import settings
 from tweepipe.db import db_client
-from tweepipe.utils import tracker, credentials
+from tweepipe.utils import tracker, credentials, fastjson, file_sink, pipeline
 
 
 def stream_keywords(
@@ -20,6 +20,12 @@ def stream_keywords(
     include_users: bool = True,
     output_file: str = None,
     skip_db: bool = False,
+    async_flush: bool = False,
+    spill_dir: str = None,
+    worker_count: int = 2,
+    overflow: str = "block",
+    rotate_output: bool = False,
+    handle_signals: bool = False,
 ):
 
     stream_log_file = f"seq_stream_log_{issue}.log"
@@ -32,6 +38,8 @@ def stream_keywords(
                 issue=issue,
                 include_relations=include_relations,
                 include_users=include_users,
+                async_flush=async_flush,
+                spill_dir=spill_dir,
             )
         else:
             db_conn = None
@@ -39,6 +47,19 @@ def stream_keywords(
         db_conn = None
         pass
 
+    # buffered output shared by the successive listeners, synced to disk every 30
+    # seconds at most
+    output_sink = (
+        file_sink.get_sink(
+            output_file,
+            rotate=rotate_output,
+            handle_signals=handle_signals,
+            fsync_interval=30,
+        )
+        if output_file
+        else None
+    )
+
     # implement exponential backoff in case of trouble
     exp_backoff, backoff_param = 1, 1.4
     while True:
@@ -51,9 +72,12 @@ def stream_keywords(
             twitter_auth = credentials._get_twitter_auth(twitter_credentials)
             stream_listener = SNPipelineStream(
                 db_conn=db_conn,
-                output_file=output_file,
+                output_file=output_sink,
                 include_users=include_users,
                 include_relations=include_relations,
+                worker_count=worker_count,
+                overflow=overflow,
+                spill_dir=spill_dir,
             )
             stream = tweepy.Stream(auth=twitter_auth, listener=stream_listener)
             stream.filter(track=keywords, stall_warnings=True)
@@ -120,114 +144,206 @@ def _get_parallel_streaming_kwargs(
 
 
 class SNPipelineStream(tweepy.StreamListener):
+    """Stream listener handing incoming tweets over to a pipeline of worker threads,
+    so that the stream connection is never held up by processing:
+
+    - parse: decode raw tweets,
+    - extract: extract tweet docs, relations and user profiles,
+    - write: add extracted content to the database buffers (or to the output file).
+
+    :param db_conn: Database client, defaults to None.
+    :type db_conn: db_client.DBClient, optional
+    :param output_file: File (or file sink) to write tweets to without database,
+        written through a buffered, rotating file sink, defaults to None.
+    :type output_file: Union[str, file_sink.FileSink], optional
+    :param include_users: Whether to extract user profiles, defaults to True.
+    :type include_users: bool, optional
+    :param include_relations: Whether to extract relations, defaults to True.
+    :type include_relations: bool, optional
+    :param worker_count: Number of parsing and extraction threads, defaults to 2.
+    :type worker_count: int, optional
+    :param max_queue_size: Maximum number of tweets waiting in each stage, defaults
+        to 100000.
+    :type max_queue_size: int, optional
+    :param overflow: Behaviour once the pipeline is saturated, either "block" (the
+        stream connection waits), "drop" or "spill" incoming tweets to jsonl files in
+        `spill_dir`, defaults to "block".
+    :type overflow: str, optional
+    :param spill_dir: Directory of the spilled tweets, defaults to settings.OUTPUT_DIR.
+    :type spill_dir: str, optional
+    """
+
     def __init__(
         self,
         db_conn: db_client.DBClient = None,
-        output_file: str = None,
+        output_file: Union[str, file_sink.FileSink] = None,
         include_users: bool = True,
         include_relations: bool = True,
+        worker_count: int = 2,
+        max_queue_size: int = 100000,
+        overflow: str = "block",
+        spill_dir: str = None,
     ):
         super(SNPipelineStream, self).__init__()
 
         self.db_conn = db_conn
-        self.output_file = output_file
+        self.output_file = (
+            file_sink.get_sink(output_file)
+            if isinstance(output_file, str)
+            else output_file
+        )
         self.include_users = include_users
         self.include_relations = include_relations
-        self.processing_queue = queue.Queue()
-        self.processing_thread = threading.Thread(
-            target=self.process_incoming_tweets, daemon=True
+
+        self._overflow_sink = None
+        if overflow == "spill":
+            self._overflow_sink = file_sink.FileSink(
+                directory=spill_dir if spill_dir else settings.OUTPUT_DIR,
+                prefix="stream-overflow",
+            )
+
+        self.pipeline = pipeline.Pipeline(
+            [
+                pipeline.Stage(
+                    "parse",
+                    self.parse_tweet,
+                    worker_count=worker_count,
+                    max_queue_size=max_queue_size,
+                    overflow=overflow,
+                    spill_fn=self.spill_tweet,
+                ),
+                pipeline.Stage(
+                    "extract",
+                    self.extract_tweet,
+                    worker_count=worker_count,
+                    max_queue_size=max_queue_size,
+                ),
+                pipeline.Stage(
+                    "write", self.write_tweet_content, max_queue_size=max_queue_size
+                ),
+            ]
         )
-        self.processing_thread.start()
-
-    def process_incoming_tweets(self, heartbeat: float = 1):
-        while True:
-            if self.processing_queue.empty():
-                # logger.debug(f"No tweet, waiting {heartbeat} sec.")
-                time.sleep(heartbeat)
-                continue
-            else:
-                try:
-                    tweet = self.processing_queue.get(block=False)
-                    # logger.debug(
-                    #    f'Processing tweet {tweet.get("id")} - queue size {self.processing_queue.qsize()} -batch size {len(self.db_conn.tweet_batch)}.'
-                    # )
-                    extract.retrieve_content_from_tweet(
-                        tweet=tweet,
-                        db_conn=self.db_conn,
-                        include_users=self.include_users,
-                        include_relations=self.include_relations,
-                        output_file=self.output_file,
-                    )
-                    self.processing_queue.task_done()
-                except queue.Empty as e:
-                    logger.error(e)
-                    continue
+
+    @staticmethod
+    def parse_tweet(raw_tweet):
+        if isinstance(raw_tweet, (str, bytes)):
+            tweet = fastjson.loads(raw_tweet)
+        else:
+            tweet = raw_tweet
+        if "in_reply_to_status_id" not in tweet:
+            return None
+
+        return tweet
+
+    def extract_tweet(self, tweet: dict) -> tuple:
+        return extract.extract_content_from_tweet(
+            tweet,
+            include_users=self.include_users,
+            include_relations=self.include_relations,
+            output_file=self.output_file,
+        )
+
+    def write_tweet_content(self, content: tuple):
+        tweet_doc, relations, users = content
+        extract.add_content_from_tweet(
+            tweet_doc,
+            relations,
+            users,
+            db_conn=self.db_conn,
+            include_users=self.include_users,
+            include_relations=self.include_relations,
+            output_file=self.output_file,
+        )
+
+    def spill_tweet(self, raw_tweet):
+        if isinstance(raw_tweet, bytes):
+            raw_tweet = raw_tweet.decode("utf-8")
+        if isinstance(raw_tweet, str):
+            self._overflow_sink.write_lines([raw_tweet.strip()])
+        else:
+            self._overflow_sink.write(raw_tweet)
+
+    def on_data(self, raw_data):
+        """Hand raw tweets over to the pipeline without decoding them on the stream
+        thread, other messages (limits, disconnections, warnings) being handled by
+        the listener's callbacks."""
+        # raw json strings, only decoded by the pipeline workers
+        if '"in_reply_to_status_id"' in raw_data:
+            self.pipeline.put(raw_data)
+            return True
+
+        return super(SNPipelineStream, self).on_data(raw_data)
 
     def on_status(self, status):
-        """Add loaded tweet status to the queue of incoming tweet to be
+        """Add loaded tweet status to the pipeline of incoming tweets to be
         processed."""
-        try:
-            # logger.debug(f"Adding tweet {status.id_str} to processing queue.")
-            self.processing_queue.put(status._json)
-        except queue.Full as e:
-            logger.error(f"Error: {e}, queue size: {self.processing_queue.qsize()}.")
-            raise e
+        self.pipeline.put(status._json)
 
         return True
 
+    def stats(self) -> dict:
+        """Get throughput and lag metrics of each stage of the pipeline."""
+        return self.pipeline.stats()
+
+    def close(self):
+        """Process all incoming tweets, then flush the database buffers."""
+        self.pipeline.close()
+        if self._overflow_sink:
+            self._overflow_sink.close()
+        if self.output_file:
+            # shared with the next listeners, e.g. after reconnections
+            self.output_file.flush(fsync=True)
+        if self.db_conn:
+            self.db_conn.flush_content()
+
     def keep_alive(self):
         """Called when a keep-alive arrived"""
         return
 
     def dump_processing_queue_content(self):
-        tweets = []
-        while not self.processing_queue.empty():
-            try:
-                tweets.append(self.processing_queue.get_nowait())
-            except queue.Empty as e:
-                logger.error(e)
-
-        with open("emergency_tweet_queue_dump.json", "w") as f:
-            json.dump(tweets, f)
+        """Dump tweets still waiting to be parsed, one tweet per line."""
+        dump_file = f"emergency_tweet_queue_dump_{int(time.time())}.jsonl"
+        with open(dump_file, "a") as f:
+            for tweet in self.pipeline.stages[0].drain():
+                if isinstance(tweet, bytes):
+                    tweet = tweet.decode("utf-8")
+                if isinstance(tweet, str):
+                    f.write(tweet.strip() + "\n")
+                else:
+                    f.write(json.dumps(tweet) + "\n")
+
+    def close_or_dump(self):
+        """Close the listener, dumping the tweets still queued if closing fails."""
+        try:
+            self.close()
+        except Exception as e:
+            logger.error(f"Failed to close the stream listener: {e}.")
+            self.dump_processing_queue_content()
 
     def on_exception(self, exception):
         """Called when an unhandled exception occurs."""
-        # TODO: check if should perform following operation
-        try:
-            self.db_conn.flush_content()
-        except Exception as e:
-            pass
-        self.dump_processing_queue_content()
+        self.close_or_dump()
         logger.error(exception)
         raise Exception(exception)
 
     # TODO: implement sleeping so avoid getting
     def on_limit(self, track):
         """Called when a limitation notice arrives"""
-        try:
-            self.db_conn.flush_content()
-        except Exception as e:
-            pass
+        self.close_or_dump()
         error_msg = f"Reached credential limit {track}."
         logger.warning(error_msg)
         raise TimeoutError(error_msg)
 
     def on_error(self, status_code):
         """Called when a non-200 status code is returned"""
-        try:
-            self.db_conn.flush_content()
-        except Exception as e:
-            pass
+        self.close_or_dump()
         error_msg = f"Received error on Twitter stream with code: {status_code}."
         logger.error(error_msg)
         raise Exception(error_msg)
 
     def on_timeout(self):
         """Called when stream connection times out"""
-        try:
-            self.db.flush_content()
-        except Exception as e:
-            pass
+        self.close_or_dump()
         timeout_msg = "Twitter connection timed out."
         logger.error(timeout_msg)
         raise TimeoutError(timeout_msg)
@@ -237,10 +353,7 @@ class SNPipelineStream(tweepy.StreamListener):
         Disconnect codes are listed here:
         https://developer.twitter.com/en/docs/tweets/filter-realtime/guides/streaming-message-types
         """
-        try:
-            self.db_conn.flush_content()
-        except Exception as e:
-            pass
+        self.close_or_dump()
         disconnect_msg = f"Twitter client disconnecting with notice: {notice}."
         logger.error(disconnect_msg)
         raise Exception(disconnect_msg)
@@ -263,10 +376,10 @@ class SNPipelineStreamFuture(tweepy.Stream):
         # TODO: check if super init valid
         super(SNPipelineStreamFuture, self).__init__(**credentials)
         self.db_conn = db_conn
-        self.output_file = output_file
+        self.output_file = file_sink.get_sink(output_file) if output_file else None
 
-    def on_data(self, data: str):
-        tweet = json.loads(data)
+    def on_data(self, data: bytes):
+        tweet = fastjson.loads(data)
 
         if "id_str" not in tweet:
             return True
@@ -0,0 +1,526 @@
+import fcntl
+import json
+import threading
+import time
+from pathlib import Path
+
+import pymongo
+import tweepy
+from loguru import logger
+
+from tweepipe.utils import credentials as credentials_utils
+
+# requests per 15 minutes window of the v1.1 endpoints, with user authentication
+RATE_LIMIT_WINDOW = 15 * 60
+DEFAULT_RATE_LIMITS = {
+    "statuses/lookup": 900,
+    "statuses/user_timeline": 900,
+    "users/lookup": 900,
+    "search/tweets": 180,
+    "followers/ids": 15,
+    "friends/ids": 15,
+    "favorites/list": 75,
+}
+
+# endpoints of tweepy.API methods (tweepy 3 and 4 names)
+API_METHOD_ENDPOINTS = {
+    "statuses_lookup": "statuses/lookup",
+    "lookup_statuses": "statuses/lookup",
+    "user_timeline": "statuses/user_timeline",
+    "lookup_users": "users/lookup",
+    "search": "search/tweets",
+    "search_tweets": "search/tweets",
+    "followers_ids": "followers/ids",
+    "get_follower_ids": "followers/ids",
+    "friends_ids": "friends/ids",
+    "get_friend_ids": "friends/ids",
+    "favorites": "favorites/list",
+    "get_favorites": "favorites/list",
+}
+
+
+def get_credential_key(credential: dict) -> str:
+    """Identify a credential by its access token, user authentication rate limits
+    being counted per user token rather than per app, or by its consumer key for app
+    only credentials."""
+
+    return credential.get("access_token") or credential["consumer_key"]
+
+
+class TokenBucket:
+    """Request budget of a credential on an endpoint, refilled at the end of each
+    rate limit window, and corrected with the rate limit headers of responses.
+
+    :param limit: Number of requests per window.
+    :type limit: int
+    :param window: Duration of a window in seconds, defaults to RATE_LIMIT_WINDOW.
+    :type window: int, optional
+    """
+
+    def __init__(self, limit: int, window: int = RATE_LIMIT_WINDOW):
+        self.limit = limit
+        self.window = window
+        self.remaining = limit
+        self.reset_at = 0.0
+
+    def refill(self, now: float):
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.window
+
+    def try_acquire(self, now: float) -> bool:
+        self.refill(now)
+        if self.remaining <= 0:
+            return False
+
+        self.remaining -= 1
+        return True
+
+    def update(self, remaining: int, reset_at: float):
+        self.remaining = remaining
+        self.reset_at = reset_at
+
+    def to_dict(self) -> dict:
+        return {"remaining": self.remaining, "reset_at": self.reset_at}
+
+    @classmethod
+    def from_dict(cls, d: dict, limit: int, window: int = RATE_LIMIT_WINDOW):
+        bucket = cls(limit, window=window)
+        bucket.update(d["remaining"], d["reset_at"])
+        return bucket
+
+
+class RateLimitState:
+    """Token buckets of credentials per endpoint, held in memory and shared by the
+    threads of a single process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def _get_bucket(self, key: str, endpoint: str, limit: int) -> TokenBucket:
+        if (key, endpoint) not in self._buckets:
+            self._buckets[(key, endpoint)] = TokenBucket(limit)
+        return self._buckets[(key, endpoint)]
+
+    def get_budgets(self, keys: list, endpoint: str, limit: int) -> dict:
+        """Get the remaining requests and reset date of each credential.
+
+        :param keys: Keys of the credentials, see get_credential_key.
+        :type keys: list
+        :param endpoint: Endpoint, e.g. "statuses/lookup".
+        :type endpoint: str
+        :param limit: Number of requests per window.
+        :type limit: int
+        :return: (remaining requests, reset date) tuples per key.
+        :rtype: dict
+        """
+
+        now = time.time()
+        with self._lock:
+            budgets = {}
+            for key in keys:
+                bucket = self._get_bucket(key, endpoint, limit)
+                bucket.refill(now)
+                budgets[key] = (bucket.remaining, bucket.reset_at)
+            return budgets
+
+    def try_acquire(self, key: str, endpoint: str, limit: int) -> bool:
+        """Take a request from the budget of a credential."""
+
+        with self._lock:
+            return self._get_bucket(key, endpoint, limit).try_acquire(time.time())
+
+    def update(self, key: str, endpoint: str, limit: int, remaining: int, reset_at):
+        """Set the budget of a credential from the rate limit headers."""
+
+        with self._lock:
+            self._get_bucket(key, endpoint, limit).update(remaining, reset_at)
+
+
+class FileRateLimitState(RateLimitState):
+    """Token buckets kept in a json file, locked while being updated, shared by the
+    processes of a single host.
+
+    :param path: Path to the state file.
+    :type path: str
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.touch(exist_ok=True)
+
+    def _transaction(self, fn):
+        with self._lock, open(self.path, "r+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                content = f.read()
+                state = json.loads(content) if content else {}
+                result = fn(state)
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+                f.flush()
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _get_bucket_from_state(state, key, endpoint, limit) -> TokenBucket:
+        d = state.get(key, {}).get(endpoint)
+        return TokenBucket.from_dict(d, limit) if d else TokenBucket(limit)
+
+    @staticmethod
+    def _set_bucket_to_state(state, key, endpoint, bucket: TokenBucket):
+        state.setdefault(key, {})[endpoint] = bucket.to_dict()
+
+    def get_budgets(self, keys: list, endpoint: str, limit: int) -> dict:
+        now = time.time()
+
+        def fn(state):
+            budgets = {}
+            for key in keys:
+                bucket = self._get_bucket_from_state(state, key, endpoint, limit)
+                bucket.refill(now)
+                self._set_bucket_to_state(state, key, endpoint, bucket)
+                budgets[key] = (bucket.remaining, bucket.reset_at)
+            return budgets
+
+        return self._transaction(fn)
+
+    def try_acquire(self, key: str, endpoint: str, limit: int) -> bool:
+        now = time.time()
+
+        def fn(state):
+            bucket = self._get_bucket_from_state(state, key, endpoint, limit)
+            acquired = bucket.try_acquire(now)
+            self._set_bucket_to_state(state, key, endpoint, bucket)
+            return acquired
+
+        return self._transaction(fn)
+
+    def update(self, key: str, endpoint: str, limit: int, remaining: int, reset_at):
+        def fn(state):
+            bucket = TokenBucket(limit)
+            bucket.update(remaining, reset_at)
+            self._set_bucket_to_state(state, key, endpoint, bucket)
+
+        self._transaction(fn)
+
+
+class MongoRateLimitState(RateLimitState):
+    """Token buckets kept as counters of the credential documents of the `api`
+    collection, under `rate_limits.<endpoint>`, shared by all processes using the
+    same database. Requests are taken with atomic decrements. Credentials must be
+    stored in the collection.
+
+    :param collection: Collection of the credentials.
+    :type collection: pymongo.collection.Collection
+    :param key_field: Field of the credential documents holding the credential keys,
+        defaults to "access_token".
+    :type key_field: str, optional
+    """
+
+    def __init__(
+        self, collection: pymongo.collection.Collection, key_field: str = "access_token"
+    ):
+        super().__init__()
+        self.collection = collection
+        self.key_field = key_field
+
+    @staticmethod
+    def _get_field(endpoint: str) -> str:
+        return f"rate_limits.{endpoint}"
+
+    def _refill(self, keys: list, endpoint: str, limit: int, now: float):
+        field = self._get_field(endpoint)
+        self.collection.update_many(
+            {
+                self.key_field: {"$in": keys},
+                "$or": [
+                    {f"{field}.reset_at": {"$lte": now}},
+                    {f"{field}.reset_at": {"$exists": False}},
+                ],
+            },
+            {
+                "$set": {
+                    f"{field}.remaining": limit,
+                    f"{field}.reset_at": now + RATE_LIMIT_WINDOW,
+                }
+            },
+        )
+
+    def get_budgets(self, keys: list, endpoint: str, limit: int) -> dict:
+        now = time.time()
+        self._refill(keys, endpoint, limit, now)
+
+        field = self._get_field(endpoint)
+        budgets = {}
+        for doc in self.collection.find(
+            {self.key_field: {"$in": keys}}, projection={self.key_field: 1, field: 1}
+        ):
+            bucket = doc.get("rate_limits", {}).get(endpoint, {})
+            budgets[doc[self.key_field]] = (
+                bucket.get("remaining", limit),
+                bucket.get("reset_at", now),
+            )
+
+        return budgets
+
+    def try_acquire(self, key: str, endpoint: str, limit: int) -> bool:
+        now = time.time()
+        self._refill([key], endpoint, limit, now)
+
+        field = self._get_field(endpoint)
+        result = self.collection.update_one(
+            {self.key_field: key, f"{field}.remaining": {"$gt": 0}},
+            {"$inc": {f"{field}.remaining": -1}},
+        )
+
+        return result.modified_count == 1
+
+    def update(self, key: str, endpoint: str, limit: int, remaining: int, reset_at):
+        field = self._get_field(endpoint)
+        self.collection.update_one(
+            {self.key_field: key},
+            {"$set": {f"{field}.remaining": remaining, f"{field}.reset_at": reset_at}},
+        )
+
+
+class CredentialPool:
+    """Pool of API credentials dispatching each request to the credential with the
+    largest remaining budget on the requested endpoint, so that a throttled
+    credential never holds up a worker while others still have budget. Budgets are
+    token buckets corrected with the `x-rate-limit-remaining/reset` response headers,
+    kept in a state shared by threads, processes (file state) or hosts (mongo state).
+
+    Credentials are identified by their access token (see get_credential_key), and
+    each request in flight gets its own tweepy.API object, for the rate limit headers
+    of its response not to be mixed up with those of concurrent requests. Once all
+    credentials are exhausted, requests wait for the earliest reset.
+
+    :param twitter_credentials: Credentials, holding at least a consumer key and
+        secret.
+    :type twitter_credentials: list
+    :param state: Shared token buckets, defaults to an in-memory state.
+    :type state: RateLimitState, optional
+    :param rate_limits: Number of requests per window of each endpoint, defaults to
+        DEFAULT_RATE_LIMITS.
+    :type rate_limits: dict, optional
+    """
+
+    def __init__(
+        self,
+        twitter_credentials: list,
+        state: RateLimitState = None,
+        rate_limits: dict = None,
+    ):
+        if not twitter_credentials:
+            raise RuntimeError("No credentials provided.")
+
+        self.state = state if state else RateLimitState()
+        self.rate_limits = {**DEFAULT_RATE_LIMITS, **(rate_limits or {})}
+
+        self.credentials = {
+            get_credential_key(credential): credential
+            for credential in twitter_credentials
+        }
+        self.keys = list(self.credentials)
+
+        self._lock = threading.Lock()
+        self.request_counts = {key: 0 for key in self.keys}
+
+        # idle API objects per credential, see _checkout_api
+        self._idle_apis = {key: [] for key in self.keys}
+
+    def acquire(self, endpoint: str) -> str:
+        """Take a request from the budget of the credential with the largest budget,
+        waiting for the earliest reset if all credentials are exhausted.
+
+        :param endpoint: Endpoint, e.g. "statuses/lookup".
+        :type endpoint: str
+        :return: Key of the credential.
+        :rtype: str
+        """
+
+        limit = self.rate_limits[endpoint]
+        while True:
+            budgets = self.state.get_budgets(self.keys, endpoint, limit)
+            if not budgets:
+                raise RuntimeError(f"No budget found for credentials on {endpoint}.")
+
+            available_keys = sorted(
+                (key for key in budgets if budgets[key][0] > 0),
+                key=lambda k: budgets[k][0],
+                reverse=True,
+            )
+            for key in available_keys:
+                if self.state.try_acquire(key, endpoint, limit):
+                    with self._lock:
+                        self.request_counts[key] += 1
+                    return key
+
+            if available_keys:
+                # budgets taken by concurrent workers in the meantime, only waiting
+                # once all of them are exhausted
+                continue
+
+            wait = min(reset_at for _, reset_at in budgets.values()) - time.time()
+            wait = max(wait, 1.0)
+            logger.warning(
+                f"All {len(self.keys)} credentials exhausted on {endpoint}, waiting {wait:.0f} seconds."
+            )
+            time.sleep(wait)
+
+    def _checkout_api(self, key: str) -> tweepy.API:
+        """Get an API object of a credential not used by any other request."""
+
+        with self._lock:
+            if self._idle_apis[key]:
+                return self._idle_apis[key].pop()
+
+        # rate limits are handled by the pool rather than by tweepy
+        return tweepy.API(
+            credentials_utils._get_twitter_auth(self.credentials[key]),
+            wait_on_rate_limit=False,
+        )
+
+    def _checkin_api(self, key: str, api: tweepy.API):
+        with self._lock:
+            self._idle_apis[key].append(api)
+
+    def _update_from_response(self, key: str, endpoint: str, api: tweepy.API):
+        response = getattr(api, "last_response", None)
+        headers = getattr(response, "headers", None)
+        if not headers or "x-rate-limit-remaining" not in headers:
+            return
+
+        self.state.update(
+            key,
+            endpoint,
+            self.rate_limits[endpoint],
+            int(headers["x-rate-limit-remaining"]),
+            float(headers["x-rate-limit-reset"]),
+        )
+
+    def call(self, endpoint: str, method: str, *args, **kwargs):
+        """Call an API method with the credential with the largest budget, retrying
+        with another credential when rate limited.
+
+        :param endpoint: Endpoint of the method, e.g. "statuses/lookup".
+        :type endpoint: str
+        :param method: Name of the tweepy.API method, e.g. "statuses_lookup".
+        :type method: str
+        :return: Result of the method.
+        """
+
+        while True:
+            key = self.acquire(endpoint)
+            api = self._checkout_api(key)
+            try:
+                result = getattr(api, method)(*args, **kwargs)
+            except Exception as e:
+                response = getattr(e, "response", None)
+                if getattr(response, "status_code", None) != 429:
+                    raise
+
+                # budget out of sync, e.g. with requests made outside of the pool
+                reset_at = float(
+                    response.headers.get(
+                        "x-rate-limit-reset", time.time() + RATE_LIMIT_WINDOW
+                    )
+                )
+                self.state.update(
+                    key, endpoint, self.rate_limits[endpoint], 0, reset_at
+                )
+                continue
+            else:
+                self._update_from_response(key, endpoint, api)
+                return result
+            finally:
+                self._checkin_api(key, api)
+
+    def get_api(self) -> "PooledAPI":
+        """Get an object exposing the rate limited tweepy.API methods, e.g.
+        `statuses_lookup`, dispatched by the pool."""
+
+        return PooledAPI(self)
+
+    def stats(self) -> dict:
+        """Get the number of requests dispatched to each credential."""
+
+        with self._lock:
+            return dict(self.request_counts)
+
+
+class PooledAPI:
+    """Drop-in replacement of tweepy.API for the methods of API_METHOD_ENDPOINTS,
+    each call being dispatched by a credential pool.
+
+    :param pool: Credential pool.
+    :type pool: CredentialPool
+    """
+
+    def __init__(self, pool: CredentialPool):
+        self.pool = pool
+
+    def __getattr__(self, method: str):
+        if method not in API_METHOD_ENDPOINTS:
+            raise AttributeError(f"{method} is not dispatched by credential pools.")
+
+        endpoint = API_METHOD_ENDPOINTS[method]
+
+        def call(*args, **kwargs):
+            return self.pool.call(endpoint, method, *args, **kwargs)
+
+        return call
+
+
+def get_credential_pool(
+    db_conn=None,
+    purpose: str = "any",
+    api_count: int = -1,
+    twitter_credentials: list = None,
+    shared_state: str = None,
+    state_file: str = ".rate_limits.json",
+) -> CredentialPool:
+    """Build a credential pool from given credentials, or from credentials retrieved
+    from the database.
+
+    :param db_conn: Database client, defaults to None.
+    :type db_conn: db_client.DBClient, optional
+    :param purpose: Use case of the credentials, defaults to "any".
+    :type purpose: str, optional
+    :param api_count: Number of credentials retrieved, defaults to -1 (all).
+    :type api_count: int, optional
+    :param twitter_credentials: Credentials, defaults to None.
+    :type twitter_credentials: list, optional
+    :param shared_state: Budgets shared between processes, either None (in memory,
+        single process), "file" (processes of a host) or "mongo" (credentials of the
+        `api` collection), defaults to None.
+    :type shared_state: str, optional
+    :param state_file: Path to the file state, defaults to ".rate_limits.json".
+    :type state_file: str, optional
+    :return: Credential pool.
+    :rtype: CredentialPool
+    """
+
+    if not twitter_credentials and db_conn:
+        twitter_credentials = credentials_utils._get_twitter_credentials(
+            db_conn, api_count=api_count, purpose=purpose
+        )
+
+    if shared_state == "mongo":
+        if not db_conn:
+            raise RuntimeError("A database connection is required by the mongo state.")
+        state = MongoRateLimitState(db_conn._get_collection("api", db_name="api"))
+    elif shared_state == "file":
+        state = FileRateLimitState(state_file)
+    elif shared_state is None:
+        state = RateLimitState()
+    else:
+        raise ValueError("Shared state must be either None, 'file' or 'mongo'.")
+
+    return CredentialPool(twitter_credentials, state=state)
@@ -0,0 +1,73 @@
+import json
+from typing import IO, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# decoder picked once at import, orjson being several times faster than json
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+if orjson is not None:
+
+    def loads(data: Union[str, bytes, bytearray, memoryview]):
+        """Decode a json document, raw bytes being decoded without an intermediate
+        str.
+
+        :param data: Raw json document.
+        :type data: Union[str, bytes, bytearray, memoryview]
+        :return: Decoded document.
+        :raises json.JSONDecodeError: If the document is not valid json.
+        """
+
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson rejects a few documents json accepts, e.g. NaN or Infinity,
+            # let json decode (or reject) them
+            return json.loads(data)
+
+else:
+
+    def loads(data: Union[str, bytes, bytearray, memoryview]):
+        """Decode a json document, raw bytes being decoded without an intermediate
+        str.
+
+        :param data: Raw json document.
+        :type data: Union[str, bytes, bytearray, memoryview]
+        :return: Decoded document.
+        :raises json.JSONDecodeError: If the document is not valid json.
+        """
+
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+
+        # json detects the encoding of bytes itself
+        return json.loads(data)
+
+
+def load(fp: IO):
+    """Decode the json document of a file, preferably opened in binary mode.
+
+    :param fp: Open file.
+    :type fp: IO
+    :return: Decoded document.
+    """
+
+    return loads(fp.read())
+
+
+def iter_lines(fp: IO):
+    """Decode the documents of a jsonl file, preferably opened in binary mode, blank
+    lines being skipped.
+
+    :param fp: Open file.
+    :type fp: IO
+    :return: Iterator over decoded documents.
+    """
+
+    for line in fp:
+        if line.strip():
+            yield loads(line)
@@ -0,0 +1,334 @@
+import atexit
+import datetime
+import gzip
+import json
+import os
+import signal
+import threading
+import time
+import weakref
+from pathlib import Path
+
+import bson
+
+COMPRESSION_EXTENSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+# sinks closed upon interpreter exit, see close_on_exit
+_EXIT_SINKS = weakref.WeakSet()
+_exit_hooks_installed = False
+_signal_handler_installed = False
+
+# sinks shared by the writers of the same output file, see get_sink
+_PATH_SINKS = {}
+_path_sinks_lock = threading.Lock()
+
+
+def _to_extended_json(value):
+    """Serialize values json cannot handle as mongo extended json, so that the
+    files can later be loaded with mongoimport."""
+
+    if isinstance(value, datetime.datetime):
+        return {"$date": value.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"}
+    if isinstance(value, bson.objectid.ObjectId):
+        return {"$oid": str(value)}
+
+    return str(value)
+
+
+def dumps(doc: dict) -> str:
+    """Serialize a document to a single json line."""
+
+    return json.dumps(doc, default=_to_extended_json)
+
+
+def _close_exit_sinks():
+    for sink in list(_EXIT_SINKS):
+        try:
+            sink.close()
+        except Exception:
+            pass
+
+
+def _raise_system_exit(signum, frame):
+    # unwind the main thread like SIGINT does, so that buffers are flushed by the
+    # exit hooks rather than from within the signal handler
+    raise SystemExit(128 + signum)
+
+
+def close_on_exit(sink: "FileSink", handle_signals: bool = False):
+    """Flush and close a sink upon interpreter exit, including on SIGINT. Processes
+    owning their signal handling (e.g. long running streams) may opt in for SIGTERM
+    to be turned into a SystemExit as well, unless another handler was set already.
+
+    :param sink: Sink to be closed.
+    :type sink: FileSink
+    :param handle_signals: Whether to handle SIGTERM, defaults to False.
+    :type handle_signals: bool, optional
+    """
+
+    global _exit_hooks_installed, _signal_handler_installed
+
+    _EXIT_SINKS.add(sink)
+    if not _exit_hooks_installed:
+        atexit.register(_close_exit_sinks)
+        _exit_hooks_installed = True
+
+    # signal handlers can only be set from the main thread
+    if (
+        handle_signals
+        and not _signal_handler_installed
+        and threading.current_thread() is threading.main_thread()
+    ):
+        if signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+            signal.signal(signal.SIGTERM, _raise_system_exit)
+        _signal_handler_installed = True
+
+
+class FileSink:
+    """Buffered writer of jsonl documents to rotating, optionally compressed files.
+    Files are named `<prefix>-<timestamp>-<sequence>.jsonl[.gz|.zst]` in the output
+    directory, a new file being started once the current one holds `max_file_bytes`
+    (uncompressed) or is older than `max_file_age` seconds. Given a `filename`,
+    documents are rather all written to that single file, without rotation. Files
+    are opened in append mode, compressed files simply gaining a new gzip member or
+    zstd frame.
+
+    Zstd compression requires the zstandard package.
+
+    :param directory: Output directory of the files.
+    :type directory: str
+    :param prefix: Prefix of the file names, defaults to "part".
+    :type prefix: str, optional
+    :param compression: Either None, "gzip" or "zstd", defaults to "gzip".
+    :type compression: str, optional
+    :param max_file_bytes: Size of the files triggering rotation, defaults to 256MB.
+    :type max_file_bytes: int, optional
+    :param max_file_age: Age in seconds of the files triggering rotation, defaults to
+        None (no limit).
+    :type max_file_age: float, optional
+    :param buffer_size: Size of the write buffer, defaults to 1MB.
+    :type buffer_size: int, optional
+    :param fsync_interval: Minimum number of seconds between two syncs of the current
+        file to disk, defaults to None (left to the OS).
+    :type fsync_interval: float, optional
+    :param filename: Name of the single file written to, disabling rotation, defaults
+        to None.
+    :type filename: str, optional
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        prefix: str = "part",
+        compression: str = "gzip",
+        max_file_bytes: int = 256 * 1024 * 1024,
+        max_file_age: float = None,
+        buffer_size: int = 1024 * 1024,
+        fsync_interval: float = None,
+        filename: str = None,
+    ):
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(
+                f"Unsupported compression, choose among {list(COMPRESSION_EXTENSIONS)}."
+            )
+        if compression == "zstd":
+            # fail early rather than upon the first write
+            import zstandard
+
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.prefix = prefix
+        self.compression = compression
+        self.max_file_bytes = max_file_bytes
+        self.max_file_age = max_file_age
+        self.buffer_size = buffer_size
+        self.fsync_interval = fsync_interval
+        self.filename = filename
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._raw_file = None
+        self._file_bytes = 0
+        self._file_opened_at = None
+        self._synced_at = None
+        self._sequence = 0
+        self.filepaths = []
+
+    @classmethod
+    def from_path(cls, path: str, rotate: bool = False, **kwargs) -> "FileSink":
+        """Create a sink writing to a given output file. With rotation, it rather
+        writes next to it, e.g. "out/tweets.jsonl.gz" being written to
+        "out/tweets-<timestamp>-<sequence>.jsonl.gz" files. The compression is
+        inferred from the file extension, unless set explicitly.
+
+        :param path: Output file.
+        :type path: str
+        :param rotate: Whether to rotate files, defaults to False.
+        :type rotate: bool, optional
+        :return: File sink.
+        :rtype: FileSink
+        """
+
+        path = Path(path)
+        filename = path.name
+        compression = None
+        for name, extension in COMPRESSION_EXTENSIONS.items():
+            if extension and path.suffix == extension:
+                compression = name
+                path = path.with_suffix("")
+
+        # "tweets.json", "tweets.jsonl" and "tweets" all share the same prefix
+        prefix = path.stem if path.suffix in (".json", ".jsonl") else path.name
+        kwargs.setdefault("compression", compression)
+        if not rotate:
+            kwargs["filename"] = filename
+
+        return cls(directory=path.parent, prefix=prefix, **kwargs)
+
+    def _get_next_filepath(self) -> Path:
+        if self.filename:
+            return self.directory.joinpath(self.filename)
+
+        self._sequence += 1
+        timestamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        extension = ".jsonl" + COMPRESSION_EXTENSIONS[self.compression]
+
+        return self.directory.joinpath(
+            f"{self.prefix}-{timestamp}-{self._sequence:05d}{extension}"
+        )
+
+    def _open(self):
+        filepath = self._get_next_filepath()
+        self._raw_file = open(filepath, "ab", buffering=self.buffer_size)
+        if self.compression == "gzip":
+            self._file = gzip.GzipFile(
+                fileobj=self._raw_file, mode="wb", compresslevel=6
+            )
+        elif self.compression == "zstd":
+            import zstandard
+
+            self._file = zstandard.ZstdCompressor(level=3).stream_writer(
+                self._raw_file, closefd=False
+            )
+        else:
+            self._file = self._raw_file
+
+        self._file_bytes = 0
+        self._file_opened_at = time.monotonic()
+        self._synced_at = self._file_opened_at
+        self.filepaths.append(filepath)
+
+    def _sync(self):
+        self._file.flush()
+        if self._raw_file is not self._file:
+            self._raw_file.flush()
+        os.fsync(self._raw_file.fileno())
+        self._synced_at = time.monotonic()
+
+    def _close_file(self):
+        if self._file is None:
+            return
+
+        if self.fsync_interval is not None:
+            self._sync()
+        self._file.close()
+        if self._raw_file is not self._file:
+            self._raw_file.close()
+        self._file = None
+        self._raw_file = None
+
+    def _should_rotate(self) -> bool:
+        if self.filename:
+            return False
+        if self.max_file_bytes and self._file_bytes >= self.max_file_bytes:
+            return True
+        if (
+            self.max_file_age is not None
+            and time.monotonic() - self._file_opened_at >= self.max_file_age
+        ):
+            return True
+
+        return False
+
+    def write_lines(self, lines: list):
+        """Write serialized json lines.
+
+        :param lines: Lines to write, without line breaks.
+        :type lines: list
+        """
+
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        with self._lock:
+            if self._file is None or self._should_rotate():
+                self._close_file()
+                self._open()
+
+            self._file.write(data)
+            self._file_bytes += len(data)
+
+            if (
+                self.fsync_interval is not None
+                and time.monotonic() - self._synced_at >= self.fsync_interval
+            ):
+                self._sync()
+
+    def write(self, doc: dict):
+        """Write a single document."""
+
+        self.write_lines([dumps(doc)])
+
+    def write_many(self, docs: list):
+        """Write a list of documents."""
+
+        if docs:
+            self.write_lines([dumps(doc) for doc in docs])
+
+    def rotate(self):
+        """Close the current file, the next write starting a new one."""
+
+        with self._lock:
+            self._close_file()
+
+    def flush(self, fsync: bool = False):
+        """Flush buffered data to the current file.
+
+        :param fsync: Whether to sync the file to disk as well, defaults to False.
+        :type fsync: bool, optional
+        """
+
+        with self._lock:
+            if self._file is None:
+                return
+            if fsync:
+                self._sync()
+            else:
+                self._file.flush()
+                if self._raw_file is not self._file:
+                    self._raw_file.flush()
+
+    def close(self):
+        """Flush and close the current file."""
+
+        self.rotate()
+
+
+def get_sink(path: str, handle_signals: bool = False, **kwargs) -> FileSink:
+    """Get the sink shared by all writers of an output file, created with
+    FileSink.from_path upon first use and closed upon exit.
+
+    :param path: Output file.
+    :type path: str
+    :param handle_signals: Whether to close the sink on SIGTERM as well, see
+        close_on_exit, defaults to False.
+    :type handle_signals: bool, optional
+    :return: File sink.
+    :rtype: FileSink
+    """
+
+    key = os.path.abspath(path)
+    with _path_sinks_lock:
+        if key not in _PATH_SINKS:
+            _PATH_SINKS[key] = FileSink.from_path(path, **kwargs)
+        close_on_exit(_PATH_SINKS[key], handle_signals=handle_signals)
+
+        return _PATH_SINKS[key]
@@ -0,0 +1,192 @@
+from collections import deque
+from typing import Union
+
+# joins the texts scanned at once, keywords never spanning two texts
+TEXT_SEPARATOR = "\x00"
+
+# length of the n-grams of keyword indexes
+NGRAM_SIZE = 3
+
+
+def normalize(text: str) -> str:
+    """Normalize a text or keyword for matching: lowercase, without surrounding
+    whitespaces, and with katakana prolonged sound marks read as hyphens."""
+
+    return text.strip().lower().replace("ー", "-")
+
+
+def get_tweet_texts(tweet: dict, search_field: str = "text") -> list:
+    """Texts of a tweet and of its quoted and retweeted tweets, searched for keywords.
+
+    :param tweet: Raw tweet.
+    :type tweet: dict
+    :param search_field: Field holding the text, defaults to "text".
+    :type search_field: str, optional
+    :return: Raw texts.
+    :rtype: list
+    """
+
+    texts = []
+    if "quoted_status" in tweet:
+        texts.append(tweet["quoted_status"][search_field])
+    if "retweeted_status" in tweet:
+        if "quoted_status" in tweet["retweeted_status"]:
+            texts.append(tweet["retweeted_status"]["quoted_status"][search_field])
+        texts.append(tweet["retweeted_status"][search_field])
+    texts.append(tweet[search_field])
+
+    return texts
+
+
+def get_text_projection(search_field: str = "text") -> dict:
+    """Projection of the fields of stored tweet documents read by get_tweet_texts."""
+
+    return {
+        "_id": 1,
+        f"json.{search_field}": 1,
+        f"json.quoted_status.{search_field}": 1,
+        f"json.retweeted_status.{search_field}": 1,
+        f"json.retweeted_status.quoted_status.{search_field}": 1,
+    }
+
+
+def get_ngrams(text: Union[str, list], n: int = NGRAM_SIZE) -> set:
+    """Get the distinct n-grams of a normalized text, or of a list of texts. Any
+    keyword contained in a text has all of its n-grams in the n-grams of the text.
+
+    :param text: Raw text or texts, normalized first.
+    :type text: Union[str, list]
+    :param n: Length of the n-grams, defaults to NGRAM_SIZE.
+    :type n: int, optional
+    :return: N-grams.
+    :rtype: set
+    """
+
+    texts = [text] if isinstance(text, str) else text
+    ngrams = set()
+    for t in texts:
+        t = normalize(t)
+        ngrams.update(t[i : i + n] for i in range(len(t) - n + 1))
+
+    return ngrams
+
+
+class KeywordMatcher:
+    """Aho–Corasick automaton matching a set of keywords as substrings of texts,
+    scanning each text once whatever the number of keywords. Keywords and texts are
+    normalized the same way as by searching.is_tweet_related.
+
+    The automaton is built once, e.g. per search job, and reused for all texts.
+
+    :param keywords: Keywords to be matched.
+    :type keywords: list
+    """
+
+    def __init__(self, keywords: list):
+        self.keywords = list(keywords)
+
+        # trie transitions, failure links, and indices of the keywords ending at
+        # each state (including through failure links)
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [()]
+
+        normalized_keywords = {}
+        for keyword in self.keywords:
+            normalized_keywords.setdefault(normalize(keyword), []).append(keyword)
+        self._patterns = list(normalized_keywords.items())
+
+        for idx, (pattern, _) in enumerate(self._patterns):
+            self._add_pattern(pattern, idx)
+        self._build_failure_links()
+
+        # an empty keyword is contained in any text
+        self._match_all = bool(self._outputs[0])
+
+    def _add_pattern(self, pattern: str, idx: int):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append(())
+            state = next_state
+
+        self._outputs[state] = self._outputs[state] + (idx,)
+
+    def _build_failure_links(self):
+        # breadth first, failure links pointing to shallower states
+        states = deque(self._goto[0].values())
+        while states:
+            state = states.popleft()
+            for char, next_state in self._goto[state].items():
+                states.append(next_state)
+
+                fail_state = self._fail[state]
+                while fail_state and char not in self._goto[fail_state]:
+                    fail_state = self._fail[fail_state]
+                fail_state = self._goto[fail_state].get(char, 0)
+                if fail_state == next_state:
+                    fail_state = 0
+
+                self._fail[next_state] = fail_state
+                self._outputs[next_state] = (
+                    self._outputs[next_state] + self._outputs[fail_state]
+                )
+
+    def _iter_matches(self, text: str):
+        """Iterate over the indices of the patterns found in a normalized text."""
+
+        if self._match_all:
+            yield from self._outputs[0]
+
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if outputs[state]:
+                yield from outputs[state]
+
+    @staticmethod
+    def _normalize(text: Union[str, list]) -> str:
+        if isinstance(text, str):
+            return normalize(text)
+
+        return TEXT_SEPARATOR.join(normalize(t) for t in text)
+
+    def search(self, text: Union[str, list]) -> bool:
+        """Whether a text, or any of a list of texts, contains any of the keywords.
+
+        :param text: Raw text or texts, normalized by the matcher.
+        :type text: Union[str, list]
+        :return: Whether a keyword was found.
+        :rtype: bool
+        """
+
+        for _ in self._iter_matches(self._normalize(text)):
+            return True
+
+        return False
+
+    def find(self, text: Union[str, list]) -> set:
+        """Find the keywords contained in a text, or in any of a list of texts.
+
+        :param text: Raw text or texts, normalized by the matcher.
+        :type text: Union[str, list]
+        :return: Keywords found, as passed to the matcher.
+        :rtype: set
+        """
+
+        matched = set()
+        for idx in set(self._iter_matches(self._normalize(text))):
+            matched.update(self._patterns[idx][1])
+
+        return matched
+
+    def __len__(self) -> int:
+        return len(self.keywords)
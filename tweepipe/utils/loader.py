@@ -1,3 +1,4 @@
+import itertools
 import json
 import pickle
 import math
@@ -7,7 +8,7 @@ from loguru import logger
 
 from tweepipe import settings
 from tweepipe.db import db_client
-from tweepipe.utils import errors
+from tweepipe.utils import errors, fastjson, tid_queue
 
 
 def _save_to_json(content=None, output_file=None, mode="w"):
@@ -95,7 +96,10 @@ def load_tids_from_file_to_db(files: list, batch_size: int, env_file: str, issue
 
     for idx, filepath in enumerate(files):
         tids = _load_from_file(str(filepath))
-        tid_docs = [{"tid": tid, "status": 0, "file": str(filepath)} for tid in tids]
+        tid_docs = [
+            {"tid": tid, "tid_int": int(tid), "status": 0, "file": str(filepath)}
+            for tid in tids
+        ]
 
         # insert all tids in batches of size batch_size
         for i in range(0, len(tid_docs), batch_size):
@@ -104,8 +108,28 @@ def load_tids_from_file_to_db(files: list, batch_size: int, env_file: str, issue
         if idx % 255 == 0:
             logger.info(f"Done with {idx+1}/{len(files)} files.")
 
-    if len(db_conn.hydrating_tids_batch) > 0:
-        db_conn._push_hydrating_tids_to_db()
+    db_conn._push_bulk_data("hydrating_tids")
+
+
+def load_tids_from_file_to_queue(files: list, queue_path: str) -> int:
+    """
+    Load tids to a local work queue for hydration, instead of the database.
+
+    Args:
+        files (list): Files of tweet ids to load from.
+        queue_path (str): Directory of the tid_queue.TidQueue.
+
+    Returns:
+        int: Number of loaded tids.
+    """
+    queue = tid_queue.TidQueue(queue_path)
+    tids = itertools.chain.from_iterable(
+        _load_from_file(str(filepath)) for filepath in files
+    )
+    tid_count = queue.add(tids)
+    logger.info(f"Loaded {tid_count} tids from {len(files)} files to {queue_path}.")
+
+    return tid_count
 
 
 def load_tids_to_db(
@@ -126,24 +150,27 @@ def load_tids_to_db(
 
     for i in range(0, len(tids), batch_size):
         tid_docs_batch = [
-            {"tid": tid, "status": 0, "file": str(filepath), "key": keys[i % nkeys]}
+            {
+                "tid": tid,
+                "tid_int": int(tid),
+                "status": 0,
+                "file": str(filepath),
+                "key": keys[i % nkeys],
+            }
             for tid in tids[i : i + batch_size]
         ]
         db_conn.add_hydrating_tids(tid_docs_batch)
 
-    if len(db_conn.hydrating_tids_batch) > 0:
-        db_conn._push_hydrating_tids_to_db()
+    db_conn._push_bulk_data("hydrating_tids")
 
 
 def _load_from_file(file):
     if file.endswith(".json"):
-        with open(file, "r") as f:
-            elements = json.load(f)
+        with open(file, "rb") as f:
+            elements = fastjson.load(f)
     elif file.endswith(".jsonl"):
-        elements = []
-        with open(file, "r") as f:
-            for line in f:
-                elements.append(json.loads(line))
+        with open(file, "rb") as f:
+            elements = list(fastjson.iter_lines(f))
     elif file.endswith(".pkl"):
         with open(file, "rb") as f:
             elements = pickle.load(f)
@@ -2,6 +2,7 @@ import datetime
 import copy
 
 from tweepipe import settings
+from tweepipe.utils import timestamps
 from tweepipe.utils.migration.mapping import (
     DataMapping,
     HashableID,
@@ -44,9 +45,7 @@ class UserV2(HashableID, DataMapping):
 
         self.created_at = data.get("created_at")
         if self.created_at is not None:
-            self.created_at = datetime.datetime.strptime(
-                self.created_at, "%Y-%m-%dT%H:%M:%S.%fZ"
-            )
+            self.created_at = timestamps.parse_academic_timestamp(self.created_at)
 
         self.description = data.get("description")
         self.entities = data.get("entities")
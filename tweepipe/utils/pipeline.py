@@ -0,0 +1,252 @@
+import queue
+import threading
+import time
+from typing import Callable
+
+from loguru import logger
+
+# behaviours of a stage whose queue is full
+OVERFLOW_POLICIES = ("block", "drop", "spill")
+
+
+class StageMetrics:
+    """Thread-safe counters on the items going through a stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.received_count = 0
+        self.processed_count = 0
+        self.error_count = 0
+        self.dropped_count = 0
+        self.spilled_count = 0
+        self.busy_seconds = 0.0
+        self.lag_sum = 0.0
+        self.max_lag = 0.0
+
+    def record_received(self):
+        with self._lock:
+            self.received_count += 1
+
+    def record_overflow(self, spilled: bool = False):
+        with self._lock:
+            if spilled:
+                self.spilled_count += 1
+            else:
+                self.dropped_count += 1
+
+    def record_processed(self, lag: float, duration: float, failed: bool = False):
+        with self._lock:
+            self.processed_count += 1
+            self.error_count += failed
+            self.busy_seconds += duration
+            self.lag_sum += lag
+            self.max_lag = max(self.max_lag, lag)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            elapsed = time.monotonic() - self.started_at
+            return {
+                "received": self.received_count,
+                "processed": self.processed_count,
+                "errors": self.error_count,
+                "dropped": self.dropped_count,
+                "spilled": self.spilled_count,
+                "throughput": self.processed_count / elapsed if elapsed else 0.0,
+                "busy_seconds": self.busy_seconds,
+                "mean_lag": (
+                    self.lag_sum / self.processed_count if self.processed_count else 0.0
+                ),
+                "max_lag": self.max_lag,
+            }
+
+
+class Stage:
+    """Step of a pipeline, processing items from a bounded queue with worker threads.
+
+    Workers block on the queue rather than polling it, so that items are processed as
+    soon as they come in. Results are handed over to the next stage, items for which
+    the stage function returns None are not passed on. Once the queue is full, new
+    items either block the producer, are dropped, or are handed to a spill function.
+
+    :param name: Name of the stage.
+    :type name: str
+    :param fn: Function processing a single item.
+    :type fn: Callable
+    :param worker_count: Number of worker threads, defaults to 1.
+    :type worker_count: int, optional
+    :param max_queue_size: Maximum number of items waiting to be processed, defaults
+        to 10000.
+    :type max_queue_size: int, optional
+    :param overflow: Behaviour once the queue is full, either "block", "drop" or
+        "spill", defaults to "block".
+    :type overflow: str, optional
+    :param spill_fn: Function called with items overflowing the queue, required with
+        the "spill" policy, defaults to None.
+    :type spill_fn: Callable, optional
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable,
+        worker_count: int = 1,
+        max_queue_size: int = 10000,
+        overflow: str = "block",
+        spill_fn: Callable = None,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Overflow policy must be one of {OVERFLOW_POLICIES}.")
+        if overflow == "spill" and spill_fn is None:
+            raise ValueError("A spill function is required with the spill policy.")
+
+        self.name = name
+        self.fn = fn
+        self.worker_count = max(1, worker_count)
+        self.overflow = overflow
+        self.spill_fn = spill_fn
+        self.metrics = StageMetrics()
+
+        self.next_stage = None
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._threads = []
+
+    def start(self, next_stage: "Stage" = None):
+        """Start the worker threads.
+
+        :param next_stage: Stage receiving the results, defaults to None.
+        :type next_stage: Stage, optional
+        """
+
+        self.next_stage = next_stage
+        self._threads = [
+            threading.Thread(
+                target=self._run, name=f"tweepipe-{self.name}-{i}", daemon=True
+            )
+            for i in range(self.worker_count)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self):
+        while True:
+            enqueued_at, item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+
+            start = time.monotonic()
+            failed = False
+            try:
+                result = self.fn(item)
+                if result is not None and self.next_stage is not None:
+                    self.next_stage.put(result)
+            except Exception as e:
+                failed = True
+                logger.error(f"Error in pipeline stage {self.name}: {e}.")
+            finally:
+                self.metrics.record_processed(
+                    lag=start - enqueued_at,
+                    duration=time.monotonic() - start,
+                    failed=failed,
+                )
+                self._queue.task_done()
+
+    def put(self, item) -> bool:
+        """Add an item to the queue of the stage, following the overflow policy once
+        the queue is full.
+
+        :param item: Item to be processed.
+        :return: Whether the item was queued.
+        :rtype: bool
+        """
+
+        self.metrics.record_received()
+        if self.overflow == "block":
+            self._queue.put((time.monotonic(), item))
+            return True
+
+        try:
+            self._queue.put_nowait((time.monotonic(), item))
+            return True
+        except queue.Full:
+            pass
+
+        self.metrics.record_overflow(spilled=self.overflow == "spill")
+        if self.overflow == "spill":
+            self.spill_fn(item)
+
+        return False
+
+    def drain(self) -> list:
+        """Remove and return the items still waiting in the queue."""
+
+        items = []
+        while True:
+            try:
+                _, item = self._queue.get_nowait()
+            except queue.Empty:
+                return items
+
+            self._queue.task_done()
+            if item is not None:
+                items.append(item)
+
+    def join(self):
+        """Wait until all queued items have been processed."""
+
+        self._queue.join()
+
+    def stop(self):
+        """Process all queued items, then stop the worker threads."""
+
+        for _ in self._threads:
+            self._queue.put((time.monotonic(), None))
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    @property
+    def queue_size(self) -> int:
+        """Number of items waiting to be processed."""
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        """Get the metrics of the stage, along with its current queue size."""
+
+        return {**self.metrics.to_dict(), "queue_size": self.queue_size}
+
+
+class Pipeline:
+    """Chain of stages, each stage feeding its results to the next one.
+
+    :param stages: Stages of the pipeline, in processing order.
+    :type stages: list
+    """
+
+    def __init__(self, stages: list):
+        self.stages = stages
+        for stage, next_stage in zip(stages, stages[1:] + [None]):
+            stage.start(next_stage=next_stage)
+
+    def put(self, item) -> bool:
+        """Add an item to the first stage of the pipeline."""
+
+        return self.stages[0].put(item)
+
+    def join(self):
+        """Wait until all items added so far went through the whole pipeline."""
+
+        for stage in self.stages:
+            stage.join()
+
+    def close(self):
+        """Process all items added so far, then stop all stages."""
+
+        for stage in self.stages:
+            stage.stop()
+
+    def stats(self) -> dict:
+        """Get the metrics of each stage."""
+
+        return {stage.name: stage.stats() for stage in self.stages}
@@ -3,9 +3,50 @@ from typing import Dict, Union
 
 from tweepipe import settings
 from tweepipe.db import db_client
+from tweepipe.utils import timestamps
 
 
 class BaseRelationParser:
+    # fields of the relations of each type, in the order of batch relation tuples
+    RELATION_FIELDS = {
+        "mentions": (
+            "user_id",
+            "mentionned_user_screen_name",
+            "mentionned_user_id",
+            "tid",
+            "created_at",
+            "user_screen_name",
+        ),
+        "hashtags": ("user_id", "hashtag", "tid", "created_at", "user_screen_name"),
+        "retweets": (
+            "user_id",
+            "retweeted_user_id",
+            "retweeted_user_screen_name",
+            "retweet_id",
+            "tid",
+            "created_at",
+            "user_screen_name",
+        ),
+        "replies": (
+            "in_reply_to_user_id",
+            "in_reply_to_screen_name",
+            "created_at",
+            "user_id",
+            "tid",
+            "user_screen_name",
+            "in_reply_to_tweet_id",
+        ),
+        "quotes": (
+            "user_id",
+            "quoted_tweet_id",
+            "tid",
+            "created_at",
+            "user_screen_name",
+            "quoted_user_id",
+            "quoted_user_screen_name",
+        ),
+    }
+
     def __init__(self, db_conn: db_client.DBClient = None):
         """
         Parse emerging relations from tweets.
@@ -44,13 +85,9 @@ class BaseRelationParser:
             datetime.datetime: Loaded datetime object from the timestamp.
         """
         if isinstance(ts, dict) and "$date" in ts:
-            return datetime.datetime.strptime(
-                ts.get("$date"), settings.TWITTER_API_V1_STR_FORMAT
-            )
+            return timestamps.parse_v1_timestamp(ts.get("$date"))
         elif isinstance(ts, str):
-            return datetime.datetime.strptime(
-                ts, settings.TWITTER_API_ACADEMIC_V2_STR_FORMAT
-            )
+            return timestamps.parse_academic_timestamp(ts)
         else:
             raise ValueError("unrecognized timestamp format")
 
@@ -71,6 +108,50 @@ class BaseRelationParser:
             output[relation_type] = tmp_relations
         return output
 
+    def parse_relations_from_batch(self, tweets: list) -> Dict[str, list]:
+        """
+        Extract all relations from a batch of tweets, e.g. a page of API results.
+
+        Parsers override this method with a single loop over the batch reading tweet
+        fields directly, rather than going through the getters for each relation.
+
+        Args:
+            tweets (list): Tweets to parse relations from.
+
+        Returns:
+            Dict[str, list]: Relations of each type, as tuples of the values of
+                RELATION_FIELDS.
+        """
+        output = {relation_type: [] for relation_type in self.relation_types}
+        for tweet in tweets:
+            for relation_type, relations in self.parse_relations_from_tweet(
+                tweet
+            ).items():
+                fields = self.RELATION_FIELDS[relation_type]
+                output[relation_type].extend(
+                    tuple(relation[field] for field in fields) for relation in relations
+                )
+
+        return output
+
+    def get_relation_docs(self, relations: Dict[str, list]) -> Dict[str, list]:
+        """
+        Convert batch relation tuples into documents ready to be inserted.
+
+        Args:
+            relations (Dict[str, list]): Relation tuples of each type.
+
+        Returns:
+            Dict[str, list]: Relation documents of each type.
+        """
+        return {
+            relation_type: [
+                dict(zip(self.RELATION_FIELDS[relation_type], relation))
+                for relation in relation_tuples
+            ]
+            for relation_type, relation_tuples in relations.items()
+        }
+
     def get_hashtag(self, hashtag: dict) -> str:
         pass
 
@@ -405,6 +486,91 @@ class AcademicRelationParser(BaseRelationParser):
                     )
         return retweet_relations
 
+    def parse_relations_from_batch(self, tweets: list) -> Dict[str, list]:
+        """
+        Extract all relations from a page of academic API tweets in a single loop.
+        Academic tweets carry no author screen name, left to None.
+
+        Args:
+            tweets (list): Tweets to parse relations from.
+
+        Returns:
+            Dict[str, list]: Relations of each type, as tuples of the values of
+                RELATION_FIELDS.
+        """
+        mentions, hashtags, retweets, replies, quotes = [], [], [], [], []
+        get_creation_time_stamp = self.get_creation_time_stamp
+        for tweet in tweets:
+            tid = tweet.get("id")
+            author_id = tweet.get("author_id")
+            created_at = get_creation_time_stamp(tweet["created_at"])
+
+            entities = tweet["entities"] if "entities" in tweet else {}
+            if "hashtags" in entities:
+                for hashtag in entities["hashtags"]:
+                    hashtags.append(
+                        (author_id, hashtag.get("tag"), tid, created_at, None)
+                    )
+            if "mentions" in entities:
+                for mention in entities["mentions"]:
+                    mentions.append(
+                        (
+                            author_id,
+                            mention.get("username"),
+                            mention.get("id"),
+                            tid,
+                            created_at,
+                            None,
+                        )
+                    )
+
+            for referenced_tweet in tweet.get("referenced_tweets", []):
+                referenced_type = referenced_tweet.get("type")
+                if referenced_type == "retweeted":
+                    retweets.append(
+                        (
+                            author_id,
+                            self.get_retweet_author_id(tweet),
+                            self.get_retweet_user_screen_name(tweet),
+                            referenced_tweet.get("id"),
+                            tid,
+                            created_at,
+                            None,
+                        )
+                    )
+                elif referenced_type == "replied_to":
+                    replies.append(
+                        (
+                            self.get_reply_author_id(tweet),
+                            self.get_reply_screen_name(tweet),
+                            created_at,
+                            author_id,
+                            tid,
+                            None,
+                            referenced_tweet.get("id"),
+                        )
+                    )
+                elif referenced_type == "quoted":
+                    quotes.append(
+                        (
+                            author_id,
+                            referenced_tweet.get("id"),
+                            tid,
+                            created_at,
+                            None,
+                            None,
+                            self.get_quote_screen_name(tweet, referenced_tweet),
+                        )
+                    )
+
+        return {
+            "mentions": mentions,
+            "hashtags": hashtags,
+            "retweets": retweets,
+            "replies": replies,
+            "quotes": quotes,
+        }
+
 
 class StandardRelationParser(BaseRelationParser):
     def __init__(self, db_conn: db_client.DBClient):
@@ -441,7 +607,7 @@ class StandardRelationParser(BaseRelationParser):
         return reply["in_reply_to_status_id_str"]
 
     def get_reply_screen_name(self, tweet: dict) -> list:
-        return tweet["in_reply_to_screen_name"]
+        return tweet.get("in_reply_to_screen_name")
 
     def get_reply_author_id(self, tweet: dict) -> list:
         return tweet["in_reply_to_user_id_str"]
@@ -561,6 +727,113 @@ class StandardRelationParser(BaseRelationParser):
 
         return mention_relations
 
+    def parse_relations_from_batch(self, tweets: list) -> Dict[str, list]:
+        """
+        Extract all relations from a batch of v1.1 tweets in a single loop, visiting
+        each tweet and its embedded statuses once.
+
+        Args:
+            tweets (list): Tweets to parse relations from.
+
+        Returns:
+            Dict[str, list]: Relations of each type, as tuples of the values of
+                RELATION_FIELDS.
+        """
+        mentions, hashtags, retweets, replies, quotes = [], [], [], [], []
+        get_creation_time_stamp = self.get_creation_time_stamp
+        for tweet in tweets:
+            statuses = [tweet]
+            if "quoted_status" in tweet:
+                statuses.append(tweet["quoted_status"])
+            if "retweeted_status" in tweet:
+                statuses.append(tweet["retweeted_status"])
+                if "quoted_status" in tweet["retweeted_status"]:
+                    statuses.append(tweet["retweeted_status"]["quoted_status"])
+
+            for status in statuses:
+                tid = status.get("id_str")
+                user = status.get("user")
+                author_id = user.get("id_str")
+                screen_name = user.get("screen_name")
+                created_at = get_creation_time_stamp(status["created_at"])
+
+                entities = status["entities"] if "entities" in status else {}
+                if "hashtags" in entities:
+                    for hashtag in entities["hashtags"]:
+                        hashtags.append(
+                            (
+                                author_id,
+                                hashtag.get("text"),
+                                tid,
+                                created_at,
+                                screen_name,
+                            )
+                        )
+                if "user_mentions" in entities:
+                    for mention in entities["user_mentions"]:
+                        mentions.append(
+                            (
+                                author_id,
+                                mention.get("screen_name"),
+                                mention.get("id_str"),
+                                tid,
+                                created_at,
+                                screen_name,
+                            )
+                        )
+
+                if status["in_reply_to_status_id"] and status["in_reply_to_user_id"]:
+                    replies.append(
+                        (
+                            status["in_reply_to_user_id_str"],
+                            status.get("in_reply_to_screen_name"),
+                            created_at,
+                            author_id,
+                            tid,
+                            screen_name,
+                            status["in_reply_to_status_id_str"],
+                        )
+                    )
+
+                # quotes of the tweet and of the retweeted status
+                if "quoted_status" in status and (
+                    status is tweet or status is tweet.get("retweeted_status")
+                ):
+                    quote = status["quoted_status"]
+                    quotes.append(
+                        (
+                            author_id,
+                            quote["id_str"],
+                            tid,
+                            created_at,
+                            screen_name,
+                            quote["user"]["id_str"],
+                            quote["user"]["screen_name"],
+                        )
+                    )
+
+            if "retweeted_status" in tweet:
+                retweet = tweet["retweeted_status"]
+                retweets.append(
+                    (
+                        tweet.get("user").get("id_str"),
+                        retweet["user"]["id_str"],
+                        retweet["user"]["screen_name"],
+                        retweet["id_str"],
+                        tweet.get("id_str"),
+                        get_creation_time_stamp(tweet["created_at"]),
+                        tweet.get("user").get("screen_name"),
+                    )
+                )
+
+        return {
+            "mentions": mentions,
+            "hashtags": hashtags,
+            "retweets": retweets,
+            "replies": replies,
+            "quotes": quotes,
+        }
+
     def get_retweet_relations(self, tweet: dict) -> list:
         """Search for retweet relations in tweet
 
@@ -0,0 +1,198 @@
+import datetime
+
+# maximum length of full archive search queries of the Academic API
+MAX_QUERY_LENGTH = 1024
+
+TWEET_FIELDS = (
+    "id",
+    "text",
+    "attachments",
+    "author_id",
+    "context_annotations",
+    "conversation_id",
+    "created_at",
+    "entities",
+    "geo",
+    "in_reply_to_user_id",
+    "lang",
+    "public_metrics",
+    "possibly_sensitive",
+    "referenced_tweets",
+)
+
+USER_FIELDS = (
+    "id",
+    "name",
+    "username",
+    "created_at",
+    "description",
+    "entities",
+    "location",
+    "pinned_tweet_id",
+    "profile_image_url",
+    "protected",
+    "public_metrics",
+    "url",
+    "verified",
+)
+
+EXPANSIONS = (
+    "author_id",
+    "referenced_tweets.id",
+    "in_reply_to_user_id",
+    "attachments.media_keys",
+    "attachments.poll_ids",
+    "geo.place_id",
+    "entities.mentions.username",
+    "referenced_tweets.id.author_id",
+)
+
+MEDIA_FIELDS = (
+    "duration_ms",
+    "media_key",
+    "preview_image_url",
+    "type",
+    "url",
+    "public_metrics",
+    "alt_text",
+)
+
+PLACE_FIELDS = (
+    "contained_within",
+    "country",
+    "country_code",
+    "full_name",
+    "geo",
+    "id",
+    "name",
+    "place_type",
+)
+
+POLL_FIELDS = (
+    "duration_minutes",
+    "end_datetime",
+    "id",
+    "options",
+    "voting_status",
+)
+
+
+class SearchPlan:
+    """Request parameters of Academic API searches, computed once and reused across
+    searches, e.g. across the per-user searches of a user history job.
+
+    Queries are made of the keywords, an optional user filter and the exclusion
+    operators, the same way as AcademicClient._get_query. User filters of many users
+    can be packed into as few queries as the query length limit allows.
+
+    :param keywords: Keywords, any of them to be matched, defaults to None.
+    :type keywords: list, optional
+    :param exclude_retweet: Whether to exclude retweets, defaults to False.
+    :type exclude_retweet: bool, optional
+    :param max_results: Number of results per page, defaults to 100.
+    :type max_results: int, optional
+    :param max_query_length: Maximum length of queries, defaults to MAX_QUERY_LENGTH.
+    :type max_query_length: int, optional
+    """
+
+    def __init__(
+        self,
+        keywords: list = None,
+        exclude_retweet: bool = False,
+        max_results: int = 100,
+        max_query_length: int = MAX_QUERY_LENGTH,
+    ):
+        self.keywords = list(keywords) if keywords else []
+        self.exclude_retweet = exclude_retweet
+        self.max_query_length = max_query_length
+
+        # query fragments
+        self.prefix = "( " + " OR ".join(self.keywords) + " )" if self.keywords else ""
+        self.suffix = " -is:retweet" if exclude_retweet else ""
+
+        self.request_kwargs = dict(
+            expansions=",".join(EXPANSIONS),
+            max_results=max_results,
+            media_fields=",".join(MEDIA_FIELDS),
+            place_fields=",".join(PLACE_FIELDS),
+            poll_fields=",".join(POLL_FIELDS),
+            tweet_fields=",".join(TWEET_FIELDS),
+            user_fields=",".join(USER_FIELDS),
+        )
+
+    def get_query(self, uid: str = None) -> str:
+        """Build the query of the plan, optionally restricted to a single user.
+
+        :param uid: User id, defaults to None.
+        :type uid: str, optional
+        :return: Search query.
+        :rtype: str
+        """
+
+        query = self.prefix
+        if uid:
+            query += f" from:{uid}"
+
+        return (query + self.suffix).strip()
+
+    def get_packed_queries(self, uids: list) -> list:
+        """Pack the user filters of many users into as few queries as possible, each
+        query matching the tweets of any of its users.
+
+        :param uids: User ids.
+        :type uids: list
+        :return: List of (query, uids) tuples, in the order of the user ids.
+        :rtype: list
+        """
+
+        base_length = len(self.prefix) + len(self.suffix) + len(" ()")
+        packed_queries = []
+        batch, batch_length = [], base_length
+        for uid in uids:
+            operator = f"from:{uid}"
+            # operators are joined with " OR "
+            length = len(operator) + (len(" OR ") if batch else 0)
+            if batch and batch_length + length > self.max_query_length:
+                packed_queries.append((self._get_packed_query(batch), batch))
+                batch, batch_length = [], base_length
+                length = len(operator)
+
+            batch.append(uid)
+            batch_length += length
+
+        if batch:
+            packed_queries.append((self._get_packed_query(batch), batch))
+
+        return packed_queries
+
+    def _get_packed_query(self, uids: list) -> str:
+        if len(uids) == 1:
+            return self.get_query(uid=uids[0])
+
+        users = " OR ".join(f"from:{uid}" for uid in uids)
+        return f"{self.prefix} ({users}){self.suffix}".strip()
+
+    def get_kwargs(
+        self,
+        query: str,
+        start_time: datetime.datetime = None,
+        end_time: datetime.datetime = None,
+    ) -> dict:
+        """Get the keyword arguments of a search request.
+
+        :param query: Search query.
+        :type query: str
+        :param start_time: Oldest creation date of the tweets, defaults to None.
+        :type start_time: datetime.datetime, optional
+        :param end_time: Newest creation date of the tweets, defaults to None.
+        :type end_time: datetime.datetime, optional
+        :return: Arguments of tweepy.Client.search_all_tweets.
+        :rtype: dict
+        """
+
+        return dict(
+            query=query,
+            start_time=start_time,
+            end_time=end_time,
+            **self.request_kwargs,
+        )
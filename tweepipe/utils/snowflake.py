@@ -1,5 +1,11 @@
 from datetime import datetime
 
+# epoch of tweet ids, in milliseconds
+TWEET_ID_EPOCH = 1288834974657
+
+# bits of tweet ids below the timestamp (worker and sequence numbers)
+TIMESTAMP_SHIFT = 22
+
 
 class SnowFlake:
     """
@@ -20,8 +26,7 @@ class SnowFlake:
         :rtype: int
         """
 
-        offset = 1288834974657
-        tstamp = (tweet_id >> 22) + offset
+        tstamp = (tweet_id >> TIMESTAMP_SHIFT) + TWEET_ID_EPOCH
 
         return tstamp
 
@@ -35,10 +40,9 @@ class SnowFlake:
         :rtype: int
         """
 
-        offset = 1288834974657
         ts = int(datetime.timestamp(time_obj) * 1000)
-        ts -= offset
-        tweet_id = ts << 22
+        ts -= TWEET_ID_EPOCH
+        tweet_id = ts << TIMESTAMP_SHIFT
 
         return tweet_id
 
@@ -1,4 +1,3 @@
-import json
 from collections import namedtuple
 
 import tweepy
@@ -9,6 +8,7 @@ from tweepy.tweet import Tweet
 
 from tweepipe.db import db_client, db_schema
 from tweepipe.legacy.utils import extract
+from tweepipe.utils import fastjson, file_sink
 
 StreamResponse = namedtuple(
     "StreamResponse", ("data", "includes", "errors", "matching_rules")
@@ -42,24 +42,25 @@ class StreamV1(tweepy.Stream):
         )
 
         self.db_conn = db_conn
-        self.output_file = output_file
+        # buffered output rather than a file opened for every tweet
+        self.output_file = file_sink.get_sink(output_file) if output_file else None
         self.consumer_key = consumer_key
         self.consumer_secret = consumer_secret
         self.access_token = access_token
         self.access_token_secret = access_token_secret
 
-    def on_data(self, raw_data: str) -> bool:
+    def on_data(self, raw_data: bytes) -> bool:
         """
         Process incoming data for API v1.
 
         Args:
-            raw_data (str): Raw data packet
+            raw_data (bytes): Raw data packet
 
         Returns:
             bool: Whether the data was correctly processed.
         """
         # shady way of extracting information from the tweet
-        data = json.loads(raw_data)
+        data = fastjson.loads(raw_data)
         if "id_str" not in data:
             return True
 
@@ -73,6 +74,13 @@ class StreamV1(tweepy.Stream):
 
         return True
 
+    def on_disconnect(self):
+        """Flush the output file once the stream is disconnected."""
+        if self.output_file:
+            self.output_file.flush(fsync=True)
+
+        super().on_disconnect()
+
 
 class StreamingClient(tweepy.StreamingClient):
     def __init__(
@@ -129,15 +137,15 @@ class StreamingClient(tweepy.StreamingClient):
         """
         self.db_conn.add_tweet(tweet.data)
 
-    def on_data(self, raw_data: str):
+    def on_data(self, raw_data: bytes):
         """
         Process incoming API packet.
 
         Args:
-            raw_data (str): Raw data to be processed.
+            raw_data (bytes): Raw data to be processed.
         """
         # overriding definition of on_data
-        data = json.loads(raw_data)
+        data = fastjson.loads(raw_data)
 
         tweet = None
         includes = {}
@@ -0,0 +1,317 @@
+import fcntl
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+
+# maximum number of tweet ids per segment, i.e. 128MB of ids and 4MB of statuses
+SEGMENT_SIZE = 1 << 24
+
+# statuses of tweet ids, stored on 2 bits
+STATUS_PENDING = 0
+STATUS_DONE = 1
+STATUS_MISSING = 2
+
+# statuses per byte, claimed ranges being aligned on bytes so that workers never
+# update the same byte
+IDS_PER_BYTE = 4
+
+# block of claimed tweet ids, `tids` holding the ids of the range still pending
+TidBlock = namedtuple("TidBlock", ["lease_id", "segment", "start", "end", "tids"])
+
+
+def _get_status_codes(statuses: np.ndarray, count: int) -> np.ndarray:
+    """Unpack 2 bits statuses into one status code per tweet id."""
+
+    shifts = np.arange(IDS_PER_BYTE, dtype=np.uint8) * 2
+    codes = (statuses[:, None] >> shifts) & 3
+
+    return codes.reshape(-1)[:count]
+
+
+class TidQueue:
+    """Work queue of tweet ids kept in local files, as an alternative to tracking the
+    hydration of each tweet id with a document of the `hydrating_tids` collection.
+
+    Tweet ids are stored in segments: a sorted array of unsigned 64 bits integers
+    and a bitmap of 2 bits statuses (pending, done or missing), both memory mapped.
+    A billion ids take 8GB of ids and 250MB of statuses. The segments and the leases
+    of claimed ranges are listed in a json file, locked while being updated, so that
+    the workers of a single host can share the queue.
+
+    Ranges of ids are claimed under a lease, ranges held by crashed workers being
+    claimed again once their lease expired, only their pending ids being returned.
+
+    :param path: Directory of the queue, created if missing.
+    :type path: str
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._state_path = self.path / "queue.json"
+        self._state_path.touch(exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._segments = {}
+
+    def _transaction(self, fn):
+        with self._lock, open(self._state_path, "r+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                content = f.read()
+                state = json.loads(content) if content else {}
+                state.setdefault("segments", [])
+                state.setdefault("leases", {})
+                state.setdefault("next_segment", 0)
+                result = fn(state)
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+                f.flush()
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _get_state(self) -> dict:
+        return self._transaction(lambda state: state)
+
+    def _get_segment(self, name: str) -> tuple:
+        """Get the memory mapped ids and statuses of a segment."""
+
+        if name not in self._segments:
+            tids = np.memmap(self.path / f"{name}.tids", dtype=np.uint64, mode="r")
+            statuses = np.memmap(
+                self.path / f"{name}.status", dtype=np.uint8, mode="r+"
+            )
+            self._segments[name] = (tids, statuses)
+
+        return self._segments[name]
+
+    def add(self, tids) -> int:
+        """Add tweet ids to the queue, as new segments of sorted distinct ids. Ids are
+        only deduplicated within each segment.
+
+        :param tids: Tweet ids, as integers or strings.
+        :type tids: Iterable
+        :return: Number of ids added.
+        :rtype: int
+        """
+
+        added_count = 0
+        tids = iter(tids)
+        while True:
+            segment_tids = np.fromiter(
+                (int(tid) for tid in itertools.islice(tids, SEGMENT_SIZE)),
+                dtype=np.uint64,
+            )
+            if not len(segment_tids):
+                break
+
+            segment_tids = np.unique(segment_tids)
+            self._add_segment(segment_tids)
+            added_count += len(segment_tids)
+
+        return added_count
+
+    def _add_segment(self, tids: np.ndarray):
+        def reserve(state):
+            state["next_segment"] += 1
+            return f"{state['next_segment'] - 1:06d}"
+
+        name = self._transaction(reserve)
+
+        # segments are only listed once fully written
+        for suffix, array in (
+            ("tids", tids),
+            ("status", np.zeros(-(-len(tids) // IDS_PER_BYTE), dtype=np.uint8)),
+        ):
+            tmp_path = self.path / f"{name}.{suffix}.tmp"
+            array.tofile(tmp_path)
+            os.replace(tmp_path, self.path / f"{name}.{suffix}")
+
+        segment = {
+            "name": name,
+            "count": len(tids),
+            "min_tid": int(tids[0]),
+            "max_tid": int(tids[-1]),
+            "cursor": 0,
+        }
+        self._transaction(lambda state: state["segments"].append(segment))
+        logger.info(f"Added segment {name} of {len(tids)} tweet ids to {self.path}.")
+
+    def claim(
+        self, count: int = 4096, lease_seconds: int = 900, owner: str = None
+    ) -> TidBlock:
+        """Claim the next range of ids, ranges of expired leases being claimed first.
+
+        :param count: Number of ids of the range, rounded up to a multiple of
+            IDS_PER_BYTE, defaults to 4096.
+        :type count: int, optional
+        :param lease_seconds: Duration of the lease, defaults to 900.
+        :type lease_seconds: int, optional
+        :param owner: Name of the worker holding the lease, defaults to None.
+        :type owner: str, optional
+        :return: Block of the pending ids of the range, None once no range is left.
+        :rtype: TidBlock
+        """
+
+        count = -(-count // IDS_PER_BYTE) * IDS_PER_BYTE
+
+        def claim_range(state):
+            now = time.time()
+            leases = state["leases"]
+            for lease_id, lease in leases.items():
+                if lease["expires"] < now:
+                    lease.update({"owner": owner, "expires": now + lease_seconds})
+                    return lease_id, dict(lease)
+
+            for segment in state["segments"]:
+                if segment["cursor"] < segment["count"]:
+                    start = segment["cursor"]
+                    segment["cursor"] = min(segment["count"], start + count)
+                    lease_id = uuid.uuid4().hex
+                    leases[lease_id] = {
+                        "segment": segment["name"],
+                        "start": start,
+                        "end": segment["cursor"],
+                        "owner": owner,
+                        "expires": now + lease_seconds,
+                    }
+                    return lease_id, dict(leases[lease_id])
+
+            return None
+
+        while True:
+            claimed = self._transaction(claim_range)
+            if not claimed:
+                return None
+
+            lease_id, lease = claimed
+            tids, statuses = self._get_segment(lease["segment"])
+            start, end = lease["start"], lease["end"]
+            codes = _get_status_codes(
+                np.asarray(statuses[start // IDS_PER_BYTE : -(-end // IDS_PER_BYTE)]),
+                end - start,
+            )
+            pending_tids = np.asarray(tids[start:end])[codes == STATUS_PENDING]
+
+            block = TidBlock(lease_id, lease["segment"], start, end, pending_tids)
+            if len(pending_tids):
+                return block
+
+            # range already processed before its lease expired
+            self.complete(block)
+
+    def renew(self, block: TidBlock, lease_seconds: int = 900):
+        """Extend the lease of a block."""
+
+        def renew_lease(state):
+            if block.lease_id in state["leases"]:
+                state["leases"][block.lease_id]["expires"] = time.time() + lease_seconds
+
+        self._transaction(renew_lease)
+
+    def set_statuses(self, block: TidBlock, done_tids: list, missing_tids: list):
+        """Record the final status of ids of a block.
+
+        :param block: Claimed block.
+        :type block: TidBlock
+        :param done_tids: Hydrated tweet ids.
+        :type done_tids: list
+        :param missing_tids: Missing tweet ids.
+        :type missing_tids: list
+        """
+
+        tids, statuses = self._get_segment(block.segment)
+        range_tids = tids[block.start : block.end]
+        for status, status_tids in (
+            (STATUS_DONE, done_tids),
+            (STATUS_MISSING, missing_tids),
+        ):
+            if not len(status_tids):
+                continue
+
+            # positions of the ids in the range, ids out of the range being ignored
+            status_tids = np.fromiter((int(tid) for tid in status_tids), np.uint64)
+            positions = np.searchsorted(range_tids, status_tids)
+            found = positions < len(range_tids)
+            found[found] = range_tids[positions[found]] == status_tids[found]
+            positions = positions[found] + block.start
+
+            indices = positions // IDS_PER_BYTE
+            shifts = ((positions % IDS_PER_BYTE) * 2).astype(np.uint8)
+            np.bitwise_and.at(statuses, indices, ~(np.uint8(3) << shifts))
+            np.bitwise_or.at(statuses, indices, np.uint8(status) << shifts)
+
+        statuses.flush()
+
+    def complete(self, block: TidBlock):
+        """Drop the lease of a block once all of its ids got their final status."""
+
+        self._transaction(lambda state: state["leases"].pop(block.lease_id, None))
+
+    def release(self, block: TidBlock):
+        """Give back a block (e.g. upon exit), for its pending ids to be claimed
+        again right away."""
+
+        def release_lease(state):
+            if block.lease_id in state["leases"]:
+                state["leases"][block.lease_id]["expires"] = 0
+
+        self._transaction(release_lease)
+
+    def iter_tids(self, status: int = STATUS_PENDING):
+        """Iterate over the ids of a status, segment by segment.
+
+        :param status: Status of the ids, defaults to STATUS_PENDING.
+        :type status: int, optional
+        :return: Iterator over arrays of tweet ids.
+        """
+
+        for segment in self._get_state()["segments"]:
+            tids, statuses = self._get_segment(segment["name"])
+            codes = _get_status_codes(np.asarray(statuses), segment["count"])
+            yield np.asarray(tids)[codes == status]
+
+    def export_missing(self, output_file: str) -> int:
+        """Write the missing ids to a text file, one id per line.
+
+        :param output_file: Output file.
+        :type output_file: str
+        :return: Number of missing ids.
+        :rtype: int
+        """
+
+        missing_count = 0
+        with open(output_file, "w") as f:
+            for tids in self.iter_tids(status=STATUS_MISSING):
+                f.writelines(f"{tid}\n" for tid in tids)
+                missing_count += len(tids)
+
+        return missing_count
+
+    def stats(self) -> dict:
+        """Get the number of ids per status, of segments and of held leases."""
+
+        state = self._get_state()
+        counts = np.zeros(3, dtype=np.int64)
+        for segment in state["segments"]:
+            _, statuses = self._get_segment(segment["name"])
+            codes = _get_status_codes(np.asarray(statuses), segment["count"])
+            counts += np.bincount(codes, minlength=4)[:3]
+
+        return {
+            "pending": int(counts[STATUS_PENDING]),
+            "done": int(counts[STATUS_DONE]),
+            "missing": int(counts[STATUS_MISSING]),
+            "segments": len(state["segments"]),
+            "leases": len(state["leases"]),
+        }
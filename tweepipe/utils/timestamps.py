@@ -0,0 +1,206 @@
+import datetime
+import functools
+
+from tweepipe import settings
+
+# number of distinct raw timestamps kept per format, tweets of a stream posted
+# within the same second share the same string
+CACHE_SIZE = 65536
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+WEEKDAYS = {"Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"}
+
+MONTHS = {
+    "Jan": 1,
+    "Feb": 2,
+    "Mar": 3,
+    "Apr": 4,
+    "May": 5,
+    "Jun": 6,
+    "Jul": 7,
+    "Aug": 8,
+    "Sep": 9,
+    "Oct": 10,
+    "Nov": 11,
+    "Dec": 12,
+}
+
+
+def _is_ascii_digits(s: str) -> bool:
+    # int() would also accept signs, spaces and non ascii digits
+    return s.isdigit() and s.isascii()
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def parse_tweet_timestamp(ts: str) -> datetime.datetime:
+    """Parse a v1.1 creation date, e.g. "Wed Oct 10 20:19:24 +0000 2018", formatted
+    after settings.TWEET_TS_STR_FORMAT.
+
+    :param ts: Raw timestamp.
+    :type ts: str
+    :return: Naive UTC datetime, identical to strptime's.
+    :rtype: datetime.datetime
+    """
+
+    # fast path for the exact layout only, anything else being left to strptime
+    try:
+        if (
+            len(ts) == 30
+            and ts[19:26] == " +0000 "
+            and ts[:3] in WEEKDAYS
+            and ts[3] + ts[7] + ts[10] == "   "
+            and ts[13] + ts[16] == "::"
+            and _is_ascii_digits(ts[8:10] + ts[11:13] + ts[14:16] + ts[17:19] + ts[26:])
+        ):
+            return datetime.datetime(
+                int(ts[26:30]),
+                MONTHS[ts[4:7]],
+                int(ts[8:10]),
+                int(ts[11:13]),
+                int(ts[14:16]),
+                int(ts[17:19]),
+            )
+    except (KeyError, ValueError):
+        pass
+
+    # let strptime validate (or reject) anything unexpected
+    return datetime.datetime.strptime(ts, settings.TWEET_TS_STR_FORMAT)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def parse_academic_timestamp(ts: str) -> datetime.datetime:
+    """Parse a v2 creation date, e.g. "2021-03-04T12:34:56.000Z", formatted after
+    settings.TWITTER_API_ACADEMIC_V2_STR_FORMAT.
+
+    :param ts: Raw timestamp.
+    :type ts: str
+    :return: Naive UTC datetime, identical to strptime's.
+    :rtype: datetime.datetime
+    """
+
+    try:
+        if (
+            len(ts) == 24
+            and ts[4] + ts[7] + ts[10] + ts[13] + ts[16] + ts[19] + ts[23] == "--T::.Z"
+            and _is_ascii_digits(
+                ts[:4]
+                + ts[5:7]
+                + ts[8:10]
+                + ts[11:13]
+                + ts[14:16]
+                + ts[17:19]
+                + ts[20:23]
+            )
+        ):
+            return datetime.datetime(
+                int(ts[0:4]),
+                int(ts[5:7]),
+                int(ts[8:10]),
+                int(ts[11:13]),
+                int(ts[14:16]),
+                int(ts[17:19]),
+                int(ts[20:23]) * 1000,
+            )
+    except ValueError:
+        pass
+
+    return datetime.datetime.strptime(ts, settings.TWITTER_API_ACADEMIC_V2_STR_FORMAT)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def parse_v1_timestamp(ts: str) -> datetime.datetime:
+    """Parse an iso timestamp without fraction of seconds, e.g.
+    "2021-03-04T12:34:56Z", formatted after settings.TWITTER_API_V1_STR_FORMAT.
+
+    :param ts: Raw timestamp.
+    :type ts: str
+    :return: Naive UTC datetime, identical to strptime's.
+    :rtype: datetime.datetime
+    """
+
+    try:
+        if (
+            len(ts) == 20
+            and ts[4] + ts[7] + ts[10] + ts[13] + ts[16] + ts[19] == "--T::Z"
+            and _is_ascii_digits(
+                ts[:4] + ts[5:7] + ts[8:10] + ts[11:13] + ts[14:16] + ts[17:19]
+            )
+        ):
+            return datetime.datetime(
+                int(ts[0:4]),
+                int(ts[5:7]),
+                int(ts[8:10]),
+                int(ts[11:13]),
+                int(ts[14:16]),
+                int(ts[17:19]),
+            )
+    except ValueError:
+        pass
+
+    return datetime.datetime.strptime(ts, settings.TWITTER_API_V1_STR_FORMAT)
+
+
+PARSERS = {
+    settings.TWEET_TS_STR_FORMAT: parse_tweet_timestamp,
+    settings.TWITTER_API_ACADEMIC_V2_STR_FORMAT: parse_academic_timestamp,
+    settings.TWITTER_API_V1_STR_FORMAT: parse_v1_timestamp,
+}
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _strptime(ts: str, fmt: str) -> datetime.datetime:
+    return datetime.datetime.strptime(ts, fmt)
+
+
+def parse(ts: str, fmt: str = settings.TWEET_TS_STR_FORMAT) -> datetime.datetime:
+    """Parse a timestamp with the fast parser of its format, falling back on a
+    cached strptime for other formats.
+
+    :param ts: Raw timestamp.
+    :type ts: str
+    :param fmt: strptime format of the timestamp, defaults to
+        settings.TWEET_TS_STR_FORMAT.
+    :type fmt: str, optional
+    :return: Parsed datetime.
+    :rtype: datetime.datetime
+    """
+
+    parser = PARSERS.get(fmt)
+    if parser is None:
+        return _strptime(ts, fmt)
+
+    return parser(ts)
+
+
+def to_epoch(dt: datetime.datetime) -> int:
+    """Convert a naive UTC datetime into a unix timestamp in seconds."""
+
+    return (dt - EPOCH) // datetime.timedelta(seconds=1)
+
+
+def parse_many(
+    timestamps: list, fmt: str = settings.TWEET_TS_STR_FORMAT, epoch: bool = False
+) -> list:
+    """Parse a list of timestamps sharing the same format.
+
+    :param timestamps: Raw timestamps.
+    :type timestamps: list
+    :param fmt: strptime format of the timestamps, defaults to
+        settings.TWEET_TS_STR_FORMAT.
+    :type fmt: str, optional
+    :param epoch: Whether to return unix timestamps in seconds rather than
+        datetimes, defaults to False.
+    :type epoch: bool, optional
+    :return: Parsed timestamps, in the same order.
+    :rtype: list
+    """
+
+    parser = PARSERS.get(fmt)
+    if parser is None:
+        parser = functools.partial(_strptime, fmt=fmt)
+
+    if epoch:
+        return [to_epoch(parser(ts)) for ts in timestamps]
+
+    return [parser(ts) for ts in timestamps]